@@ -1,9 +1,18 @@
+import os
+from functools import partial
+import numpy as np
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-from petroleumpriceprediction.config import load_config
-import pickle
+from petroleumpriceprediction.config import load_config, model_path
+from petroleumpriceprediction import data
+from petroleumpriceprediction.model import load_predictor
+from petroleumpriceprediction.registry import ModelCache, ModelRegistry
+from petroleumpriceprediction.release import current_release, published_path
+from petroleumpriceprediction.scenarios import historical_paths, scenario_frame, shifted_paths
+from petroleumpriceprediction.store import PriceStore
+from scripts.process_data import BRENT_SERIES
 
 # Set up the page title
 st.set_page_config(page_title="Oil Price Prediction Dashboard", layout="wide")
@@ -16,37 +25,115 @@ providing historical insights, global consumption trends, and forecasts to aid d
 Select the number of days to forecast future prices and see the results visually.
 """)
 
-# **Loading Files**
-config = load_config("config.yaml")
-dataset_filepath = config["data"]["dataset_filepath"]
-consumption_filepath = config["data"]["consumption_filepath"]
-opec_filepath = config["data"]["opec_filepath"]
-model_filepath = config["model"]["path"]
+# Largest number of days that can be forecast
+MAX_FORECAST_DAYS = 7
 
-# Load the datasets
-df_brent = pd.read_csv(dataset_filepath)
-df_consumption = pd.read_csv(consumption_filepath)
-df_opec = pd.read_csv(opec_filepath)
+# Simulated paths of the forecast distribution, quantiles drawn in the fan chart and paths shown
+N_PATHS = 10000
+FAN_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+N_SCENARIOS = 20
+
+# Largest number of points drawn for each line of the historical charts
+MAX_CHART_POINTS = 500
+
+# Horizon, OPEC basket moves (%) and number of historical OPEC paths of the what-if scenarios
+MAX_SCENARIO_DAYS = 30
+SCENARIO_SHIFTS = (-30, -20, -10, 10, 20, 30)
+MAX_HISTORICAL_PATHS = 2000
+
+# **Cached Loaders**
+# Datasets, model and forecasts are computed once per process and shared by every session.
+# They are keyed by the hash of their files, so they are only computed again when a file changes.
+@st.cache_data(show_spinner=False)
+def file_hash(filepath: str, mtime_ns: int, size: int) -> str:
+    # The hash is only computed again when the modification time or the size of the file change
+    return data.file_fingerprint(filepath)["sha256"]()
+
+def fingerprint(filepath: str) -> str:
+    stat = os.stat(filepath)
+    return file_hash(filepath, stat.st_mtime_ns, stat.st_size)
+
+@st.cache_data(show_spinner=False)
+def load_dataset(filepath: str, filehash: str) -> pd.DataFrame:
+    # Dates are parsed by the columnar cache of data.load
+    return data.load(filepath).sort_values(by='date').reset_index(drop=True)
 
-# Ensure the date columns are in datetime format
-df_brent['date'] = pd.to_datetime(df_brent['date'])
-df_brent = df_brent.sort_values(by='date')
+@st.cache_data(show_spinner=False)
+def load_consumption(filepath: str, filehash: str) -> pd.DataFrame:
+    return pd.read_csv(filepath)
+
+@st.cache_resource(show_spinner=False)
+def model_cache(max_bytes: int, max_entries: int, allow_pickle: bool) -> ModelCache:
+    # Models are loaded on first use and shared by every session, up to the configured size.
+    # Pickled models are only loaded when model.allow_pickle trusts them
+    return ModelCache(max_bytes, max_entries, loader=partial(load_predictor, allow_pickle=allow_pickle))
+
+def load_model(filepath: str, filehash: str):
+    # Models of any engine share the forecast interface
+    registry_config = config["registry"]
+    return model_cache(registry_config["cache_mb"] * 2 ** 20, registry_config["cache_entries"],
+                       config["model"]["allow_pickle"]).get(filepath)
+
+@st.cache_resource(show_spinner=False)
+def open_registry(registry_dir: str) -> ModelRegistry:
+    # Only the index is read, whatever the number of registered models
+    return ModelRegistry(registry_dir)
+
+@st.cache_data(show_spinner=False)
+def forecast_horizon(model_filepath: str, model_hash: str, last_date: pd.Timestamp, steps: int) -> tuple:
+    # Forecast distribution of the largest horizon, sliced for every slider value
+    sarimax = load_model(model_filepath, model_hash)
+    if sarimax.supports_paths:
+        forecast, paths = sarimax.forecast_distribution(steps=steps, n_paths=N_PATHS, quantiles=FAN_QUANTILES,
+                                                        seed=0, return_paths=True)
+        paths = paths[:N_SCENARIOS]
+    else:
+        # Engines without simulation only provide the quantiles
+        forecast = sarimax.forecast_distribution(steps=steps, quantiles=FAN_QUANTILES)
+        paths = None
+    future_dates = pd.bdate_range(last_date + pd.offsets.BDay(1), periods=steps)
+    forecast_df = pd.DataFrame({'date': future_dates,
+                                'forecast_price': forecast['mean'].to_numpy(),
+                                'lower': forecast['lower'].to_numpy(),
+                                'upper': forecast['upper'].to_numpy()})
+    for column in forecast.columns.drop(['mean', 'lower', 'upper']):
+        forecast_df[column] = forecast[column].to_numpy()
+    return forecast_df, paths
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_store(brent_filepath: str, brent_hash: str, opec_filepath: str, opec_hash: str) -> PriceStore:
+    # Business-day store of every benchmark, shared read-only by every session
+    return PriceStore.from_frames({'brent': load_dataset(brent_filepath, brent_hash),
+                                   'opec': load_dataset(opec_filepath, opec_hash)},
+                                  value_columns={'opec': 'opec_price'})
+
+# **Loading Files**
+config = load_config("config.yaml")
+# Resolved once per run, so the datasets and the model shown come from the same release
+release = current_release(config["release"]["releases_dir"])
+dataset_filepath = published_path(config["data"]["dataset_filepath"], release)
+consumption_filepath = published_path(config["data"]["consumption_filepath"], release)
+opec_filepath = published_path(config["data"]["opec_filepath"], release)
+model_filepath = published_path(model_path(config["model"]), release)
+registry = open_registry(published_path(config["registry"]["dir"], release))
 
-df_opec['date'] = pd.to_datetime(df_opec['date'])
-df_opec = df_opec.sort_values(by='date')
+dataset_hash = fingerprint(dataset_filepath)
+opec_hash = fingerprint(opec_filepath)
+model_hash = fingerprint(model_filepath)
 
-# Load the SARIMAX model
-with open(model_filepath, "rb") as f:
-    sarimax = pickle.load(f)
+# Load the datasets
+df_consumption = load_consumption(consumption_filepath, fingerprint(consumption_filepath))
+store = load_store(dataset_filepath, dataset_hash, opec_filepath, opec_hash)
 
 # **Section 1: Historical Prices Chart and Summary Table**
 st.subheader("Historical Brent Oil Prices")
 
 # Create a detailed summary table
-last_price = df_brent['price'].iloc[-1]
-last_date = df_brent['date'].iloc[-1]
-prev_price = df_brent['price'].iloc[-2]
-price_one_year_ago = df_brent[df_brent['date'] == last_date - pd.Timedelta(days=365)]['price'].values[0] if len(df_brent[df_brent['date'] == last_date - pd.Timedelta(days=365)]) > 0 else None
+last_date, last_price = store.last('brent')
+_, prev_price = store.ago('brent', business_days=1)
+# Price of the nearest trading day on or before the same date one year ago
+one_year_ago = store.ago('brent', days=365)
+price_one_year_ago = one_year_ago[1] if one_year_ago else None
 
 summary_data = {
     "Metric": [
@@ -72,18 +159,15 @@ summary_table = pd.DataFrame(summary_data)
 col1, col2 = st.columns(2)
 
 with col1:
-    # Add a year column to the dataframe
-    df_brent['year'] = df_brent['date'].dt.year
-
     # Define a color palette for the years
-    years = df_brent['year'].unique()
+    years = list(store.yearly.loc['brent'].index)
     colors = sns.color_palette("tab10", len(years))  # You can use other palettes available in seaborn
     color_map = {year: color for year, color in zip(years, colors)}
 
-    # Create the plot with colors by year
+    # Create the plot with colors by year, downsampled to keep its shape
     fig, ax = plt.subplots(figsize=(10, 5))
     for year in years:
-        year_data = df_brent[df_brent['year'] == year]
+        year_data = store.downsample('brent', MAX_CHART_POINTS, start=f"{year}-01-01", end=f"{year}-12-31")
         ax.plot(year_data['date'], year_data['price'], label=f"Year {year}", color=color_map[year])
 
     # Customize the chart
@@ -104,10 +188,13 @@ col1, col2 = st.columns(2)
 
 with col1:
     # OPEC vs Brent Chart
-    merged_df = pd.merge(df_brent, df_opec, on='date', how='inner', suffixes=('_brent', '_opec'))
+    # Period covered by both benchmarks
+    start = max(store.series('brent')['date'].iloc[0], store.series('opec')['date'].iloc[0])
+    brent_prices = store.downsample('brent', MAX_CHART_POINTS, start=start)
+    opec_prices = store.downsample('opec', MAX_CHART_POINTS, start=start, end=last_date)
     fig, ax = plt.subplots(figsize=(8, 4))
-    ax.plot(merged_df['date'], merged_df['price'], label="Brent Price", color="blue")
-    ax.plot(merged_df['date'], merged_df['opec_price'], label="OPEC Price", color="orange")
+    ax.plot(brent_prices['date'], brent_prices['price'], label="Brent Price", color="blue")
+    ax.plot(opec_prices['date'], opec_prices['price'], label="OPEC Price", color="orange")
     ax.set_xlabel("Date")
     ax.set_ylabel("Price ($)")
     ax.legend()
@@ -144,33 +231,120 @@ with col2:
 # **Section 4: Forecasting**
 st.subheader("Future Price Forecast")
 
-# Select the number of days for the forecast
-forecast_days = st.slider("Select the number of days for the forecast", min_value=1, max_value=7, step=1)
+# Registered versions of the Brent model, from the newest; the trained model is shown by default
+versions = registry.entries(series=BRENT_SERIES)[::-1]
+if versions:
+    choice = st.selectbox("Model", [None] + versions,
+                          format_func=lambda entry: "Latest trained model" if entry is None else
+                          f"{entry['engine']} {entry['order']}{entry['seasonal_order']}"
+                          f"{' + ' + ', '.join(entry['exog']) if entry['exog'] else ''} v{entry['version']} "
+                          f"(trained up to {entry['train_end']})")
+    if choice is not None:
+        model_filepath = registry.path(choice)
+        model_hash = fingerprint(model_filepath)
+
+# Pickled models run their code when loaded, so they are only loaded if trusted in the configuration
+if not model_filepath.endswith(".npz") and not config["model"]["allow_pickle"]:
+    st.error(f"{model_filepath} is a pickled model: set model.allow_pickle in config.yaml if you trust it.")
+    st.stop()
+
+# Forecast of the largest horizon, computed once and sliced for every slider value
+full_forecast, scenario_paths = forecast_horizon(model_filepath, model_hash, last_date, MAX_FORECAST_DAYS)
+
+# Historical data of the last week, shown with the forecast
+last_month_data = store.series('brent', start=last_date - pd.Timedelta(days=7))
+
+# Only this section runs again when the slider moves
+@st.fragment
+def forecast_section():
+    # Select the number of days for the forecast
+    forecast_days = st.slider("Select the number of business days for the forecast",
+                              min_value=1, max_value=MAX_FORECAST_DAYS, step=1)
+
+    # Create forecast using the model
+    if forecast_days > 0:
+        # DataFrame with forecasted values
+        forecast_df = full_forecast.iloc[:forecast_days]
 
-# Create forecast using the model
-if forecast_days > 0:
-    last_date = df_brent['date'].iloc[-1]
-    future_dates = pd.date_range(start=last_date + pd.Timedelta(days=1), periods=forecast_days, freq='D')
-    future_exog = None  # If there are exogenous variables, include the corresponding future data here.
-    
-    forecast = sarimax.forecast(steps=forecast_days)
+        # Display the forecast table
+        st.write(f"Forecast for the next {forecast_days} business days:")
+        st.write(forecast_df)
 
-    # DataFrame with forecasted values
-    forecast_df = pd.DataFrame({'date': future_dates, 'forecast_price': forecast})
-    
-    # Display the forecast table
-    st.write(f"Forecast for the next {forecast_days} days:")
-    st.write(forecast_df)
+        # Forecast chart with historical data from the last month
+        fig, ax = plt.subplots(figsize=(10, 5))
+        ax.plot(last_month_data['date'], last_month_data['price'], label="Historical Brent Price", color="blue")
+        if scenario_paths is not None:
+            ax.plot(forecast_df['date'], scenario_paths[:, :forecast_days].T, color="gray", alpha=0.2, linewidth=0.8)
+        ax.fill_between(forecast_df['date'], forecast_df['p5'], forecast_df['p95'],
+                        color="green", alpha=0.15, label="P5-P95")
+        ax.fill_between(forecast_df['date'], forecast_df['p25'], forecast_df['p75'],
+                        color="green", alpha=0.3, label="P25-P75")
+        ax.plot(forecast_df['date'], forecast_df['p50'], label="Median (P50)", color="green")
+        ax.plot(forecast_df['date'], forecast_df['forecast_price'], label="Forecast", color="green", linestyle="--")
+        ax.set_title(f"Future Price Forecast for the Next {forecast_days} Business Days")
+        ax.set_xlabel("Date")
+        ax.set_ylabel("Price ($)")
+        ax.legend()
+        st.pyplot(fig)
+        plt.close(fig)
 
-    # Filter the last month's historical data
-    last_month_data = df_brent[df_brent['date'] >= (df_brent['date'].max() - pd.Timedelta(days=7))]
+forecast_section()
+
+# **Section 5: What-if Scenarios**
+st.subheader("What-if Scenarios: OPEC Basket")
+
+# Only this section runs again when its inputs change
+@st.fragment
+def scenario_section():
+    model = load_model(model_filepath, model_hash)
+    if not model.supports_scenarios:
+        st.info("Scenarios are not available for this model, as it does not use the OPEC basket price.")
+        return
+    opec_history = store.series('opec')['price'].to_numpy()
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        scenario_days = st.slider("Days ahead", min_value=1, max_value=MAX_SCENARIO_DAYS, value=20, step=1)
+    with col2:
+        shifts = st.multiselect("OPEC basket moves (%)", SCENARIO_SHIFTS, default=[-20, 10])
+        ramp = st.checkbox("Move gradually over the period", value=False)
+    with col3:
+        n_paths = st.slider("Historical OPEC paths", min_value=0, max_value=MAX_HISTORICAL_PATHS, value=500, step=100)
+
+    # Every scenario is forecast at once from the fitted model
+    paths = [shifted_paths(opec_history[-1], [shift / 100 for shift in shifts], scenario_days, ramp=ramp)]
+    if n_paths:
+        paths.append(historical_paths(opec_history, scenario_days, n_paths))
+    try:
+        forecasts = model.forecast_scenarios(np.vstack(paths))
+    except ValueError as error:
+        st.info(f"Scenarios are not available for this model: {error}")
+        return
+
+    names = [f"OPEC {shift:+d}%" for shift in shifts] + [f"history {i}" for i in range(len(forecasts['mean']) - len(shifts))]
+    frame = scenario_frame(forecasts, names, last_date)
 
-    # Forecast chart with historical data from the last month
     fig, ax = plt.subplots(figsize=(10, 5))
     ax.plot(last_month_data['date'], last_month_data['price'], label="Historical Brent Price", color="blue")
-    ax.plot(forecast_df['date'], forecast_df['forecast_price'], label="Forecast", color="green", linestyle="--")
-    ax.set_title(f"Future Price Forecast for the Next {forecast_days} Days")
+    if n_paths:
+        historical = frame[frame['scenario'].str.startswith("history")]
+        band = historical.groupby('date')['mean'].quantile([0.05, 0.5, 0.95]).unstack()
+        ax.fill_between(band.index, band[0.05], band[0.95], color="gray", alpha=0.25,
+                        label=f"P5-P95 of {n_paths} historical OPEC paths")
+        ax.plot(band.index, band[0.5], color="gray", label="Median of the historical OPEC paths")
+    for name in names[:len(shifts)]:
+        scenario = frame[frame['scenario'] == name]
+        ax.plot(scenario['date'], scenario['mean'], label=f"Brent if {name}")
+    ax.set_title(f"Brent Price Under OPEC Basket Scenarios, Next {scenario_days} Business Days")
     ax.set_xlabel("Date")
     ax.set_ylabel("Price ($)")
     ax.legend()
     st.pyplot(fig)
+    plt.close(fig)
+
+    # Price expected at the end of the period under each move of the OPEC basket
+    if shifts:
+        st.write(frame[frame['scenario'].isin(names[:len(shifts)])].groupby('scenario').tail(1)
+                 .reset_index(drop=True))
+
+scenario_section()
@@ -0,0 +1,417 @@
+import argparse
+import http.client
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+from typing import Callable
+import yaml
+from loguru import logger
+
+from benchmarks import synthetic
+from petroleumpriceprediction import data
+from petroleumpriceprediction.config import load_config
+from petroleumpriceprediction.model import SARIMAXPredictor
+from scripts.process_data import organize_data
+
+CONFIG_FILEPATH = "config.yaml"
+
+APP_FILEPATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+# Stages run for every size
+DATA_STAGES = ("organize_data", "data.load.csv", "data.load.cached", "data.preprocess")
+
+# Stages run on a single series only
+MODEL_STAGES = ("model.fit", "model.forecast", "model.save", "model.load", "serve", "dashboard")
+
+STAGES = DATA_STAGES + MODEL_STAGES
+
+# Differences below these values are never reported as regressions, as they are within the noise
+MIN_SECONDS = 0.005
+MIN_KIB = 256
+
+def measure(func: Callable[[], None], repeat: int = 3, setup: Callable[[], None] = None,
+            memory: bool = True) -> dict:
+    """Times a function over several runs and measures its peak memory in an extra run.
+
+    The memory is measured with `tracemalloc`, which slows the function down, so it is measured
+    apart from the timed runs. It only accounts for the allocations made through Python (NumPy
+    arrays included), not the native buffers of Arrow and polars.
+
+    Parameters
+    ----------
+    func : Callable[[], None]
+        The function to measure.
+    repeat : int, optional
+        Number of timed runs, by default 3.
+    setup : Callable[[], None], optional
+        Function run before every run, outside of the measures, by default None.
+    memory : bool, optional
+        Whether to measure the peak memory, by default True.
+
+    Returns
+    -------
+    dict
+        The "seconds_min", "seconds_median" and "repeat" of the runs, and their "peak_kib". When the
+        function returns a dictionary, the one of the last timed run is added to the result.
+    """
+    times = []
+    extra = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        extra = func()
+        times.append(time.perf_counter() - start)
+    result = {"seconds_min": min(times), "seconds_median": statistics.median(times), "repeat": repeat,
+              "peak_kib": None, **(extra if isinstance(extra, dict) else {})}
+    if memory:
+        if setup:
+            setup()
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        result["peak_kib"] = peak / 1024
+    return result
+
+def dashboard_config(workdir: str, dataset_filepath: str, model_filepath: str) -> str:
+    """Writes a configuration file pointing the dashboard at the generated dataset and model.
+
+    Parameters
+    ----------
+    workdir : str
+        Directory where the configuration file is written.
+    dataset_filepath : str
+        Path to the generated dataset.
+    model_filepath : str
+        Path to the model fitted on the generated dataset.
+
+    Returns
+    -------
+    str
+        Path to the configuration file.
+    """
+    config = load_config(CONFIG_FILEPATH)
+    config["data"]["dataset_filepath"] = dataset_filepath
+    config["data"]["consumption_filepath"] = os.path.abspath(config["data"]["consumption_filepath"])
+    config["data"]["opec_filepath"] = os.path.abspath(config["data"]["opec_filepath"])
+    config["model"]["engine"] = "statsmodels"
+    config["model"]["path"] = model_filepath
+    filepath = os.path.join(workdir, "config.yaml")
+    with open(filepath, "w") as file:
+        yaml.safe_dump(config, file)
+    return filepath
+
+def run_dashboard(workdir: str) -> None:
+    """Runs the dashboard once, headless, from a directory holding its configuration file."""
+    from streamlit.testing.v1 import AppTest
+
+    current = os.getcwd()
+    os.chdir(workdir)
+    try:
+        app = AppTest.from_file(APP_FILEPATH, default_timeout=600).run()
+    finally:
+        os.chdir(current)
+    if app.exception:
+        raise RuntimeError(f"The dashboard failed: {app.exception[0].message}")
+
+def serve_load(model_dir: str, clients: int = 8, requests_per_client: int = 50, max_steps: int = 30,
+               seed: int = 0) -> dict:
+    """Measures the throughput and latency of the forecast service under concurrent requests.
+
+    The service is started on a free port, serving the models of `model_dir`. Each client sends
+    its requests over a single connection, asking for random horizons of random models, with a
+    new significance level every 10 requests so that not every answer comes from the cache.
+
+    Parameters
+    ----------
+    model_dir : str
+        Directory holding the model artifacts.
+    clients : int, optional
+        Number of concurrent clients, by default 8.
+    requests_per_client : int, optional
+        Number of requests sent by each client, by default 50.
+    max_steps : int, optional
+        Longest horizon requested, by default 30.
+    seed : int, optional
+        Seed of the random requests, by default 0.
+
+    Returns
+    -------
+    dict
+        The "requests_per_second", and the "latency_p50_ms" and "latency_p95_ms" of the requests.
+    """
+    from petroleumpriceprediction.serve import ForecastService, create_server
+
+    service = ForecastService([model_dir])
+    server = create_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    rng = np.random.default_rng(seed)
+    models = sorted(service.models)
+    queries = [[(models[rng.integers(len(models))], int(rng.integers(1, max_steps + 1)),
+                 round(0.01 + 0.01 * (index // 10), 2))
+                for index in range(requests_per_client)] for _ in range(clients)]
+
+    def client(requests):
+        connection = http.client.HTTPConnection("127.0.0.1", server.server_port)
+        latencies = []
+        for model_id, steps, alpha in requests:
+            start = time.perf_counter()
+            connection.request("GET", f"/forecast?model={model_id}&steps={steps}&alpha={alpha}")
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                raise RuntimeError(f"The service answered {response.status}")
+            latencies.append(time.perf_counter() - start)
+        connection.close()
+        return latencies
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            latencies = np.concatenate(list(executor.map(client, queries)))
+    finally:
+        server.shutdown()
+        server.server_close()
+    elapsed = time.perf_counter() - start
+    return {"requests_per_second": len(latencies) / elapsed,
+            "latency_p50_ms": float(np.percentile(latencies, 50) * 1000),
+            "latency_p95_ms": float(np.percentile(latencies, 95) * 1000)}
+
+def clear_dashboard_caches() -> None:
+    """Clears the caches of the dashboard, so every run measures a cold start."""
+    import streamlit as st
+
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+def case_stages(workdir: str, n_series: int, order: tuple, seasonal_order: tuple) -> dict:
+    """Declares the stages of a benchmark case, run over the files of its directory.
+
+    Parameters
+    ----------
+    workdir : str
+        Directory of the case, holding the generated raw data store in "raw".
+    n_series : int
+        Number of generated series. The model stages are only declared for a single series.
+    order : tuple
+        ARIMA parameters (p, d, q) of the model stages.
+    seasonal_order : tuple
+        Seasonal ARIMA parameters (P, D, Q, s) of the model stages.
+
+    Returns
+    -------
+    dict
+        The (function, setup) of each stage, by name, in the order they must run.
+    """
+    raw_dir = os.path.join(workdir, "raw")
+    dataset_filepath = os.path.join(workdir, "prices.csv")
+    model_dir = os.path.join(workdir, "models")
+    model_filepath = os.path.join(model_dir, "model.npz")
+    os.makedirs(model_dir)
+    state = {}
+
+    def remove_sidecar():
+        if os.path.exists(data.cache_path(dataset_filepath)):
+            os.remove(data.cache_path(dataset_filepath))
+
+    def load_dataset():
+        state["dataset"] = data.load(dataset_filepath)
+
+    def fit():
+        state["predictor"] = SARIMAXPredictor(order=order, seasonal_order=seasonal_order)
+        state["predictor"].fit(state["preprocessed"])
+
+    stages = {
+        "organize_data": (lambda: organize_data(raw_dir, dataset_filepath, series=None), None),
+        "data.load.csv": (load_dataset, remove_sidecar),
+        "data.load.cached": (load_dataset, None),
+        "data.preprocess": (lambda: state.update(preprocessed=data.preprocess(state["dataset"].copy())), None),
+    }
+    if n_series == 1:
+        stages.update({
+            "model.fit": (fit, None),
+            "model.forecast": (lambda: state["predictor"].forecast_interval(steps=7), None),
+            "model.save": (lambda: state["predictor"].save(model_filepath), None),
+            "model.load": (lambda: SARIMAXPredictor.load(model_filepath), None),
+            "serve": (lambda: serve_load(model_dir), None),
+            "dashboard": (lambda: run_dashboard(workdir), clear_dashboard_caches),
+        })
+        dashboard_config(workdir, dataset_filepath, model_filepath)
+    return stages
+
+def run(years: list[int], series: list[int], stages: list[str] = STAGES, repeat: int = 3,
+        max_registers: int = None, memory: bool = True, seed: int = 0, order: tuple = (1, 1, 1),
+        seasonal_order: tuple = (0, 1, 1, 5)) -> list[dict]:
+    """Runs the benchmark stages over synthetic data of every size.
+
+    Parameters
+    ----------
+    years : list[int]
+        Numbers of years of data.
+    series : list[int]
+        Numbers of series.
+    stages : list[str], optional
+        Stages to measure, by default every one of `STAGES`. The stages they depend on still run,
+        untimed, to prepare their inputs.
+    repeat : int, optional
+        Number of timed runs of each stage, by default 3.
+    max_registers : int, optional
+        Sizes with more raw registers are skipped, by default none are.
+    memory : bool, optional
+        Whether to measure the peak memory of each stage, by default True.
+    seed : int, optional
+        Seed of the synthetic data, by default 0.
+    order : tuple, optional
+        ARIMA parameters (p, d, q) of the model stages, by default (1, 1, 1).
+    seasonal_order : tuple, optional
+        Seasonal ARIMA parameters (P, D, Q, s) of the model stages, by default (0, 1, 1, 5).
+
+    Returns
+    -------
+    list[dict]
+        One result per stage and size, with the "stage", "years", "series" and "registers" of the
+        case, and the measures of `measure`.
+    """
+    results = []
+    for n_years in years:
+        for n_series in series:
+            registers = len(synthetic.business_days(n_years)) * n_series
+            if max_registers and registers > max_registers:
+                logger.warning(f"Skipping {n_years} years of {n_series} series: {registers} registers")
+                continue
+            with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+                synthetic.write_raw(os.path.join(workdir, "raw"), n_years, n_series, seed)
+                case = case_stages(workdir, n_series, order, seasonal_order)
+                remaining = [name for name in case if name in stages]
+                for name, (func, setup) in case.items():
+                    if not remaining:
+                        break
+                    if name not in stages:
+                        # Prepares the inputs of the next stages
+                        if setup:
+                            setup()
+                        func()
+                        continue
+                    remaining.remove(name)
+                    result = {"stage": name, "years": n_years, "series": n_series, "registers": registers,
+                              **measure(func, repeat, setup, memory)}
+                    results.append(result)
+                    peak = f", peak {result['peak_kib'] / 1024:.1f} MiB" if memory else ""
+                    if "requests_per_second" in result:
+                        peak += (f", {result['requests_per_second']:.0f} requests/s, "
+                                 f"p95 {result['latency_p95_ms']:.1f} ms")
+                    logger.info(f"{name} [{n_years}y x {n_series}]: {result['seconds_median']:.4f}s{peak}")
+    return results
+
+def compare(results: list[dict], baseline: list[dict], threshold: float = 0.25) -> list[dict]:
+    """Finds the stages that regressed against a baseline.
+
+    Parameters
+    ----------
+    results : list[dict]
+        Results of the current run, as returned by `run`.
+    baseline : list[dict]
+        Results of the baseline run.
+    threshold : float, optional
+        Relative increase of the median time or of the peak memory that counts as a regression,
+        by default 0.25. Increases below `MIN_SECONDS` or `MIN_KIB` are ignored.
+
+    Returns
+    -------
+    list[dict]
+        One row per regressed measure, with the "stage", "years", "series", "measure", "baseline",
+        "current" and "ratio".
+    """
+    known = {(row["stage"], row["years"], row["series"]): row for row in baseline}
+    regressions = []
+    for row in results:
+        base = known.get((row["stage"], row["years"], row["series"]))
+        if base is None:
+            continue
+        for measure_name, slack in (("seconds_median", MIN_SECONDS), ("peak_kib", MIN_KIB)):
+            current, previous = row.get(measure_name), base.get(measure_name)
+            if current is None or not previous:
+                continue
+            if current > previous * (1 + threshold) and current - previous > slack:
+                regressions.append({"stage": row["stage"], "years": row["years"], "series": row["series"],
+                                    "measure": measure_name, "baseline": previous, "current": current,
+                                    "ratio": current / previous})
+    return regressions
+
+def environment() -> dict:
+    """Describes the machine and the versions the benchmark ran with."""
+    import numpy
+    import pandas
+    import polars
+    import statsmodels
+
+    return {"date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "numpy": numpy.__version__,
+            "pandas": pandas.__version__,
+            "polars": polars.__version__,
+            "statsmodels": statsmodels.__version__}
+
+def main(argv: list[str] = None) -> int:
+    config = load_config(CONFIG_FILEPATH)
+    bench_config = config["benchmark"]
+    parser = argparse.ArgumentParser(description="Benchmarks the data and model stages on synthetic data.")
+    parser.add_argument("--years", type=int, nargs="+", default=bench_config["years"])
+    parser.add_argument("--series", type=int, nargs="+", default=bench_config["series"])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=bench_config["repeat"])
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run of each stage")
+    parser.add_argument("--output", default=bench_config["results_path"])
+    parser.add_argument("--baseline", default=bench_config["baseline_path"])
+    parser.add_argument("--threshold", type=float, default=bench_config["threshold"])
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="fail if a stage regressed against the baseline")
+    args = parser.parse_args(argv)
+
+    results = run(args.years, args.series, args.stages,
+                  repeat=args.repeat,
+                  max_registers=bench_config["max_registers"],
+                  memory=not args.no_memory,
+                  seed=bench_config["seed"],
+                  order=tuple(config["model"]["sarimax_order"]),
+                  seasonal_order=tuple(config["model"]["seasonal_order"]))
+    report = {"environment": environment(), "results": results}
+    outputs = [args.output] + ([args.baseline] if args.save_baseline else [])
+    for filepath in outputs:
+        os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+        with open(filepath, "w") as file:
+            json.dump(report, file, indent=2)
+        logger.success(f"Results saved to {filepath}")
+
+    if args.check:
+        if not os.path.exists(args.baseline):
+            logger.error(f"No baseline found at {args.baseline}")
+            return 1
+        with open(args.baseline, "r") as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for row in regressions:
+            logger.error(f"{row['stage']} [{row['years']}y x {row['series']}] {row['measure']}: "
+                         f"{row['baseline']:.4g} -> {row['current']:.4g} ({row['ratio']:.2f}x)")
+        if regressions:
+            return 1
+        logger.success("No stage regressed against the baseline")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+
+from scripts import raw_store
+from scripts.process_data import BRENT_SERIES
+
+# Last day of the generated data, so every run produces the same dates
+END_DATE = "2023-12-29"
+
+def business_days(n_years: int, end: str = END_DATE) -> pd.DatetimeIndex:
+    """Lists the business days of the given number of years, up to `end`.
+
+    Parameters
+    ----------
+    n_years : int
+        Number of years.
+    end : str, optional
+        Last day, by default `END_DATE`.
+
+    Returns
+    -------
+    pd.DatetimeIndex
+        The business days, in increasing order.
+    """
+    end = pd.Timestamp(end)
+    return pd.bdate_range(end - pd.DateOffset(years=n_years) + pd.Timedelta(days=1), end)
+
+def series_names(n_series: int) -> list[str]:
+    """Names the generated series, the first one being the Brent spot price used by the model.
+
+    Parameters
+    ----------
+    n_series : int
+        Number of series.
+
+    Returns
+    -------
+    list[str]
+        The `series-description` of each series.
+    """
+    return [BRENT_SERIES] + [f"Synthetic Spot Price {index} (Dollars per Barrel)" for index in range(1, n_series)]
+
+def price_paths(n_obs: int, n_series: int, seed: int = 0) -> np.ndarray:
+    """Generates price series as geometric random walks with a weekly pattern.
+
+    Parameters
+    ----------
+    n_obs : int
+        Number of observations of each series.
+    n_series : int
+        Number of series.
+    seed : int, optional
+        Seed of the random generator, by default 0.
+
+    Returns
+    -------
+    np.ndarray
+        Prices rounded to cents, with one row per observation and one column per series.
+    """
+    rng = np.random.default_rng(seed)
+    start = rng.uniform(20, 120, size=n_series)
+    returns = rng.normal(0, 0.02, size=(n_obs, n_series))
+    weekly = 0.002 * np.sin(2 * np.pi * np.arange(n_obs) / 5)[:, None]
+    return np.round(start * np.exp(np.cumsum(returns + weekly, axis=0)), 2)
+
+def raw_responses(n_years: int, n_series: int, seed: int = 0) -> list[dict]:
+    """Generates EIA API responses shaped like the ones returned by `scripts.raw_data.fetch`.
+
+    There is one response per year, with the registers of every series sorted from the newest
+    period to the oldest, as returned by the API.
+
+    Parameters
+    ----------
+    n_years : int
+        Number of years.
+    n_series : int
+        Number of series.
+    seed : int, optional
+        Seed of the random generator, by default 0.
+
+    Returns
+    -------
+    list[dict]
+        The responses, from the newest year to the oldest.
+    """
+    dates = business_days(n_years)
+    prices = price_paths(len(dates), n_series, seed)
+    names = series_names(n_series)
+    periods = dates.strftime("%Y-%m-%d")
+    values = prices.astype(str)
+    responses = []
+    for year in sorted(set(dates.year), reverse=True):
+        positions = np.flatnonzero(dates.year == year)[::-1]
+        registers = [{"period": periods[position],
+                      "duoarea": "ZEU",
+                      "area-name": "NA",
+                      "product": f"EPC{index:04d}",
+                      "product-name": name,
+                      "process": "PF4",
+                      "process-name": "Spot Price FOB",
+                      "series": f"SYN{index:04d}",
+                      "series-description": name,
+                      "value": values[position, index],
+                      "units": "$/BBL"}
+                     for position in positions for index, name in enumerate(names)]
+        responses.append({"response": {"total": str(len(registers)),
+                                       "dateFormat": "YYYY-MM-DD",
+                                       "frequency": "daily",
+                                       "data": registers},
+                          "request": {"command": "/v2/petroleum/pri/spt/data/",
+                                      "params": {"start": f"{year}-01-01", "end": f"{year}-12-31"}},
+                          "apiVersion": "2.1.8"})
+    return responses
+
+def write_raw(store_dir: str, n_years: int, n_series: int, seed: int = 0) -> int:
+    """Writes generated EIA API responses in a raw data store.
+
+    Parameters
+    ----------
+    store_dir : str
+        Directory of the store.
+    n_years : int
+        Number of years.
+    n_series : int
+        Number of series.
+    seed : int, optional
+        Seed of the random generator, by default 0.
+
+    Returns
+    -------
+    int
+        Number of registers written.
+    """
+    return raw_store.write_responses(raw_responses(n_years, n_series, seed), store_dir)
+
+def price_frame(n_years: int, n_series: int = 1, seed: int = 0) -> pd.DataFrame:
+    """Generates price series in the organized format of the processed datasets.
+
+    Parameters
+    ----------
+    n_years : int
+        Number of years.
+    n_series : int, optional
+        Number of series, by default 1.
+    seed : int, optional
+        Seed of the random generator, by default 0.
+
+    Returns
+    -------
+    pd.DataFrame
+        A DataFrame with the columns "id", "date" and "price", sorted by series and date.
+    """
+    dates = business_days(n_years)
+    prices = price_paths(len(dates), n_series, seed)
+    return pd.DataFrame({"id": np.repeat(series_names(n_series), len(dates)),
+                         "date": np.tile(dates.strftime("%Y-%m-%d"), n_series),
+                         "price": prices.T.ravel()})
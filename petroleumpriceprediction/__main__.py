@@ -0,0 +1,5 @@
+import sys
+
+from petroleumpriceprediction.cli import main
+
+sys.exit(main())
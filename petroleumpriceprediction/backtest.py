@@ -0,0 +1,193 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from petroleumpriceprediction.batch import available_workers
+from petroleumpriceprediction.model import SARIMAXPredictor
+
+def forecast_origins(n_obs: int, horizon: int, n_origins: int, step: int = 1, min_train: int = 1) -> np.ndarray:
+    """Lists the forecast origins of a backtest, ending at the last origin with a full horizon.
+
+    An origin `o` means the model is trained on the observations before `o` and forecasts the
+    observations `o` to `o + horizon - 1`.
+
+    Parameters
+    ----------
+    n_obs : int
+        Number of observations of the series.
+    horizon : int
+        Number of steps forecast from each origin.
+    n_origins : int
+        Maximum number of origins.
+    step : int, optional
+        Number of observations between consecutive origins, by default 1.
+    min_train : int, optional
+        Minimum number of training observations before the first origin, by default 1.
+
+    Returns
+    -------
+    np.ndarray
+        The origins, in increasing order.
+    """
+    last = n_obs - horizon
+    first = max(min_train, last - (n_origins - 1) * step)
+    return np.arange(last, first - 1, -step)[::-1]
+
+def forecast_metrics(actual: np.ndarray, predicted: np.ndarray) -> pd.DataFrame:
+    """Computes the error metrics of every forecast step at once.
+
+    Parameters
+    ----------
+    actual : np.ndarray
+        Actual values, with one row per origin and one column per step.
+    predicted : np.ndarray
+        Forecast values, with the same shape as `actual`.
+
+    Returns
+    -------
+    pd.DataFrame
+        The MAE, RMSE and MAPE of each step, indexed by the step (starting at 1).
+    """
+    errors = predicted - actual
+    return pd.DataFrame({
+        "mae": np.nanmean(np.abs(errors), axis=0),
+        "rmse": np.sqrt(np.nanmean(errors ** 2, axis=0)),
+        "mape": np.nanmean(np.abs(errors) / np.abs(actual), axis=0),
+    }, index=pd.RangeIndex(1, actual.shape[1] + 1, name="step"))
+
+def run_folds(sarimax: SARIMAXPredictor, y: np.ndarray, origins: np.ndarray, horizon: int,
+              window: str = "expanding", window_size: int = None, refit_every: int = None,
+              exog: np.ndarray = None) -> np.ndarray:
+    """Forecasts a block of consecutive origins, fitting the model only at the first one.
+
+    The following origins reuse the fitted parameters: the state-space results are extended with
+    the observations since the previous origin, starting from its filtered state (expanding window),
+    or re-filtered over the shifted window (rolling window), which is much cheaper than optimizing
+    the parameters again. Extending costs the same whatever the length of the history.
+
+    Parameters
+    ----------
+    sarimax : SARIMAXPredictor
+        Predictor holding the model specification.
+    y : np.ndarray
+        The whole target series.
+    origins : np.ndarray
+        The origins of the block, in increasing order.
+    horizon : int
+        Number of steps forecast from each origin.
+    window : str, optional
+        "expanding" or "rolling", by default "expanding".
+    window_size : int, optional
+        Number of training observations of the rolling window.
+    refit_every : int, optional
+        Number of origins after which the parameters are estimated again, warm-started from the
+        previous ones, by default never.
+    exog : np.ndarray, optional
+        The exogenous variables of the whole series, with one row per observation. As in production,
+        where their future is unknown, their last values before each origin are held constant over
+        the forecast horizon.
+
+    Returns
+    -------
+    np.ndarray
+        Forecasts with one row per origin and one column per step.
+    """
+    forecasts = np.empty((len(origins), horizon))
+    results = None
+    previous = None
+    # Slices of the exogenous variables, or None without them
+    rows = (lambda first, last: exog[first:last]) if exog is not None else (lambda first, last: None)
+    # Last values before an origin, held over the horizon
+    held = ((lambda origin: np.repeat(exog[origin - 1:origin], horizon, axis=0)) if exog is not None
+            else (lambda origin: None))
+    for index, origin in enumerate(origins):
+        start = origin - window_size if window == "rolling" else 0
+        train = y[start:origin]
+        if results is None or (refit_every and index % refit_every == 0):
+            start_params = results.params if results is not None else None
+            results = sarimax.build_model(train, rows(start, origin)).fit(start_params=start_params, disp=False)
+        elif window == "rolling":
+            results = results.apply(train, exog=rows(start, origin))
+        else:
+            results = results.extend(y[previous:origin], exog=rows(previous, origin))
+        forecasts[index] = results.forecast(steps=horizon, exog=held(origin))
+        previous = origin
+    return forecasts
+
+def backtest(sarimax: SARIMAXPredictor, data: pd.DataFrame, horizon: int, n_origins: int, step: int = 1,
+             window: str = "expanding", min_train: int = None, refit_every: int = None,
+             max_workers: int = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Evaluates a predictor over many rolling or expanding forecast origins.
+
+    The origins are split into contiguous blocks run in parallel processes, each block fitting
+    the model once, as in `run_folds`.
+
+    Parameters
+    ----------
+    sarimax : SARIMAXPredictor
+        Predictor holding the model specification. It does not need to be fitted.
+    data : pd.DataFrame
+        The preprocessed series, sorted by date, with the target in column "y" and the exogenous
+        columns of the predictor.
+    horizon : int
+        Number of steps forecast from each origin.
+    n_origins : int
+        Maximum number of origins.
+    step : int, optional
+        Number of observations between consecutive origins, by default 1.
+    window : str, optional
+        "expanding" (train on every observation before the origin) or "rolling" (train on the last
+        `min_train` observations), by default "expanding".
+    min_train : int, optional
+        Minimum number of training observations, and the size of the rolling window, by default
+        half of the series.
+    refit_every : int, optional
+        Number of origins after which the parameters are estimated again, by default only once per block.
+    max_workers : int, optional
+        Number of worker processes, by default the number of available cores.
+
+    Returns
+    -------
+    tuple[pd.DataFrame, pd.DataFrame]
+        The forecasts (one row per origin and step, with the "origin", "step", "ds", "y" and "yhat"
+        columns) and the metrics of each step, as in `forecast_metrics`.
+
+    Raises
+    ------
+    ValueError
+        If the window is unknown or the series is too short for the horizon.
+    """
+    if window not in ("expanding", "rolling"):
+        raise ValueError(f"Unknown window '{window}': use 'expanding' or 'rolling'.")
+    y = data["y"].to_numpy(dtype=float)
+    exog = data[sarimax.exog].to_numpy(dtype=float) if sarimax.exog else None
+    min_train = min_train or len(y) // 2
+    origins = forecast_origins(len(y), horizon, n_origins, step, min_train)
+    if len(origins) == 0:
+        raise ValueError("The series is too short for the requested horizon and training size.")
+
+    max_workers = min(max_workers or available_workers(), len(origins))
+    blocks = np.array_split(origins, max_workers)
+    logger.info(f"Backtesting {len(origins)} origins in {len(blocks)} blocks")
+    # Only the specification is sent to the workers, not the fitted results of the predictor
+    specification = SARIMAXPredictor(sarimax.order, sarimax.seasonal_order, trend=sarimax.trend, exog=sarimax.exog)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(run_folds, specification, y, block, horizon, window, min_train, refit_every,
+                                   exog)
+                   for block in blocks]
+        predicted = np.vstack([future.result() for future in futures])
+
+    positions = origins[:, None] + np.arange(horizon)
+    actual = y[positions]
+    metrics = forecast_metrics(actual, predicted)
+
+    forecasts = pd.DataFrame({
+        "origin": np.repeat(origins, horizon),
+        "step": np.tile(np.arange(1, horizon + 1), len(origins)),
+        "y": actual.ravel(),
+        "yhat": predicted.ravel(),
+    })
+    if "ds" in data:
+        forecasts.insert(2, "ds", data["ds"].to_numpy()[positions.ravel()])
+    return forecasts, metrics
@@ -0,0 +1,159 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from loguru import logger
+
+from petroleumpriceprediction.model import SARIMAXPredictor
+from petroleumpriceprediction.registry import slugify
+
+# Extension of the model files written for each series
+ARTIFACT_SUFFIX = ".npz"
+
+def available_workers() -> int:
+    """Returns the number of cores available to the current process.
+
+    Returns
+    -------
+    int
+        Number of cores the process is allowed to run on.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def artifact_path(model_dir: str, unique_id: str) -> str:
+    """Builds the path of the model file of a series.
+
+    Parameters
+    ----------
+    model_dir : str
+        Directory where the model files are saved.
+    unique_id : str
+        Identifier of the series, e.g. its `series-description`.
+
+    Returns
+    -------
+    str
+        Path to the model file, named after a slug of the identifier.
+    """
+    return os.path.join(model_dir, slugify(unique_id) + ARTIFACT_SUFFIX)
+
+def fit_series(unique_id: str, data: pd.DataFrame, order: tuple, seasonal_order: tuple, model_dir: str) -> dict:
+    """Fits and saves the model of a single series.
+
+    Any error is caught and reported, so a failing series never aborts the batch.
+
+    Parameters
+    ----------
+    unique_id : str
+        Identifier of the series.
+    data : pd.DataFrame
+        The preprocessed series, with the target in column "y".
+    order : tuple
+        ARIMA parameters (p, d, q).
+    seasonal_order : tuple
+        Seasonal ARIMA parameters (P, D, Q, s).
+    model_dir : str
+        Directory where the model file is saved.
+
+    Returns
+    -------
+    dict
+        Report of the series with its "unique_id", "status", "rows", "fit_seconds", "path" and "error".
+    """
+    report = {"unique_id": unique_id, "status": "failed", "rows": len(data),
+              "fit_seconds": None, "path": None, "error": None}
+    try:
+        sarimax = SARIMAXPredictor(order=order, seasonal_order=seasonal_order)
+        start = time.perf_counter()
+        sarimax.fit(data)
+        report["fit_seconds"] = time.perf_counter() - start
+        report["path"] = artifact_path(model_dir, unique_id)
+        sarimax.save(report["path"])
+        report["status"] = "ok"
+    except Exception as error:
+        report["error"] = f"{type(error).__name__}: {error}"
+    return report
+
+def fit_all(dataset: pd.DataFrame, order: tuple, seasonal_order: tuple,
+            model_dir: str, max_workers: int = None) -> pd.DataFrame:
+    """Fits one model per series of a long-format dataset in a process pool.
+
+    Parameters
+    ----------
+    dataset : pd.DataFrame
+        The preprocessed dataset, with the columns "unique_id", "ds" and "y".
+    order : tuple
+        ARIMA parameters (p, d, q), shared by every series.
+    seasonal_order : tuple
+        Seasonal ARIMA parameters (P, D, Q, s), shared by every series.
+    model_dir : str
+        Directory where one model file per series is saved.
+    max_workers : int, optional
+        Number of worker processes, by default the number of available cores.
+
+    Returns
+    -------
+    pd.DataFrame
+        One report row per series, as returned by `fit_series`. It is also saved as
+        "report.csv" in `model_dir`.
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    series = {unique_id: group.reset_index(drop=True)
+              for unique_id, group in dataset.groupby("unique_id", sort=True, observed=True)}
+    max_workers = min(max_workers or available_workers(), len(series)) or 1
+    logger.info(f"Fitting {len(series)} series with {max_workers} workers")
+
+    reports = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(fit_series, str(unique_id), group, order, seasonal_order, model_dir)
+                   for unique_id, group in series.items()]
+        for future in as_completed(futures):
+            report = future.result()
+            reports.append(report)
+            if report["status"] == "ok":
+                logger.success(f"{report['unique_id']}: fitted {report['rows']} rows "
+                               f"in {report['fit_seconds']:.2f}s")
+            else:
+                logger.error(f"{report['unique_id']}: {report['error']}")
+
+    reports = pd.DataFrame(reports).sort_values("unique_id").reset_index(drop=True)
+    reports.to_csv(os.path.join(model_dir, "report.csv"), index=False)
+    failed = (reports["status"] != "ok").sum()
+    logger.info(f"Batch finished: {len(reports) - failed} series fitted, {failed} failed")
+    return reports
+
+def fit_together(dataset: pd.DataFrame, predictor, model_dir: str) -> pd.DataFrame:
+    """Fits every series of a long-format dataset with a single statsforecast predictor.
+
+    The series are fitted in parallel by statsforecast itself, and saved in a single model file.
+
+    Parameters
+    ----------
+    dataset : pd.DataFrame
+        The preprocessed dataset, with the columns "unique_id", "ds" and "y".
+    predictor : StatsForecastPredictor
+        The unfitted predictor.
+    model_dir : str
+        Directory where the model file is saved.
+
+    Returns
+    -------
+    pd.DataFrame
+        One report row per series, as in `fit_all`. The fit time is the one of the whole batch.
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    rows = dataset.groupby("unique_id", sort=True, observed=True).size()
+    path = os.path.join(model_dir, "statsforecast.pkl")
+    logger.info(f"Fitting {len(rows)} series with statsforecast")
+    start = time.perf_counter()
+    predictor.fit(dataset)
+    fit_seconds = time.perf_counter() - start
+    predictor.save(path)
+
+    reports = pd.DataFrame({"unique_id": rows.index.astype(str), "status": "ok", "rows": rows.to_numpy(),
+                            "fit_seconds": fit_seconds, "path": path, "error": None})
+    reports.to_csv(os.path.join(model_dir, "report.csv"), index=False)
+    logger.info(f"Batch finished: {len(reports)} series fitted in {fit_seconds:.2f}s")
+    return reports
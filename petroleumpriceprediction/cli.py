@@ -0,0 +1,191 @@
+import argparse
+import sys
+
+# Only the standard library is imported here: every command imports its own dependencies, so the
+# light ones (config, --help) start without loading pandas, statsmodels or the HTTP clients
+
+CONFIG_FILEPATH = "config.yaml"
+
+# Stages of the pipeline run by each command
+COMMAND_STAGES = {
+    "fetch": ["fetch"],
+    "process": ["organize", "organize_opec"],
+    "train": ["train", "train_batch"],
+    "run": None,
+}
+
+def main(argv: list[str] = None) -> int:
+    """
+    Runs the command line interface of the project.
+
+    Parameters
+    ----------
+    argv : list[str], optional
+        The arguments, by default the ones of the process.
+
+    Returns
+    -------
+    int
+        The exit status.
+    """
+    parser = build_parser()
+    # The arguments of `bench` are parsed by the benchmarks themselves
+    args, extra = parser.parse_known_args(argv)
+    if args.command == "bench":
+        args.arguments = extra
+    elif extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    return args.handler(args) or 0
+
+def build_parser() -> argparse.ArgumentParser:
+    """Declares the commands and their arguments."""
+    parser = argparse.ArgumentParser(prog="petroleum", description="Brent price data, models and forecasts.")
+    parser.add_argument("--config", default=CONFIG_FILEPATH, help="configuration file (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True, metavar="command")
+
+    fetch = commands.add_parser("fetch", help="fetch the raw data from the EIA API")
+    fetch.add_argument("--create", type=int, metavar="YEARS", help="fetch the last YEARS years from scratch")
+    fetch.add_argument("--update", action="store_true", help="fetch only the days after the newest raw data")
+    commands.add_parser("process", help="build the datasets from the raw and external data")
+    commands.add_parser("train", help="train the configured models")
+    commands.add_parser("run", help="run every stage of the pipeline")
+    for name in COMMAND_STAGES:
+        commands.choices[name].add_argument("--force", action="store_true", default=None,
+                                            help="run the stages even when they are up to date")
+        commands.choices[name].set_defaults(handler=run_stages)
+    commands.choices["run"].add_argument("--publish", action="store_true",
+                                         help="publish the datasets and models as a new release")
+
+    forecast = commands.add_parser("forecast", help="forecast the next business days with a saved model")
+    forecast.add_argument("--steps", type=int, default=5, help="business days to forecast (default: %(default)s)")
+    forecast.add_argument("--alpha", type=float, default=0.05,
+                          help="significance level of the intervals (default: %(default)s)")
+    forecast.add_argument("--model", help="model file (default: the one of the configured engine)")
+    forecast.add_argument("--output", help="CSV file to write the forecast to, instead of printing it")
+    forecast.add_argument("--levels", action="store_true",
+                          help="forecast the weekly and monthly averages instead (temporal engine)")
+    forecast.add_argument("--allow-pickle", action="store_true", default=None,
+                          help="load a pickled model, which runs its code: only for files you trust "
+                          "(default: model.allow_pickle)")
+    forecast.set_defaults(handler=forecast_command)
+
+    serve = commands.add_parser("serve", help="serve the saved models over HTTP")
+    serve.add_argument("--host", help="address to listen on (default: serve.host)")
+    serve.add_argument("--port", type=int, help="port to listen on (default: serve.port)")
+    serve.set_defaults(handler=serve_command)
+
+    bench = commands.add_parser("bench", help="benchmark the stages on synthetic data, taking the arguments "
+                                "of `python -m benchmarks.run`", add_help=False)
+    bench.set_defaults(handler=bench_command)
+
+    schedule = commands.add_parser("schedule", help="refresh the data and models and publish them on the "
+                                   "schedule set in scheduler.cron, until interrupted")
+    schedule.add_argument("--once", action="store_true", help="refresh once now, then exit")
+    schedule.set_defaults(handler=schedule_command)
+
+    config = commands.add_parser("config", help="print the configuration, or one of its values")
+    config.add_argument("key", nargs="?", help="dotted key, e.g. model.sarimax_order")
+    config.set_defaults(handler=config_command)
+    return parser
+
+def run_stages(args: argparse.Namespace) -> int:
+    """Runs the stages of the pipeline of a command."""
+    from loguru import logger
+    from petroleumpriceprediction.config import load_config
+    from petroleumpriceprediction.pipeline import run
+
+    config = load_config(args.config)
+    if args.command == "fetch":
+        if args.create is not None:
+            config["data"].update(create_rawdata=True, size=args.create)
+        elif args.update:
+            config["data"].update(create_rawdata=False, update_rawdata=True)
+    try:
+        run(config, args.config, names=COMMAND_STAGES[args.command], force=args.force,
+            publish=getattr(args, "publish", False))
+    except RuntimeError as error:
+        logger.error(error)
+        return 1
+    return 0
+
+def forecast_command(args: argparse.Namespace) -> int:
+    """Prints or writes the forecast of a saved model."""
+    from loguru import logger
+    from petroleumpriceprediction.config import load_config, model_path
+    from petroleumpriceprediction.model import load_predictor
+    from petroleumpriceprediction.serve import forecast_frame
+
+    model_config = load_config(args.config)["model"]
+    filepath = args.model or model_path(model_config)
+    allow_pickle = model_config["allow_pickle"] if args.allow_pickle is None else args.allow_pickle
+    try:
+        predictor = load_predictor(filepath, allow_pickle=allow_pickle)
+    except OSError as error:
+        logger.error(f"Could not read the model {filepath}: {error.strerror or error}")
+        return 1
+    except ValueError as error:
+        logger.error(error)
+        return 1
+    if args.levels:
+        if not hasattr(predictor, "forecast_levels"):
+            logger.error(f"The model of {filepath} has no aggregated levels: train it with the temporal engine")
+            return 1
+        forecast = predictor.forecast_levels(args.steps, alpha=args.alpha)
+        forecast = forecast[forecast["level"] != "daily"]
+    else:
+        forecast = forecast_frame(predictor, steps=args.steps, alpha=args.alpha)
+    if args.output:
+        forecast.to_csv(args.output, index=False)
+        logger.success(f"Forecast saved to {args.output}")
+    else:
+        print(forecast.to_string(index=False))
+    return 0
+
+def serve_command(args: argparse.Namespace) -> int:
+    """Serves the saved models until interrupted."""
+    from petroleumpriceprediction import serve
+    from petroleumpriceprediction.config import load_config
+
+    config = load_config(args.config)
+    for key in ("host", "port"):
+        if getattr(args, key) is not None:
+            config["serve"][key] = getattr(args, key)
+    serve.main(config)
+    return 0
+
+def schedule_command(args: argparse.Namespace) -> int:
+    """Refreshes the data and models on schedule, or once."""
+    from petroleumpriceprediction.config import load_config
+    from petroleumpriceprediction.scheduler import CronSchedule, run_forever, run_refresh
+
+    scheduler_config = load_config(args.config)["scheduler"]
+    if args.once:
+        return 0 if run_refresh(args.config, scheduler_config["timeout"]) else 1
+    try:
+        run_forever(CronSchedule(scheduler_config["cron"]), args.config, scheduler_config["timeout"])
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+def bench_command(args: argparse.Namespace) -> int:
+    """Runs the benchmarks, as `python -m benchmarks.run`."""
+    from benchmarks import run
+
+    return run.main(args.arguments)
+
+def config_command(args: argparse.Namespace) -> int:
+    """Prints the configuration, or the value of a dotted key."""
+    import yaml
+    from petroleumpriceprediction.config import load_config
+
+    value = load_config(args.config)
+    for part in (args.key.split(".") if args.key else []):
+        if not isinstance(value, dict) or part not in value:
+            print(f"Key '{args.key}' not found in {args.config}", file=sys.stderr)
+            return 1
+        value = value[part]
+    print(yaml.safe_dump(value, default_flow_style=None, sort_keys=False).rstrip("\n").removesuffix("\n..."))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
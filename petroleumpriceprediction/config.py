@@ -1,5 +1,8 @@
+import re
 import yaml
 
+from petroleumpriceprediction.files import write_text
+
 def load_config(filepath: str) -> dict:
     """Loads configurations from a YAML file.
     
@@ -16,3 +19,64 @@ def load_config(filepath: str) -> dict:
     with open(filepath, "r") as file:
         config = yaml.safe_load(file)
     return config
+
+def update_config(filepath: str, section: str, values: dict) -> None:
+    """Updates keys of a section of a YAML configuration file in place.
+
+    Only the values of the given keys are rewritten, so the layout and the comments of the
+    file are preserved.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to the YAML file containing the configuration settings.
+    section : str
+        Name of the top-level section holding the keys, e.g. "model".
+    values : dict
+        New values, by key. Lists are written in flow style, as in "[1, 1, 1]".
+
+    Raises
+    ------
+    KeyError
+        If any of the keys is not found in the section.
+    """
+    with open(filepath, "r") as file:
+        lines = file.read().split("\n")
+
+    pending = dict(values)
+    current_section = None
+    for index, line in enumerate(lines):
+        section_match = re.match(r"^(\w+):", line)
+        if section_match:
+            current_section = section_match.group(1)
+            continue
+        key_match = re.match(r"^(\s+)(\w+):(\s*)([^#]*?)(\s*#.*)?$", line)
+        if current_section == section and key_match and key_match.group(2) in pending:
+            indent, key, _, _, comment = key_match.groups()
+            value = yaml.safe_dump(pending.pop(key), default_flow_style=True, width=float("inf")).strip()
+            if value.endswith("\n..."):
+                value = value[:-4].strip()
+            lines[index] = f"{indent}{key}: {value}{comment or ''}"
+
+    if pending:
+        raise KeyError(f"Keys {list(pending)} not found in section '{section}' of {filepath}")
+    # Written to a temporary file then moved over the configuration, so readers never see a partial file
+    write_text(filepath, "\n".join(lines))
+
+def model_path(model_config: dict) -> str:
+    """Returns the path of the model file of the configured engine.
+
+    Parameters
+    ----------
+    model_config : dict
+        The "model" section of the configuration.
+
+    Returns
+    -------
+    str
+        The path of the model file.
+    """
+    engine = model_config.get("engine", "statsmodels")
+    if engine in ("statsforecast", "ensemble", "temporal"):
+        return model_config[engine]["path"]
+    return model_config["path"]
@@ -1,31 +1,59 @@
+import hashlib
+import os
+from functools import lru_cache
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
 
-def load(filepath: str) -> pd.DataFrame:
+from petroleumpriceprediction.files import write_atomic
+
+# Extension of the columnar sidecar kept next to each CSV file
+CACHE_SUFFIX = ".arrow"
+
+def load(filepath: str, cache: bool = True) -> pd.DataFrame:
     """Loads data from a CSV file.
-    
+
+    The parsed data is kept in an Arrow IPC sidecar next to the CSV file, with dictionary-encoded
+    strings, a native date column and float prices. Later loads memory-map the sidecar instead of
+    parsing the CSV again, for as long as the CSV file is not modified. Either way, the DataFrame
+    has the types `pd.read_csv` gives it: object strings and nanosecond dates.
+
     Parameters
     ----------
     filepath : str
         Path to the CSV file containing the data.
-    
+    cache : bool, optional
+        Whether to use the columnar sidecar, by default True.
+
     Returns
     -------
     pd.DataFrame
         The loaded DataFrame with parsed dates.
     """
-    data = pd.read_csv(filepath, 
-                       sep=',', 
-                       parse_dates=['date'])
-    return data
+    if not cache:
+        data = pd.read_csv(filepath,
+                           sep=',',
+                           parse_dates=['date'])
+        return data
+
+    sidecar = cache_path(filepath)
+    fingerprint = file_fingerprint(filepath)
+    table = _read_sidecar(sidecar, fingerprint)
+    if table is None:
+        table = _read_csv(filepath)
+        _write_sidecar(sidecar, table, fingerprint)
+    return _to_pandas(table)
 
 def preprocess(data: pd.DataFrame) -> pd.DataFrame:
     """Preprocesses the input data by handling missing values and sorting it.
-    
+
     Parameters
     ----------
     data : pd.DataFrame
         The input DataFrame containing raw data.
-    
+
     Returns
     -------
     pd.DataFrame
@@ -39,3 +67,172 @@ def preprocess(data: pd.DataFrame) -> pd.DataFrame:
     data.drop(columns=["index"], inplace=True)
     data = data.dropna()
     return data
+
+def join_exog(data: pd.DataFrame, exog: pd.DataFrame, columns: list[str]) -> pd.DataFrame:
+    """Joins exogenous variables to the preprocessed data by date, as of each date.
+
+    Each row gets the last exogenous values known on or before its date, with a sorted as-of
+    join, so days missing in the exogenous data do not produce NaN values. Rows older than the
+    first exogenous date are dropped.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        The preprocessed DataFrame, sorted by the "ds" column.
+    exog : pd.DataFrame
+        The exogenous data, as returned by `load`, with a "date" column.
+    columns : list[str]
+        The exogenous columns to join.
+
+    Returns
+    -------
+    pd.DataFrame
+        The preprocessed DataFrame with the exogenous columns.
+    """
+    exog = exog[["date", *columns]].rename(columns={"date": "ds"}).sort_values(by="ds")
+    data = pd.merge_asof(data, exog, on="ds", direction="backward")
+    return data.dropna(subset=columns).reset_index(drop=True)
+
+def period_ends(dates, period: str) -> np.ndarray:
+    """Returns the last business day of the period of each date.
+
+    Parameters
+    ----------
+    dates : array-like
+        The dates.
+    period : str
+        A pandas period alias, e.g. "W-FRI" (weeks ending on Friday) or "M" (months).
+
+    Returns
+    -------
+    np.ndarray
+        The last business day (Monday to Friday) of the period of each date, as `datetime64[D]`.
+    """
+    ends = pd.DatetimeIndex(dates).to_period(period).end_time.values.astype("datetime64[D]")
+    return np.busday_offset(ends, 0, roll="backward")
+
+def aggregate(data: pd.DataFrame, period: str, columns: list[str]) -> pd.DataFrame:
+    """Averages the business days of the preprocessed data over periods, such as weeks or months.
+
+    Each day is labeled with the last business day of its period and the labels are grouped at
+    once, so the cost is linear in the number of days. Periods with missing days (holidays) are
+    averaged over the days observed.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        The preprocessed DataFrame, sorted by the "ds" column.
+    period : str
+        A pandas period alias, as in `period_ends`.
+    columns : list[str]
+        The columns averaged, e.g. ["y", "opec_price"].
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per period, dated ("ds") with its last business day, with the averaged columns and
+        the number of "days" observed. The last period may be incomplete: its date is then after the
+        last date of the data.
+    """
+    grouped = data[columns].groupby(period_ends(data["ds"], period), sort=True)
+    aggregated = grouped.mean()
+    aggregated["days"] = grouped.size()
+    aggregated.index = pd.DatetimeIndex(aggregated.index).astype(data["ds"].dtype)
+    return aggregated.rename_axis("ds").reset_index()
+
+def cache_path(filepath: str) -> str:
+    """Returns the path of the columnar sidecar of a CSV file.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to the CSV file.
+
+    Returns
+    -------
+    str
+        Path to the sidecar, next to the CSV file.
+    """
+    return os.path.splitext(filepath)[0] + CACHE_SUFFIX
+
+def file_fingerprint(filepath: str) -> dict:
+    """Computes the fingerprint used to detect changes in a file.
+
+    The SHA-256 hash is computed lazily, only when the modification time or the size of the file
+    do not match the ones previously stored.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to the file.
+
+    Returns
+    -------
+    dict
+        Dictionary with the "mtime_ns" and "size" of the file, and a "sha256" callable returning its hash.
+    """
+    stat = os.stat(filepath)
+
+    @lru_cache(maxsize=1)
+    def sha256() -> str:
+        digest = hashlib.sha256()
+        with open(filepath, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    return {"mtime_ns": str(stat.st_mtime_ns), "size": str(stat.st_size), "sha256": sha256}
+
+def _read_csv(filepath: str) -> pa.Table:
+    """Parses a CSV file into an Arrow table with dictionary-encoded string columns."""
+    table = pacsv.read_csv(filepath,
+                           convert_options=pacsv.ConvertOptions(column_types={"date": pa.date32()}))
+    for index, field in enumerate(table.schema):
+        if pa.types.is_string(field.type):
+            table = table.set_column(index, field.name, pc.dictionary_encode(table.column(index)))
+    return table
+
+def _read_sidecar(sidecar: str, fingerprint: dict) -> pa.Table:
+    """Memory-maps a sidecar, returning `None` when it is missing, unreadable or stale."""
+    if not os.path.exists(sidecar):
+        return None
+    try:
+        with pa.memory_map(sidecar, "r") as source:
+            reader = pa.ipc.open_file(source)
+            metadata = {key.decode(): value.decode()
+                        for key, value in (reader.schema.metadata or {}).items()}
+            same_stat = (metadata.get("mtime_ns") == fingerprint["mtime_ns"]
+                         and metadata.get("size") == fingerprint["size"])
+            if not same_stat and metadata.get("sha256") != fingerprint["sha256"]():
+                return None
+            table = reader.read_all()
+    except (OSError, pa.ArrowInvalid):
+        return None
+    if not same_stat:
+        # The file was touched but not changed: refresh the stored stat to skip hashing next time
+        _write_sidecar(sidecar, table, fingerprint)
+    return table
+
+def _to_pandas(table: pa.Table) -> pd.DataFrame:
+    """Converts a parsed table to a DataFrame, decoding dictionaries and casting dates to nanoseconds."""
+    fields = []
+    for field in table.schema:
+        if pa.types.is_dictionary(field.type):
+            field = field.with_type(field.type.value_type)
+        elif pa.types.is_date(field.type):
+            field = field.with_type(pa.timestamp("ns"))
+        fields.append(field)
+    return table.cast(pa.schema(fields)).to_pandas()
+
+def _write_sidecar(sidecar: str, table: pa.Table, fingerprint: dict) -> None:
+    """Writes a sidecar atomically, storing the fingerprint of its source in the schema metadata."""
+    metadata = {"mtime_ns": fingerprint["mtime_ns"],
+                "size": fingerprint["size"],
+                "sha256": fingerprint["sha256"]()}
+    table = table.replace_schema_metadata(metadata)
+
+    def write(path):
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    write_atomic(sidecar, write)
@@ -0,0 +1,57 @@
+import os
+import tempfile
+
+# Permissions of the files created by this process, as `open` would give them
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def write_atomic(filepath: str, write) -> None:
+    """
+    Writes a file to a temporary path next to it, then moves it over the file.
+
+    Readers of the file never see it partially written. The temporary path is unique per writer,
+    so threads and processes writing the same file at once do not clobber each other, and it is
+    removed if the writing fails.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to the file, whose directory is created if needed.
+    write : callable
+        Called with the temporary path, on which it writes the content of the file. The path exists,
+        as an empty file with the permissions of the file being replaced, or the default ones.
+    """
+    directory = os.path.dirname(filepath) or "."
+    os.makedirs(directory, exist_ok=True)
+    try:
+        mode = os.stat(filepath).st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    descriptor, temporary = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(filepath)}.",
+                                             suffix=".tmp")
+    os.close(descriptor)
+    try:
+        os.chmod(temporary, mode)
+        write(temporary)
+        os.replace(temporary, filepath)
+    except BaseException:
+        if os.path.lexists(temporary):
+            os.remove(temporary)
+        raise
+
+def write_text(filepath: str, content: str) -> None:
+    """
+    Writes a text file atomically, as `write_atomic` does.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to the file.
+    content : str
+        Content of the file.
+    """
+    def write(path):
+        with open(path, "w") as file:
+            file.write(content)
+
+    write_atomic(filepath, write)
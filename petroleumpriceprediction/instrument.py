@@ -0,0 +1,173 @@
+import json
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from loguru import logger
+
+from petroleumpriceprediction.files import write_text
+
+# Prefix of the metrics written in the Prometheus text format
+METRIC_PREFIX = "petroleum_stage"
+
+# Measures of a record exported as metrics, with their help text
+METRICS = {
+    "wall_seconds": "Wall time of the stage.",
+    "cpu_seconds": "CPU time of the process during the stage.",
+    "max_rss_bytes": "Peak resident set size of the process at the end of the stage.",
+    "tracemalloc_net_bytes": "Memory allocated through Python during the stage and still held at its end.",
+    "tracemalloc_peak_bytes": "Peak of the memory allocated through Python during the run.",
+    "rows": "Number of rows handled by the stage.",
+    "iterations": "Number of optimizer iterations of the stage.",
+}
+
+# ru_maxrss is in kibibytes on Linux and in bytes on macOS
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+# Name of the record of the whole run, holding the peak of the traced memory
+RUN_RECORD = "run"
+
+_settings = {"enabled": False, "tracemalloc": False, "json_path": None, "prometheus_path": None,
+             "traced": False}
+_records = []
+_lock = threading.Lock()
+
+def configure(enabled: bool = True, tracemalloc: bool = False, json_path: str = None,
+              prometheus_path: str = None) -> None:
+    """Sets up the instrumentation of the stages, and clears the records of a previous run.
+
+    The memory allocated through Python is traced from here to `write_reports`, once for the whole
+    run, as the stages running in threads share the tracing of the process.
+
+    Parameters
+    ----------
+    enabled : bool, optional
+        Whether the stages are measured, by default True. When disabled, `stage` does nothing.
+    tracemalloc : bool, optional
+        Whether to trace the memory allocated through Python, which slows the stages down, by
+        default False.
+    json_path : str, optional
+        Path of the JSON file written by `write_reports`, by default None.
+    prometheus_path : str, optional
+        Path of the Prometheus text file written by `write_reports`, by default None.
+    """
+    _settings.update(enabled=enabled, tracemalloc=tracemalloc, json_path=json_path,
+                     prometheus_path=prometheus_path)
+    with _lock:
+        _records.clear()
+    if enabled and tracemalloc:
+        _start_tracing()
+
+@contextmanager
+def stage(name: str, **fields):
+    """Measures a block of code as a stage of the pipeline.
+
+    The record yielded by the context manager can be filled with the "rows" and "iterations"
+    handled by the stage, or any other field. Once the block ends, the wall time, the CPU time and
+    the peak memory are added to it, and it is logged as a structured loguru record.
+
+    The CPU time, the peak resident set size and the traced memory are the ones of the whole
+    process, so they also count the stages running at the same time in other threads. The traced
+    memory is the difference between snapshots of it at the start and the end of the stage; its
+    peak over the run is recorded by `write_reports`.
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage.
+    **fields
+        Extra fields of the record.
+    """
+    record = {"stage": name, **fields}
+    if not _settings["enabled"]:
+        yield record
+        return
+
+    tracing = _settings["tracemalloc"] and tracemalloc.is_tracing()
+    start = tracemalloc.get_traced_memory()[0] if tracing else 0
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        record["wall_seconds"] = time.perf_counter() - wall
+        record["cpu_seconds"] = time.process_time() - cpu
+        record["max_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT
+        if tracing:
+            record["tracemalloc_net_bytes"] = tracemalloc.get_traced_memory()[0] - start
+        with _lock:
+            _records.append(record)
+        logger.bind(**record).info(_describe(record))
+
+def records() -> list[dict]:
+    """Returns a copy of the records of the stages measured since the last `configure`."""
+    with _lock:
+        return [dict(record) for record in _records]
+
+def write_reports() -> None:
+    """Writes the records to the JSON and Prometheus text files set in `configure`, if any.
+
+    When the memory is traced, its peak over the run is added as the record of the stage
+    `RUN_RECORD`, and the tracing started by `configure` is stopped.
+    """
+    if _settings["enabled"] and _settings["tracemalloc"] and tracemalloc.is_tracing():
+        record = {"stage": RUN_RECORD, "tracemalloc_peak_bytes": tracemalloc.get_traced_memory()[1]}
+        if _settings["traced"]:
+            tracemalloc.stop()
+            _settings["traced"] = False
+        with _lock:
+            _records.append(record)
+        logger.bind(**record).info(f"Run: {record['tracemalloc_peak_bytes'] / 2 ** 20:.1f} MiB traced at peak")
+    current = records()
+    if _settings["json_path"]:
+        write_text(_settings["json_path"], json.dumps(current, indent=2, default=str))
+        logger.info(f"Stage metrics saved to {_settings['json_path']}")
+    if _settings["prometheus_path"]:
+        write_text(_settings["prometheus_path"], prometheus_text(current))
+        logger.info(f"Stage metrics saved to {_settings['prometheus_path']}")
+
+def prometheus_text(stage_records: list[dict]) -> str:
+    """Formats records in the Prometheus text exposition format.
+
+    When a stage ran more than once, only its last record is exported.
+
+    Parameters
+    ----------
+    stage_records : list[dict]
+        The records, as returned by `records`.
+
+    Returns
+    -------
+    str
+        One gauge per measure, labeled by stage.
+    """
+    last = {record["stage"]: record for record in stage_records}
+    lines = []
+    for measure, help_text in METRICS.items():
+        samples = [(name, record[measure]) for name, record in last.items() if record.get(measure) is not None]
+        if not samples:
+            continue
+        lines.append(f"# HELP {METRIC_PREFIX}_{measure} {help_text}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{measure} gauge")
+        lines.extend(f'{METRIC_PREFIX}_{measure}{{stage="{name}"}} {value}' for name, value in samples)
+    return "\n".join(lines) + "\n"
+
+def _start_tracing() -> None:
+    """Starts tracing the memory allocated through Python, if needed, and resets its peak."""
+    # Tracing started by someone else is left running after the run
+    _settings["traced"] = not tracemalloc.is_tracing()
+    if _settings["traced"]:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+
+def _describe(record: dict) -> str:
+    """Summarizes a record in a log message."""
+    message = (f"Stage '{record['stage']}': {record['wall_seconds']:.3f}s wall, "
+               f"{record['cpu_seconds']:.3f}s CPU, {record['max_rss_bytes'] / 2 ** 20:.0f} MiB peak RSS")
+    if "tracemalloc_net_bytes" in record:
+        message += f", {record['tracemalloc_net_bytes'] / 2 ** 20:+.1f} MiB traced"
+    for field in ("rows", "iterations"):
+        if record.get(field) is not None:
+            message += f", {record[field]} {field}"
+    return message
@@ -1,12 +1,36 @@
+import hashlib
+import json
+import os
+import pickle
+import pickletools
+import numpy as np
 import pandas as pd
 import statsmodels.api as statsmodelapi
-import pickle
+
+from petroleumpriceprediction.files import write_atomic
+
+# Identification of the model files written by SARIMAXPredictor.save
+ARTIFACT_FORMAT = "sarimax-predictor"
+ARTIFACT_VERSION = 1
+
+# Number of trailing observations stored in a model file
+ARTIFACT_TAIL = 60
+
+# Models of the statsforecast engine
+STATSFORECAST_MODELS = ("arima", "autoarima", "ets", "naive", "seasonal_naive", "drift")
+
+# Seconds an ensemble waits for its members past their own time limit before stopping their processes
+ENSEMBLE_GRACE = 10
 
 class SARIMAXPredictor:
     """
     A class to build, train, and use a SARIMAX model for time series forecasting.
     """
-    def __init__(self, order: tuple, seasonal_order: tuple, trend: str = None):
+    # Whether `forecast_distribution` can return the simulated paths
+    supports_paths = True
+
+    def __init__(self, order: tuple, seasonal_order: tuple, trend: str = None, exog: list[str] = None,
+                 refit_after: int = None, full_refit_after: int = None, refit_maxiter: int = 10):
         """
         Initializes the SARIMAX model with specified parameters.
         
@@ -18,12 +42,32 @@ class SARIMAXPredictor:
             Seasonal ARIMA parameters (P, D, Q, s).
         trend : str, optional
             Trend component ('n', 'c', 't', 'ct'), by default None.
+        exog : list[str], optional
+            Columns of the data used as exogenous variables, e.g. ["opec_price"], by default None.
+        refit_after : int, optional
+            Number of observations added by `update` after which the parameters are re-estimated
+            with a warm start, by default never.
+        full_refit_after : int, optional
+            Number of observations added by `update` after which the model is fitted from scratch,
+            by default never.
+        refit_maxiter : int, optional
+            Maximum number of optimizer iterations of a warm-started refit, by default 10.
         """
         self.order = order
         self.seasonal_order = seasonal_order
         self.trend = trend
+        self.exog = list(exog) if exog else []
+        self.refit_after = refit_after
+        self.full_refit_after = full_refit_after
+        self.refit_maxiter = refit_maxiter
         self.model = None
         self.results = None
+        self.last_date = None
+        self.nobs = 0
+        self.updates_since_refit = 0
+        self.updates_since_fit = 0
+        # AIC and BIC of the last estimation over the whole series, kept through filter updates and saves
+        self.information_criteria = None
 
     def fit(self, data: pd.DataFrame):
         """
@@ -33,20 +77,148 @@ class SARIMAXPredictor:
         ----------
         data : pd.DataFrame
             A DataFrame containing the time series to train the model on. 
-            It must include a column "y" with the target variable.
+            It must include a column "y" with the target variable, and the
+            exogenous columns of the predictor.
+        """
+        self.model = self.build_model(data["y"], self._exog(data))
+        self.results = self.model.fit(disp=False)
+        self.information_criteria = self._criteria()
+        self.nobs = 0
+        self._track(data, refit=True)
+        self.updates_since_fit = 0
+        print("Model was successfully fitted!")
+
+    @property
+    def supports_scenarios(self) -> bool:
+        """Whether `forecast_scenarios` can be used, which needs exogenous variables."""
+        return bool(self.exog)
+
+    @property
+    def iterations(self) -> int:
+        """Number of optimizer iterations of the last fit, or `None` if the model was not optimized."""
+        retvals = getattr(self.results, "mle_retvals", None)
+        return retvals.get("iterations") if retvals else None
+
+    def update(self, new_observations: pd.DataFrame, data: pd.DataFrame = None, mode: str = None) -> str:
+        """
+        Advances the fitted model with new observations.
+        
+        With the "filter" mode, the parameters are kept and only the new observations are run
+        through the Kalman filter, starting from the last fitted state. With the "warm" mode, the
+        parameters are re-estimated on the whole series, starting from the current ones and with at
+        most `refit_maxiter` iterations. With the "full" mode, the model is fitted from scratch.
+        
+        Parameters
+        ----------
+        new_observations : pd.DataFrame
+            A DataFrame with the observations that follow the data already seen by the model.
+            It must include a column "y" with the target variable, and the exogenous columns
+            of the predictor.
+        data : pd.DataFrame, optional
+            The whole series, including the new observations. Required when the parameters are
+            re-estimated.
+        mode : str, optional
+            "filter", "warm" or "full". By default, it is chosen by the `refit_after` and
+            `full_refit_after` policy of the predictor.
+        
+        Returns
+        -------
+        str
+            The mode used to update the model.
+        
+        Raises
+        ------
+        ValueError
+            If the model has not been fitted yet, the mode is unknown, or the whole series is
+            required but not given.
+        """
+        if not self.results:
+            raise ValueError("You must fit the model before updating it.")
+        if len(new_observations) == 0:
+            return "filter"
+        if mode is None:
+            mode = self.update_mode(len(new_observations))
+        if mode not in ("filter", "warm", "full"):
+            raise ValueError(f"Unknown update mode '{mode}': use 'filter', 'warm' or 'full'.")
+        if mode != "filter" and data is None:
+            raise ValueError(f"The whole series must be given to update the model with the '{mode}' mode.")
+
+        if mode == "filter":
+            self.results = self.results.extend(new_observations["y"].to_numpy(),
+                                               exog=self._exog(new_observations))
+            self._track(new_observations, refit=False)
+        elif mode == "warm":
+            self.model = self.build_model(data["y"], self._exog(data))
+            self.results = self.model.fit(start_params=self.results.params,
+                                          maxiter=self.refit_maxiter,
+                                          disp=False)
+            self.information_criteria = self._criteria()
+            self._track(new_observations, refit=True)
+        else:
+            self.fit(data)
+        return mode
+
+    def update_mode(self, n_new: int) -> str:
+        """
+        Chooses how to update the model with new observations, following the refit policy.
+        
+        Parameters
+        ----------
+        n_new : int
+            Number of new observations.
+        
+        Returns
+        -------
+        str
+            "full" if `full_refit_after` observations were added since the last fit from scratch,
+            "warm" if `refit_after` observations were added since the last parameter estimation,
+            otherwise "filter".
+        """
+        if self.full_refit_after and self.updates_since_fit + n_new >= self.full_refit_after:
+            return "full"
+        if self.refit_after and self.updates_since_refit + n_new >= self.refit_after:
+            return "warm"
+        return "filter"
+
+    def _criteria(self) -> dict:
+        """Returns the AIC and BIC of the fitted results."""
+        return {"aic": float(self.results.aic), "bic": float(self.results.bic)}
+
+    def _track(self, observations: pd.DataFrame, refit: bool):
+        """Tracks the last date seen and the observations added since the last estimations."""
+        if "ds" in observations:
+            self.last_date = pd.Timestamp(observations["ds"].max())
+        self.nobs += len(observations)
+        self.updates_since_fit += len(observations)
+        self.updates_since_refit = 0 if refit else self.updates_since_refit + len(observations)
+
+    def build_model(self, endog: pd.Series, exog: np.ndarray = None):
+        """
+        Builds the statsmodels SARIMAX model of the given series with the predictor's specification.
+        
+        Parameters
+        ----------
+        endog : pd.Series
+            The target series.
+        exog : np.ndarray, optional
+            The exogenous variables, with one row per observation, by default None.
+        
+        Returns
+        -------
+        statsmodels.tsa.statespace.sarimax.SARIMAX
+            The unfitted model.
         """
-        self.model = statsmodelapi.tsa.statespace.SARIMAX(
-            endog=data["y"],
+        return statsmodelapi.tsa.statespace.SARIMAX(
+            endog=endog,
+            exog=exog,
             order=self.order,
             seasonal_order=self.seasonal_order, 
             trend=self.trend,
             enforce_stationarity=False,
             enforce_invertibility=False
         )
-        self.results = self.model.fit(disp=False)
-        print("Model was successfully fitted!")
 
-    def forecast(self, steps: int) -> pd.Series:
+    def forecast(self, steps: int, exog: np.ndarray = None) -> pd.Series:
         """
         Makes forecasts for the specified number of steps ahead.
         
@@ -54,6 +226,9 @@ class SARIMAXPredictor:
         ----------
         steps : int
             Number of steps (e.g., days, periods) to forecast.
+        exog : np.ndarray, optional
+            Future values of the exogenous variables, with one row per step. By default, the
+            last observed values are held constant.
         
         Returns
         -------
@@ -68,20 +243,265 @@ class SARIMAXPredictor:
         if not self.results:
             raise ValueError("You must fit the model before making forecasts.")
         
-        forecast = self.results.get_forecast(steps=steps)
+        forecast = self.results.get_forecast(steps=steps, exog=self.future_exog(steps, exog))
         return forecast.predicted_mean
 
-    def save(self, file_path: str):
+    def forecast_interval(self, steps: int, alpha: float = 0.05, exog: np.ndarray = None) -> pd.DataFrame:
+        """
+        Makes forecasts with prediction intervals for the specified number of steps ahead.
+        
+        Parameters
+        ----------
+        steps : int
+            Number of steps (e.g., days, periods) to forecast.
+        alpha : float, optional
+            Significance level of the intervals, by default 0.05 (95% intervals).
+        exog : np.ndarray, optional
+            Future values of the exogenous variables, as in `forecast`.
+        
+        Returns
+        -------
+        pd.DataFrame
+            The "mean", "lower" and "upper" forecasts of each future period.
+        
+        Raises
+        ------
+        ValueError
+            If the model has not been fitted yet.
+        """
+        if not self.results:
+            raise ValueError("You must fit the model before making forecasts.")
+        
+        forecast = self.results.get_forecast(steps=steps, exog=self.future_exog(steps, exog))
+        interval = np.asarray(forecast.conf_int(alpha=alpha))
+        return pd.DataFrame({"mean": np.asarray(forecast.predicted_mean),
+                             "lower": interval[:, 0],
+                             "upper": interval[:, 1]},
+                            index=forecast.row_labels)
+
+    def forecast_distribution(self, steps: int, n_paths: int = 10000, quantiles: tuple = (0.05, 0.5, 0.95),
+                              alpha: float = 0.05, exog: np.ndarray = None, seed: int = None,
+                              return_paths: bool = False):
+        """
+        Makes forecasts with analytic prediction intervals and quantiles of simulated future paths.
+        
+        The paths are simulated from the fitted state-space form. A forecast deviates from its
+        mean linearly in the error of the predicted state and in the future shocks, so the
+        response of every step to each of them is computed once. Every path is then drawn with a
+        single matrix product, without looping over the paths.
+        
+        Parameters
+        ----------
+        steps : int
+            Number of steps (e.g., days, periods) to forecast.
+        n_paths : int, optional
+            Number of simulated paths, by default 10000.
+        quantiles : tuple, optional
+            Quantiles of the simulated paths, by default (0.05, 0.5, 0.95).
+        alpha : float, optional
+            Significance level of the analytic intervals, by default 0.05 (95% intervals).
+        exog : np.ndarray, optional
+            Future values of the exogenous variables, as in `forecast`.
+        seed : int, optional
+            Seed of the random generator, by default None.
+        return_paths : bool, optional
+            Whether to also return the simulated paths, by default False.
+        
+        Returns
+        -------
+        pd.DataFrame | tuple[pd.DataFrame, np.ndarray]
+            The "mean", "lower" and "upper" forecasts of each future period, as in `forecast_interval`,
+            and one column per quantile, named after its percentage (e.g. "p5", "p50" and "p95").
+            With `return_paths`, the simulated paths are also returned, with one row per path and
+            one column per step.
+        
+        Raises
+        ------
+        ValueError
+            If the model has not been fitted yet.
+        """
+        distribution = self.forecast_interval(steps, alpha=alpha, exog=exog)
+        model = self.results.model
+        design = _time_invariant(model["design"])
+        transition = _time_invariant(model["transition"])
+        selection = _time_invariant(model["selection"])
+        state_cov = _time_invariant(model["state_cov"])
+        obs_cov = _time_invariant(model["obs_cov"])
+
+        # Response of each step to the error of the first predicted state: Z T^h
+        state_response = np.empty((steps, design.shape[1]))
+        state_response[0] = design[0]
+        for step in range(1, steps):
+            state_response[step] = state_response[step - 1] @ transition
+        # Response of step h to the shock of step j < h: Z T^(h-1-j) R
+        lags = np.arange(steps)[:, None] - 1 - np.arange(steps)[None, :]
+        shock_response = np.where((lags >= 0)[..., None], (state_response @ selection)[lags.clip(0)], 0)
+        shock_response = shock_response.reshape(steps, -1)
+
+        rng = np.random.default_rng(seed)
+        state_error = rng.standard_normal((n_paths, design.shape[1])) @ _matrix_sqrt(
+            self.results.predicted_state_cov[:, :, -1]).T
+        shocks = rng.standard_normal((n_paths, steps, state_cov.shape[0])) @ _matrix_sqrt(state_cov).T
+        paths = (distribution["mean"].to_numpy()
+                 + state_error @ state_response.T
+                 + shocks.reshape(n_paths, -1) @ shock_response.T)
+        if obs_cov[0, 0] > 0:
+            paths += rng.standard_normal((n_paths, steps)) * np.sqrt(obs_cov[0, 0])
+
+        for quantile, values in zip(quantiles, np.quantile(paths, quantiles, axis=0)):
+            distribution[f"p{quantile * 100:g}"] = values
+        if return_paths:
+            return distribution, paths
+        return distribution
+
+    def forecast_scenarios(self, scenarios: np.ndarray, alpha: float = 0.05) -> dict[str, np.ndarray]:
+        """
+        Makes the forecasts conditional on many future paths of the exogenous variables at once.
+        
+        The exogenous variables enter the observation equation of the fitted state-space form as a
+        regression, so a conditional forecast is the forecast of the state part, computed once with
+        the exogenous variables set to zero, plus each path times their coefficients. Every scenario
+        is then forecast by a single matrix product, and the width of its intervals, which does not
+        depend on the exogenous variables, is shared.
+        
+        Parameters
+        ----------
+        scenarios : np.ndarray
+            Future paths of the exogenous variables, with shape (scenarios, steps), or (scenarios,
+            steps, variables) with many exogenous variables.
+        alpha : float, optional
+            Significance level of the intervals, by default 0.05 (95% intervals).
+        
+        Returns
+        -------
+        dict[str, np.ndarray]
+            The "mean", "lower" and "upper" forecasts, each with one row per scenario and one column
+            per step.
+        
+        Raises
+        ------
+        ValueError
+            If the model has not been fitted yet, has no exogenous variables, or if the shape of
+            the scenarios does not match them.
+        """
+        if not self.results:
+            raise ValueError("You must fit the model before making forecasts.")
+        if not self.exog:
+            raise ValueError("The model has no exogenous variables to build scenarios on.")
+        scenarios = np.asarray(scenarios, dtype=float)
+        if scenarios.ndim == 2:
+            scenarios = scenarios[..., None]
+        if scenarios.ndim != 3 or scenarios.shape[2] != len(self.exog):
+            raise ValueError(f"Scenarios must have shape (scenarios, steps, {len(self.exog)}), "
+                             f"got {scenarios.shape}.")
+        steps = scenarios.shape[1]
+
+        base = self.forecast_interval(steps, alpha=alpha, exog=np.zeros((steps, len(self.exog))))
+        mean = base["mean"].to_numpy() + scenarios @ self.exog_coefficients()
+        return {"mean": mean,
+                "lower": mean - (base["mean"] - base["lower"]).to_numpy(),
+                "upper": mean + (base["upper"] - base["mean"]).to_numpy()}
+
+    def exog_coefficients(self) -> np.ndarray:
+        """
+        Returns the fitted coefficients of the exogenous variables.
+        
+        Returns
+        -------
+        np.ndarray
+            One coefficient per exogenous variable, in the order of `exog`.
+        """
+        model = self.results.model
+        return np.asarray(self.results.params)[model.k_trend:model.k_trend + model.k_exog]
+
+    def future_exog(self, steps: int, exog: np.ndarray = None) -> np.ndarray:
+        """
+        Builds the future values of the exogenous variables of a forecast.
+        
+        Parameters
+        ----------
+        steps : int
+            Number of steps to forecast.
+        exog : np.ndarray, optional
+            Future values of the exogenous variables, with one row per step. By default, the
+            last observed values are held constant.
+        
+        Returns
+        -------
+        np.ndarray
+            The future exogenous values with shape (steps, number of variables), or `None` if
+            the predictor has no exogenous variables.
+        """
+        if not self.exog:
+            return None
+        if exog is None:
+            return np.tile(self.results.model.exog[-1], (steps, 1))
+        return np.asarray(exog, dtype=float).reshape(steps, len(self.exog))
+
+    def _exog(self, data: pd.DataFrame) -> np.ndarray:
+        """Returns the exogenous columns of the data as an array, or `None` without exogenous variables."""
+        if not self.exog:
+            return None
+        return data[self.exog].to_numpy(dtype=float)
+
+    def save(self, file_path: str, tail: int = ARTIFACT_TAIL):
         """
         Saves the trained model to a file.
         
+        Only what is needed to forecast is stored: the fitted parameters, the model specification,
+        the predicted state at the start of a small tail of observations and the tail itself, in a
+        versioned NumPy archive with a checksum per array. The size of the file does not depend on
+        the length of the training series, and loading it does not unpickle anything.
+        
         Parameters
         ----------
         file_path : str
             Path where the model should be saved.
+        tail : int, optional
+            Number of trailing observations stored, by default `ARTIFACT_TAIL`.
+        
+        Raises
+        ------
+        ValueError
+            If the model has not been fitted yet.
         """
-        with open(file_path, 'wb') as f:
-            pickle.dump(self, f)
+        if not self.results:
+            raise ValueError("You must fit the model before saving it.")
+
+        endog = np.asarray(self.results.model.endog, dtype=float).ravel()
+        start = max(len(endog) - tail, 0)
+        arrays = {
+            "params": np.asarray(self.results.params, dtype=float),
+            "state": np.asarray(self.results.predicted_state[:, start], dtype=float),
+            "state_cov": np.asarray(self.results.predicted_state_cov[:, :, start], dtype=float),
+            "endog": endog[start:],
+        }
+        if self.exog:
+            arrays["exog"] = np.asarray(self.results.model.exog, dtype=float)[start:]
+        meta = {
+            "format": ARTIFACT_FORMAT,
+            "version": ARTIFACT_VERSION,
+            "order": list(self.order),
+            "seasonal_order": list(self.seasonal_order),
+            "trend": self.trend,
+            "exog": self.exog,
+            "refit_after": self.refit_after,
+            "full_refit_after": self.full_refit_after,
+            "refit_maxiter": self.refit_maxiter,
+            "last_date": self.last_date.isoformat() if self.last_date is not None else None,
+            "nobs": self.nobs,
+            "updates_since_refit": self.updates_since_refit,
+            "updates_since_fit": self.updates_since_fit,
+            "information_criteria": self.information_criteria,
+            "param_names": list(self.results.model.param_names),
+            "checksums": {name: _checksum(array) for name, array in arrays.items()},
+        }
+
+        def write(path):
+            with open(path, 'wb') as f:
+                np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+
+        write_atomic(file_path, write)
         print(f"Model saved to {file_path}")
 
     @staticmethod
@@ -89,6 +509,9 @@ class SARIMAXPredictor:
         """
         Loads a trained SARIMAX model from a file.
         
+        The model is rebuilt over the stored tail of observations, initialized with the stored
+        state and filtered with the stored parameters, so its forecasts match the saved model.
+        
         Parameters
         ----------
         file_path : str
@@ -98,6 +521,1275 @@ class SARIMAXPredictor:
         -------
         SARIMAXPredictor
             An instance of the loaded SARIMAXPredictor class.
+        
+        Raises
+        ------
+        ValueError
+            If the file is not a model artifact, its version is not supported or a checksum does not match.
+        """
+        with np.load(file_path, allow_pickle=False) as archive:
+            meta = json.loads(str(archive["meta"]))
+            if meta.get("format") != ARTIFACT_FORMAT:
+                raise ValueError(f"{file_path} is not a {ARTIFACT_FORMAT} file.")
+            if meta["version"] > ARTIFACT_VERSION:
+                raise ValueError(f"{file_path} has version {meta['version']}, "
+                                 f"but only up to {ARTIFACT_VERSION} is supported.")
+            arrays = {name: archive[name] for name in meta["checksums"]}
+        for name, array in arrays.items():
+            if _checksum(array) != meta["checksums"][name]:
+                raise ValueError(f"Checksum of '{name}' does not match in {file_path}.")
+
+        sarimax = SARIMAXPredictor(order=tuple(meta["order"]),
+                                   seasonal_order=tuple(meta["seasonal_order"]),
+                                   trend=meta["trend"],
+                                   exog=meta.get("exog"),
+                                   refit_after=meta["refit_after"],
+                                   full_refit_after=meta["full_refit_after"],
+                                   refit_maxiter=meta["refit_maxiter"])
+        # The tail keeps the positions it had in the training series, so forecasts are indexed as before
+        endog = pd.Series(arrays["endog"], index=pd.RangeIndex(meta["nobs"] - len(arrays["endog"]), meta["nobs"]))
+        sarimax.model = sarimax.build_model(endog, arrays.get("exog"))
+        sarimax.model.initialize_known(arrays["state"], arrays["state_cov"])
+        sarimax.results = sarimax.model.filter(arrays["params"])
+        if meta["last_date"] is not None:
+            sarimax.last_date = pd.Timestamp(meta["last_date"])
+        sarimax.nobs = meta["nobs"]
+        sarimax.updates_since_refit = meta["updates_since_refit"]
+        sarimax.updates_since_fit = meta["updates_since_fit"]
+        sarimax.information_criteria = meta.get("information_criteria")
+        return sarimax
+
+
+def _time_invariant(matrix: np.ndarray) -> np.ndarray:
+    """Returns a state-space matrix of a time-invariant model, dropping its time axis if any."""
+    matrix = np.asarray(matrix)
+    return matrix[..., -1] if matrix.ndim == 3 else matrix
+
+def _matrix_sqrt(covariance: np.ndarray) -> np.ndarray:
+    """Returns a square root `L` of a positive semi-definite covariance, with `L @ L.T == covariance`."""
+    values, vectors = np.linalg.eigh(covariance)
+    return vectors * np.sqrt(np.clip(values, 0, None))
+
+def _save_pickle(predictor, file_path: str) -> None:
+    """Pickles a predictor atomically."""
+    def write(path):
+        with open(path, "wb") as file:
+            pickle.dump(predictor, file)
+
+    write_atomic(file_path, write)
+
+def _pickled_class(file_path: str) -> str:
+    """Returns the "module.name" of the class of a pickled object, read without unpickling it, or `None`."""
+    strings = []
+    with open(file_path, "rb") as file:
+        try:
+            for opcode, argument, _ in pickletools.genops(file):
+                if opcode.name == "GLOBAL":
+                    return argument.replace(" ", ".")
+                if opcode.name == "STACK_GLOBAL":
+                    return ".".join(strings[-2:])
+                if "UNICODE" in opcode.name:
+                    strings.append(argument)
+        except ValueError:
+            pass
+    return None
+
+def _load_pickle(file_path: str, predictor_class: type):
+    """Unpickles a predictor, once the class recorded in the file is checked to be `predictor_class`."""
+    recorded = _pickled_class(file_path)
+    if recorded != f"{predictor_class.__module__}.{predictor_class.__qualname__}":
+        raise ValueError(f"{file_path} does not hold a pickled {predictor_class.__name__}, but {recorded}.")
+    with open(file_path, "rb") as file:
+        return pickle.load(file)
+
+def _checksum(array: np.ndarray) -> str:
+    """Computes the SHA-256 of the dtype, shape and content of an array."""
+    digest = hashlib.sha256()
+    digest.update(f"{array.dtype.str}{array.shape}".encode())
+    digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+class StatsForecastPredictor:
+    """
+    A class to train and use statsforecast models over one or many time series at once.
+
+    It has the same `fit`, `forecast`, `forecast_interval`, `save` and `load` interface as
+    `SARIMAXPredictor`, but fits every series of a long-format DataFrame with compiled models,
+    in parallel processes.
+    """
+    # The compiled models are neither simulated nor exposed in state-space form
+    supports_paths = False
+    supports_scenarios = False
+
+    def __init__(self, order: tuple, seasonal_order: tuple, model: str = "arima", exog: list[str] = None,
+                 freq: str = "B", n_jobs: int = -1):
+        """
+        Initializes the statsforecast model with specified parameters.
+
+        Parameters
+        ----------
+        order : tuple
+            ARIMA parameters (p, d, q), used by the "arima" model.
+        seasonal_order : tuple
+            Seasonal ARIMA parameters (P, D, Q, s). The season length `s` is used by every model.
+        model : str, optional
+            "arima" (fixed order), "autoarima" (order searched per series), "ets", or the "naive",
+            "seasonal_naive" and "drift" (random walk with drift) baselines, by default "arima".
+        exog : list[str], optional
+            Columns of the data used as exogenous variables, by default None.
+        freq : str, optional
+            Frequency of the series, used to date the forecasts, by default "B" (business days).
+        n_jobs : int, optional
+            Number of processes fitting the series, by default -1 (every core).
+
+        Raises
+        ------
+        ValueError
+            If the model is unknown.
+        """
+        if model not in STATSFORECAST_MODELS:
+            raise ValueError(f"Unknown model '{model}': use one of {STATSFORECAST_MODELS}.")
+        self.order = order
+        self.seasonal_order = seasonal_order
+        self.model = model
+        self.exog = list(exog) if exog else []
+        self.freq = freq
+        self.n_jobs = n_jobs
+        self.results = None
+        self.last_exog = None
+        self.last_date = None
+        # The compiled models do not report their optimizer iterations
+        self.iterations = None
+
+    def build_model(self):
+        """
+        Builds the statsforecast object with the predictor's specification.
+
+        Returns
+        -------
+        StatsForecast
+            The unfitted statsforecast object.
+        """
+        from statsforecast import StatsForecast
+        from statsforecast.models import ARIMA, AutoARIMA, AutoETS, Naive, RandomWalkWithDrift, SeasonalNaive
+
+        season_length = self.seasonal_order[3] or 1
+        if self.model == "arima":
+            model = ARIMA(order=tuple(self.order), seasonal_order=tuple(self.seasonal_order[:3]),
+                          season_length=season_length)
+        elif self.model == "autoarima":
+            model = AutoARIMA(season_length=season_length)
+        elif self.model == "ets":
+            model = AutoETS(season_length=season_length)
+        elif self.model == "naive":
+            model = Naive()
+        elif self.model == "seasonal_naive":
+            model = SeasonalNaive(season_length=season_length)
+        else:
+            model = RandomWalkWithDrift()
+        return StatsForecast(models=[model], freq=self.freq, n_jobs=self.n_jobs)
+
+    def fit(self, data: pd.DataFrame):
+        """
+        Fits one model per series of the provided data.
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            A DataFrame with the columns "ds" and "y", the exogenous columns of the predictor and,
+            for many series, the "unique_id" of each one.
+        """
+        frame = self._frame(data)
+        self.results = self.build_model()
+        self.results.fit(frame)
+        last = frame.groupby("unique_id", sort=False).tail(1).set_index("unique_id")
+        self.last_date = last["ds"].max()
+        self.last_exog = last[["ds", *self.exog]]
+        print("Model was successfully fitted!")
+
+    def predict(self, steps: int, level: list[int] = None, exog: pd.DataFrame = None) -> pd.DataFrame:
+        """
+        Forecasts every series.
+
+        Parameters
+        ----------
+        steps : int
+            Number of steps to forecast.
+        level : list[int], optional
+            Confidence levels of the prediction intervals, e.g. [95], by default None.
+        exog : pd.DataFrame, optional
+            Future values of the exogenous variables, with the columns "unique_id" and "ds". By
+            default, the last observed values of each series are held constant.
+
+        Returns
+        -------
+        pd.DataFrame
+            The forecasts, with one row per series and step, and the "unique_id", "ds", "mean"
+            columns and the "lo-<level>" and "hi-<level>" columns of each level.
+        """
+        if self.exog and exog is None:
+            exog = self._hold_exog(steps)
+        forecast = self.results.predict(h=steps, X_df=exog, level=level)
+        name = str(self.results.models[0])
+        return forecast.rename(columns=lambda column: column.replace(name, "mean").replace("mean-", ""))
+
+    def forecast(self, steps: int, exog: pd.DataFrame = None, unique_id: str = None) -> pd.Series:
+        """
+        Forecasts future values of a series.
+
+        Parameters
+        ----------
+        steps : int
+            Number of steps to forecast.
+        exog : pd.DataFrame, optional
+            Future values of the exogenous variables, as in `predict`.
+        unique_id : str, optional
+            Identifier of the series, by default the only fitted one.
+
+        Returns
+        -------
+        pd.Series
+            The forecast values, indexed by date.
+        """
+        forecast = self._select(self.predict(steps, exog=exog), unique_id)
+        return forecast.set_index("ds")["mean"].rename("predicted_mean")
+
+    def forecast_interval(self, steps: int, alpha: float = 0.05, exog: pd.DataFrame = None,
+                          unique_id: str = None) -> pd.DataFrame:
+        """
+        Forecasts future values of a series with their prediction intervals.
+
+        Parameters
+        ----------
+        steps : int
+            Number of steps to forecast.
+        alpha : float, optional
+            Significance level of the intervals, by default 0.05 (95% intervals).
+        exog : pd.DataFrame, optional
+            Future values of the exogenous variables, as in `predict`.
+        unique_id : str, optional
+            Identifier of the series, by default the only fitted one.
+
+        Returns
+        -------
+        pd.DataFrame
+            A DataFrame indexed by date with the "mean", "lower" and "upper" columns.
+        """
+        level = round(100 * (1 - alpha))
+        forecast = self._select(self.predict(steps, level=[level], exog=exog), unique_id)
+        return pd.DataFrame({"mean": forecast["mean"].to_numpy(),
+                             "lower": forecast[f"lo-{level}"].to_numpy(),
+                             "upper": forecast[f"hi-{level}"].to_numpy()},
+                            index=pd.DatetimeIndex(forecast["ds"]))
+
+    def forecast_distribution(self, steps: int, n_paths: int = None, quantiles: tuple = (0.05, 0.5, 0.95),
+                              alpha: float = 0.05, exog: pd.DataFrame = None, seed: int = None,
+                              return_paths: bool = False, unique_id: str = None) -> pd.DataFrame:
+        """
+        Makes forecasts with prediction intervals and quantiles, as in `SARIMAXPredictor.forecast_distribution`.
+
+        The quantiles are the bounds of the analytic prediction intervals of statsforecast, as the
+        fitted models are not simulated. `n_paths` and `seed` are accepted for compatibility only.
+
+        Parameters
+        ----------
+        steps : int
+            Number of steps to forecast.
+        n_paths : int, optional
+            Ignored.
+        quantiles : tuple, optional
+            Quantiles of the forecasts, by default (0.05, 0.5, 0.95).
+        alpha : float, optional
+            Significance level of the intervals, by default 0.05 (95% intervals).
+        exog : pd.DataFrame, optional
+            Future values of the exogenous variables, as in `predict`.
+        seed : int, optional
+            Ignored.
+        return_paths : bool, optional
+            Must be False, as no paths are simulated.
+        unique_id : str, optional
+            Identifier of the series, by default the only fitted one.
+
+        Returns
+        -------
+        pd.DataFrame
+            A DataFrame indexed by date with the "mean", "lower" and "upper" columns, and one column
+            per quantile named after its percentage (e.g. "p5", "p50" and "p95").
+
+        Raises
+        ------
+        ValueError
+            If the paths are requested, as `supports_paths` is False.
+        """
+        if return_paths:
+            raise ValueError("The statsforecast engine does not simulate paths.")
+        interval_level = round(100 * (1 - alpha))
+        levels = {round(abs(2 * quantile - 1) * 100) for quantile in quantiles} - {0}
+        forecast = self._select(self.predict(steps, level=sorted(levels | {interval_level}), exog=exog), unique_id)
+        distribution = pd.DataFrame({"mean": forecast["mean"].to_numpy(),
+                                     "lower": forecast[f"lo-{interval_level}"].to_numpy(),
+                                     "upper": forecast[f"hi-{interval_level}"].to_numpy()},
+                                    index=pd.DatetimeIndex(forecast["ds"]))
+        for quantile in quantiles:
+            level = round(abs(2 * quantile - 1) * 100)
+            column = "mean" if level == 0 else f"{'lo' if quantile < 0.5 else 'hi'}-{level}"
+            distribution[f"p{quantile * 100:g}"] = forecast[column].to_numpy()
+        return distribution
+
+    def forecast_scenarios(self, scenarios: np.ndarray, alpha: float = 0.05) -> dict[str, np.ndarray]:
+        """
+        Makes the forecasts conditional on many future paths of the exogenous variables, as in
+        `SARIMAXPredictor.forecast_scenarios`.
+
+        Raises
+        ------
+        ValueError
+            Always, as the compiled models do not expose their state-space form (`supports_scenarios`
+            is False).
+        """
+        raise ValueError("The statsforecast engine does not forecast scenarios.")
+
+    def _frame(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Returns the long-format "unique_id", "ds", "y" and exogenous columns of the data."""
+        frame = data[[column for column in ("unique_id", "ds", "y", *self.exog) if column in data]]
+        if "unique_id" not in frame:
+            frame = frame.assign(unique_id="series")
+        return frame.astype({"unique_id": str})[["unique_id", "ds", "y", *self.exog]]
+
+    def _hold_exog(self, steps: int) -> pd.DataFrame:
+        """Repeats the last exogenous values of each series over the dates of the next steps."""
+        offset = pd.tseries.frequencies.to_offset(self.freq)
+        rows = []
+        for unique_id, last in self.last_exog.iterrows():
+            future = pd.DataFrame({"ds": pd.date_range(last["ds"] + offset, periods=steps, freq=offset)})
+            future = future.assign(unique_id=unique_id, **{column: last[column] for column in self.exog})
+            rows.append(future)
+        return pd.concat(rows, ignore_index=True)[["unique_id", "ds", *self.exog]]
+
+    @staticmethod
+    def _select(forecast: pd.DataFrame, unique_id: str = None) -> pd.DataFrame:
+        """Keeps the forecast of a single series."""
+        if unique_id is None:
+            ids = forecast["unique_id"].unique()
+            if len(ids) > 1:
+                raise ValueError(f"The model holds {len(ids)} series: choose one with `unique_id`.")
+            return forecast
+        return forecast[forecast["unique_id"] == unique_id]
+
+    def save(self, file_path: str):
+        """
+        Saves the trained model to a file.
+
+        The fitted statsforecast object is pickled, so only load files you trust.
+
+        Parameters
+        ----------
+        file_path : str
+            Path where the model will be saved.
+        """
+        _save_pickle(self, file_path)
+        print(f"Model saved to {file_path}")
+
+    @staticmethod
+    def load(file_path: str) -> 'StatsForecastPredictor':
         """
-        with open(file_path, 'rb') as f:
-            return pickle.load(f)
+        Loads a trained statsforecast model from a file.
+
+        Parameters
+        ----------
+        file_path : str
+            Path to the saved model file.
+
+        Returns
+        -------
+        StatsForecastPredictor
+            An instance of the loaded StatsForecastPredictor class.
+
+        Raises
+        ------
+        ValueError
+            If the file does not hold a pickled StatsForecastPredictor.
+        """
+        return _load_pickle(file_path, StatsForecastPredictor)
+
+
+class EnsemblePredictor:
+    """
+    A class to train and use a weighted ensemble of SARIMAX and statsforecast models.
+
+    Every member is fitted in its own worker process under its own time limit, so the training time
+    is bounded by the slowest member rather than by their sum, and a member that fails, diverges or
+    times out is dropped without stopping the others. Each member is scored on the last `holdout`
+    observations, then refitted on every observation, and weighted by the inverse of its holdout
+    mean absolute error.
+    """
+    # The paths simulated by the SARIMAX members are not combined
+    supports_paths = False
+
+    def __init__(self, order: tuple, seasonal_order: tuple, members: list[dict], exog: list[str] = None,
+                 holdout: int = 20, timeout: float = None, max_workers: int = None, freq: str = "B"):
+        """
+        Initializes the ensemble with specified members.
+
+        Parameters
+        ----------
+        order : tuple
+            ARIMA parameters (p, d, q) of the members that do not set their own.
+        seasonal_order : tuple
+            Seasonal ARIMA parameters (P, D, Q, s) of the members that do not set their own. The
+            season length `s` is also used by the seasonal baselines.
+        members : list[dict]
+            Specification of each member, with its "name" and "model": "sarimax" or one of
+            `STATSFORECAST_MODELS`, and optionally its own "order" and "seasonal_order".
+        exog : list[str], optional
+            Columns of the data used as exogenous variables by the SARIMAX members, by default None.
+        holdout : int, optional
+            Number of trailing observations the members are scored on, by default 20.
+        timeout : float, optional
+            Time limit of each member, in seconds, by default no limit.
+        max_workers : int, optional
+            Number of worker processes, by default one per member, up to the number of available cores.
+        freq : str, optional
+            Frequency of the series, used by the statsforecast members, by default "B" (business days).
+
+        Raises
+        ------
+        ValueError
+            If a member has an unknown model or a duplicate name.
+        """
+        names = [member["name"] for member in members]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Member names must be unique, got {names}.")
+        for member in members:
+            if member["model"] != "sarimax" and member["model"] not in STATSFORECAST_MODELS:
+                raise ValueError(f"Unknown model '{member['model']}' of member '{member['name']}': "
+                                 f"use 'sarimax' or one of {STATSFORECAST_MODELS}.")
+        self.order = order
+        self.seasonal_order = seasonal_order
+        self.members = [dict(member) for member in members]
+        self.exog = list(exog) if exog else []
+        self.holdout = holdout
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.freq = freq
+        self.predictors = {}
+        self.weights = {}
+        self.report = None
+        self.last_date = None
+        # The members are fitted in other processes, whose optimizer iterations are not tracked
+        self.iterations = None
+
+    def build_member(self, member: dict):
+        """
+        Builds the unfitted predictor of a member.
+
+        Parameters
+        ----------
+        member : dict
+            Specification of the member, as in the `members` of the ensemble.
+
+        Returns
+        -------
+        SARIMAXPredictor | StatsForecastPredictor
+            The unfitted predictor. Only the SARIMAX members use the exogenous variables.
+        """
+        order = member.get("order", self.order)
+        seasonal_order = member.get("seasonal_order", self.seasonal_order)
+        if member["model"] == "sarimax":
+            return SARIMAXPredictor(order=order, seasonal_order=seasonal_order, exog=self.exog)
+        return StatsForecastPredictor(order=order, seasonal_order=seasonal_order, model=member["model"],
+                                      freq=self.freq, n_jobs=1)
+
+    def fit(self, data: pd.DataFrame):
+        """
+        Fits every member in parallel and weights them by their holdout error.
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            The preprocessed data, with the "ds" and "y" columns and the exogenous columns.
+
+        Raises
+        ------
+        RuntimeError
+            If no member could be fitted.
+        """
+        import multiprocessing
+        import time
+        from multiprocessing.connection import wait
+        from loguru import logger
+        from petroleumpriceprediction.batch import available_workers
+
+        data = data[["ds", "y", *self.exog]].reset_index(drop=True)
+        max_workers = min(self.max_workers or available_workers(), len(self.members))
+        # Each member runs in its own process, started when a worker is free, so a member stuck in
+        # compiled code, which never sees its own time limit, is stopped once past it
+        deadline = self.timeout + ENSEMBLE_GRACE if self.timeout else None
+        queue = list(self.members)
+        running = {}
+        outcomes = {}
+        while queue or running:
+            while queue and len(running) < max_workers:
+                member = queue.pop(0)
+                receiver, sender = multiprocessing.Pipe(duplex=False)
+                process = multiprocessing.Process(target=run_member, name=f"member-{member['name']}", daemon=True,
+                                                  args=(sender, self.build_member(member), data, self.holdout,
+                                                        self.timeout))
+                process.start()
+                sender.close()
+                running[receiver] = (member, process, time.monotonic())
+            wait_for = None
+            if deadline is not None:
+                wait_for = max(min(started for _, _, started in running.values()) + deadline - time.monotonic(), 0)
+            ready = wait(list(running), timeout=wait_for)
+            for receiver in list(running):
+                member, process, started = running[receiver]
+                if receiver in ready:
+                    try:
+                        outcomes[member["name"]] = receiver.recv()
+                    except EOFError:
+                        outcomes[member["name"]] = RuntimeError(f"The process exited with code {process.exitcode}")
+                elif deadline is not None and time.monotonic() - started >= deadline:
+                    process.terminate()
+                else:
+                    continue
+                process.join()
+                receiver.close()
+                del running[receiver]
+
+        reports = []
+        for member in self.members:
+            report = {"name": member["name"], "model": member["model"], "status": "timeout",
+                      "holdout_mae": np.nan, "fit_seconds": None, "error": f"Stopped after {deadline}s"}
+            outcome = outcomes.get(member["name"])
+            if isinstance(outcome, Exception):
+                report.update(status="failed", error=f"{type(outcome).__name__}: {outcome}")
+            elif outcome is not None:
+                report, predictor = outcome
+                report = {"name": member["name"], **report}
+                if predictor is not None:
+                    self.predictors[member["name"]] = predictor
+            reports.append(report)
+            logger.info(f"Member '{member['name']}': {report['status']} "
+                        f"holdout_mae={report['holdout_mae']:.4f}")
+        if not self.predictors:
+            raise RuntimeError("No member of the ensemble could be fitted.")
+
+        errors = {row["name"]: row["holdout_mae"] for row in reports if row["name"] in self.predictors}
+        inverse = {name: 1 / max(error, np.finfo(float).tiny) for name, error in errors.items()}
+        total = sum(inverse.values())
+        self.weights = {name: value / total for name, value in inverse.items()}
+        self.report = pd.DataFrame(reports).assign(weight=lambda frame: frame["name"].map(self.weights).fillna(0.0))
+        self.last_date = pd.Timestamp(data["ds"].iloc[-1])
+        print("Model was successfully fitted!")
+
+    def _combine(self, steps: int, columns: list[str], forecast_member) -> pd.DataFrame:
+        """Averages columns of the forecasts of the members, with their weights."""
+        combined = np.zeros((steps, len(columns)))
+        for name, weight in self.weights.items():
+            combined += weight * forecast_member(name)[columns].to_numpy(dtype=float)
+        index = pd.bdate_range(self.last_date + pd.offsets.BDay(1), periods=steps)
+        return pd.DataFrame(combined, columns=columns, index=index)
+
+    @property
+    def supports_scenarios(self) -> bool:
+        """Whether a SARIMAX member uses exogenous variables, so `forecast_scenarios` depends on the scenarios."""
+        return any(isinstance(predictor, SARIMAXPredictor) and predictor.exog
+                   for predictor in self.predictors.values())
+
+    def _member_exog(self, name: str, exog: np.ndarray = None) -> np.ndarray:
+        """Returns the future exogenous values of a member, `None` for the ones that do not use them."""
+        if not self.exog or not isinstance(self.predictors[name], SARIMAXPredictor):
+            return None
+        return exog
+
+    def forecast(self, steps: int, exog: np.ndarray = None) -> pd.Series:
+        """
+        Forecasts future values with the weighted mean of the forecasts of the members.
+
+        Parameters
+        ----------
+        steps : int
+            Number of steps to forecast.
+        exog : np.ndarray, optional
+            Future values of the exogenous variables of the SARIMAX members, with one row per step.
+            By default, the last observed values are held constant.
+
+        Returns
+        -------
+        pd.Series
+            The forecast values, indexed by business day.
+        """
+        return self.forecast_interval(steps, exog=exog)["mean"].rename("predicted_mean")
+
+    def forecast_interval(self, steps: int, alpha: float = 0.05, exog: np.ndarray = None) -> pd.DataFrame:
+        """
+        Forecasts future values with prediction intervals.
+
+        The mean and the bounds of the intervals are the weighted means of the ones of the members.
+
+        Parameters
+        ----------
+        steps : int
+            Number of steps to forecast.
+        alpha : float, optional
+            Significance level of the intervals, by default 0.05 (95% intervals).
+        exog : np.ndarray, optional
+            Future values of the exogenous variables, as in `forecast`.
+
+        Returns
+        -------
+        pd.DataFrame
+            A DataFrame indexed by business day with the "mean", "lower" and "upper" columns.
+        """
+        return self._combine(steps, ["mean", "lower", "upper"],
+                             lambda name: self.predictors[name].forecast_interval(
+                                 steps, alpha=alpha, exog=self._member_exog(name, exog)))
+
+    def forecast_distribution(self, steps: int, n_paths: int = 10000, quantiles: tuple = (0.05, 0.5, 0.95),
+                              alpha: float = 0.05, exog: np.ndarray = None, seed: int = None,
+                              return_paths: bool = False) -> pd.DataFrame:
+        """
+        Makes forecasts with prediction intervals and quantiles, as in `SARIMAXPredictor.forecast_distribution`.
+
+        Every column is the weighted mean of the ones of the members, so the quantiles of the
+        ensemble are averaged quantiles of its members.
+
+        Parameters
+        ----------
+        steps : int
+            Number of steps to forecast.
+        n_paths : int, optional
+            Number of paths simulated by the SARIMAX members, by default 10000.
+        quantiles : tuple, optional
+            Quantiles of the forecasts, by default (0.05, 0.5, 0.95).
+        alpha : float, optional
+            Significance level of the intervals, by default 0.05 (95% intervals).
+        exog : np.ndarray, optional
+            Future values of the exogenous variables, as in `forecast`.
+        seed : int, optional
+            Seed of the random generator of the SARIMAX members, by default None.
+        return_paths : bool, optional
+            Must be False, as the paths of the members are not combined.
+
+        Returns
+        -------
+        pd.DataFrame
+            A DataFrame indexed by business day with the "mean", "lower" and "upper" columns, and
+            one column per quantile named after its percentage (e.g. "p5", "p50" and "p95").
+
+        Raises
+        ------
+        ValueError
+            If the paths are requested, as `supports_paths` is False.
+        """
+        if return_paths:
+            raise ValueError("The ensemble does not combine the paths of its members.")
+        columns = ["mean", "lower", "upper", *(f"p{quantile * 100:g}" for quantile in quantiles)]
+        return self._combine(steps, columns,
+                             lambda name: self.predictors[name].forecast_distribution(
+                                 steps, n_paths=n_paths, quantiles=quantiles, alpha=alpha,
+                                 exog=self._member_exog(name, exog), seed=seed))
+
+    def forecast_scenarios(self, scenarios: np.ndarray, alpha: float = 0.05) -> dict[str, np.ndarray]:
+        """
+        Makes the forecasts conditional on many future paths of the exogenous variables at once.
+
+        The SARIMAX members forecast every scenario, as in `SARIMAXPredictor.forecast_scenarios`,
+        and the other members, which do not use the exogenous variables, give the same forecast for
+        all of them. Their weighted means are returned.
+
+        Parameters
+        ----------
+        scenarios : np.ndarray
+            Future paths of the exogenous variables, as in `SARIMAXPredictor.forecast_scenarios`.
+        alpha : float, optional
+            Significance level of the intervals, by default 0.05 (95% intervals).
+
+        Returns
+        -------
+        dict[str, np.ndarray]
+            The "mean", "lower" and "upper" forecasts, each with one row per scenario and one column
+            per step.
+        """
+        scenarios = np.asarray(scenarios, dtype=float)
+        steps = scenarios.shape[1]
+        combined = {column: np.zeros(scenarios.shape[:2]) for column in ("mean", "lower", "upper")}
+        for name, weight in self.weights.items():
+            predictor = self.predictors[name]
+            if isinstance(predictor, SARIMAXPredictor) and predictor.exog:
+                forecast = predictor.forecast_scenarios(scenarios, alpha=alpha)
+            else:
+                forecast = predictor.forecast_interval(steps, alpha=alpha)
+            for column in combined:
+                combined[column] += weight * np.asarray(forecast[column], dtype=float)
+        return combined
+
+    def save(self, file_path: str):
+        """
+        Saves the trained ensemble to a file.
+
+        The fitted members are pickled, so only load files you trust.
+
+        Parameters
+        ----------
+        file_path : str
+            Path where the model will be saved.
+        """
+        _save_pickle(self, file_path)
+        print(f"Model saved to {file_path}")
+
+    @staticmethod
+    def load(file_path: str) -> 'EnsemblePredictor':
+        """
+        Loads a trained ensemble from a file.
+
+        Parameters
+        ----------
+        file_path : str
+            Path to the saved model file.
+
+        Returns
+        -------
+        EnsemblePredictor
+            An instance of the loaded EnsemblePredictor class.
+
+        Raises
+        ------
+        ValueError
+            If the file does not hold a pickled EnsemblePredictor.
+        """
+        return _load_pickle(file_path, EnsemblePredictor)
+
+def fit_member(predictor, data: pd.DataFrame, holdout: int, timeout: float = None) -> tuple[dict, object]:
+    """
+    Scores a member of an ensemble on a holdout, then fits it on every observation.
+
+    It runs in a worker process, under the time limit of the member. Any error is caught and
+    reported, so a failing member never aborts the ensemble.
+
+    Parameters
+    ----------
+    predictor : SARIMAXPredictor | StatsForecastPredictor
+        The unfitted predictor of the member.
+    data : pd.DataFrame
+        The preprocessed data, with the "ds" and "y" columns and the exogenous columns.
+    holdout : int
+        Number of trailing observations the member is scored on.
+    timeout : float, optional
+        Time limit of the scoring and the fit, in seconds, by default no limit.
+
+    Returns
+    -------
+    tuple[dict, object]
+        Report of the member, with its "model", "status", "holdout_mae", "fit_seconds" and "error",
+        and the fitted predictor, or `None` if it failed.
+    """
+    import contextlib
+    import io
+    import time
+    from petroleumpriceprediction.search import time_limit
+
+    model = "sarimax" if isinstance(predictor, SARIMAXPredictor) else predictor.model
+    report = {"model": model, "status": "failed", "holdout_mae": np.nan, "fit_seconds": None, "error": None}
+    start = time.perf_counter()
+    try:
+        # The fits print their progress, which would interleave across the workers
+        with time_limit(timeout), contextlib.redirect_stdout(io.StringIO()):
+            train, test = data.iloc[:-holdout], data.iloc[-holdout:]
+            predictor.fit(train)
+            # Scored as the ensemble forecasts: the future exogenous values are unknown, so the last
+            # observed ones are held constant
+            forecast = np.asarray(predictor.forecast(steps=holdout), dtype=float)
+            error = float(np.mean(np.abs(forecast - test["y"].to_numpy(dtype=float))))
+            if not np.isfinite(error):
+                raise ValueError("The holdout forecast is not finite.")
+            predictor.fit(data)
+    except TimeoutError as error:
+        report.update(status="timeout", error=str(error), fit_seconds=time.perf_counter() - start)
+        return report, None
+    except Exception as error:
+        report.update(error=f"{type(error).__name__}: {error}", fit_seconds=time.perf_counter() - start)
+        return report, None
+    report.update(status="ok", holdout_mae=error, fit_seconds=time.perf_counter() - start)
+    return report, predictor
+
+def run_member(connection, predictor, data: pd.DataFrame, holdout: int, timeout: float = None) -> None:
+    """
+    Runs `fit_member` in the process of a member of an ensemble, and sends back its result.
+
+    Parameters
+    ----------
+    connection : multiprocessing.connection.Connection
+        Sending end of the pipe to the ensemble.
+    predictor, data, holdout, timeout
+        The arguments of `fit_member`.
+    """
+    try:
+        connection.send(fit_member(predictor, data, holdout, timeout))
+    except Exception as error:
+        # The fitted predictor could not be sent
+        connection.send(RuntimeError(f"{type(error).__name__}: {error}"))
+    finally:
+        connection.close()
+
+class TemporalPredictor:
+    """
+    A class to train SARIMAX models on the daily prices and on their weekly and monthly averages,
+    and reconcile their forecasts.
+
+    The aggregated series are a fraction of the length of the daily one, so their models fit much
+    faster and capture the longer moves the daily model loses over long horizons. The daily model
+    is only fitted on the most recent days. Every level is fitted in its own worker process.
+
+    The forecasts of every level are reconciled by weighted least squares: the reconciled daily
+    forecasts are the ones whose weekly and monthly averages are closest to the forecasts of those
+    levels, each forecast weighted by the inverse of its variance. Short horizons thus follow the
+    daily model and long horizons the aggregated ones, and the averages of the reconciled daily
+    forecasts are the reconciled forecasts of the other levels.
+    """
+    # The forecasts are reconciled in closed form, and the aggregated levels hold their exogenous
+    # variables constant
+    supports_paths = False
+    supports_scenarios = False
+
+    def __init__(self, order: tuple, seasonal_order: tuple, levels: list[dict], exog: list[str] = None,
+                 daily_window: int = None, horizon: int = 130, max_workers: int = None):
+        """
+        Initializes the levels with specified parameters.
+
+        Parameters
+        ----------
+        order : tuple
+            ARIMA parameters (p, d, q) of the daily model.
+        seasonal_order : tuple
+            Seasonal ARIMA parameters (P, D, Q, s) of the daily model.
+        levels : list[dict]
+            Specification of each aggregated level, with its "name", its "period" (a pandas period
+            alias such as "W-FRI" or "M") and the "order" and "seasonal_order" of its model.
+        exog : list[str], optional
+            Columns of the data used as exogenous variables, averaged like the prices for the
+            aggregated levels, by default None.
+        daily_window : int, optional
+            Number of most recent days the daily model is fitted on, by default every day.
+        horizon : int, optional
+            Number of business days always reconciled, by default 130 (about six months). Shorter
+            forecasts are the first days of this one, so they do not depend on the number of steps.
+        max_workers : int, optional
+            Number of worker processes, by default one per level, up to the number of available cores.
+
+        Raises
+        ------
+        ValueError
+            If a level has a duplicate name or is named "daily".
+        """
+        names = ["daily", *(level["name"] for level in levels)]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Level names must be unique and differ from 'daily', got {names[1:]}.")
+        self.order = order
+        self.seasonal_order = seasonal_order
+        self.levels = [dict(level) for level in levels]
+        self.exog = list(exog) if exog else []
+        self.daily_window = daily_window
+        self.horizon = horizon
+        self.max_workers = max_workers
+        self.predictors = {}
+        self.partial = {}
+        self.fit_seconds = {}
+        self.last_date = None
+        # The levels are fitted in other processes, whose optimizer iterations are not tracked
+        self.iterations = None
+
+    def fit(self, data: pd.DataFrame):
+        """
+        Aggregates the data and fits the model of every level in parallel.
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            The preprocessed daily data, with the "ds" and "y" columns and the exogenous columns.
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        from loguru import logger
+        from petroleumpriceprediction.batch import available_workers
+        from petroleumpriceprediction.data import aggregate
+
+        columns = ["y", *self.exog]
+        data = data[["ds", *columns]].reset_index(drop=True)
+        self.last_date = pd.Timestamp(data["ds"].iloc[-1])
+        datasets = {"daily": data.iloc[-self.daily_window:] if self.daily_window else data}
+        predictors = {"daily": SARIMAXPredictor(order=self.order, seasonal_order=self.seasonal_order,
+                                                exog=self.exog)}
+        for level in self.levels:
+            aggregated = aggregate(data, level["period"], columns)
+            # The days of a period still in progress are kept to reconcile its forecast
+            self.partial[level["name"]] = None
+            if aggregated["ds"].iloc[-1] > self.last_date:
+                days = data.iloc[-int(aggregated["days"].iloc[-1]):]
+                self.partial[level["name"]] = (len(days), float(days["y"].sum()))
+                aggregated = aggregated.iloc[:-1]
+            datasets[level["name"]] = aggregated
+            predictors[level["name"]] = SARIMAXPredictor(order=level["order"],
+                                                         seasonal_order=level["seasonal_order"],
+                                                         exog=self.exog)
+
+        max_workers = min(self.max_workers or available_workers(), len(predictors))
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {name: executor.submit(fit_level, predictor, datasets[name])
+                       for name, predictor in predictors.items()}
+            for name, future in futures.items():
+                self.predictors[name], self.fit_seconds[name] = future.result()
+                logger.info(f"Level '{name}': fitted {len(datasets[name])} rows in {self.fit_seconds[name]:.2f}s")
+        print("Model was successfully fitted!")
+
+    def forecast(self, steps: int, exog: np.ndarray = None) -> pd.Series:
+        """
+        Forecasts future daily values, reconciled with the forecasts of the aggregated levels.
+
+        Parameters
+        ----------
+        steps : int
+            Number of business days to forecast.
+        exog : np.ndarray, optional
+            Future values of the exogenous variables of the daily model, with one row per step. By
+            default, and always for the aggregated levels, the last observed values are held constant.
+
+        Returns
+        -------
+        pd.Series
+            The forecast values, indexed by business day.
+        """
+        return self.forecast_interval(steps, exog=exog)["mean"].rename("predicted_mean")
+
+    def forecast_interval(self, steps: int, alpha: float = 0.05, exog: np.ndarray = None) -> pd.DataFrame:
+        """
+        Forecasts future daily values with prediction intervals.
+
+        The intervals of the daily model are moved with its forecasts by the reconciliation, so
+        they keep their width.
+
+        Parameters
+        ----------
+        steps : int
+            Number of business days to forecast.
+        alpha : float, optional
+            Significance level of the intervals, by default 0.05 (95% intervals).
+        exog : np.ndarray, optional
+            Future values of the exogenous variables, as in `forecast`.
+
+        Returns
+        -------
+        pd.DataFrame
+            A DataFrame indexed by business day with the "mean", "lower" and "upper" columns.
+        """
+        horizon = max(steps, self.horizon)
+        if exog is not None and len(exog) < horizon:
+            # The last future values are held over the rest of the reconciled horizon
+            exog = np.asarray(exog, dtype=float).reshape(len(exog), -1)
+            exog = np.vstack([exog, np.repeat(exog[-1:], horizon - len(exog), axis=0)])
+        daily, reconciled = self._reconcile(horizon, alpha, exog)[:2]
+        shift = reconciled[:steps] - daily["mean"].to_numpy()[:steps]
+        index = pd.bdate_range(self.last_date + pd.offsets.BDay(1), periods=steps)
+        return pd.DataFrame({"mean": reconciled[:steps],
+                             "lower": daily["lower"].to_numpy()[:steps] + shift,
+                             "upper": daily["upper"].to_numpy()[:steps] + shift}, index=index)
+
+    def forecast_levels(self, steps: int, alpha: float = 0.05) -> pd.DataFrame:
+        """
+        Forecasts the averages of every level over the next business days, before and after reconciliation.
+
+        Parameters
+        ----------
+        steps : int
+            Number of business days to forecast, at least the reconciled horizon. Only the periods
+            that end within them are returned.
+        alpha : float, optional
+            Significance level of the intervals of the models, by default 0.05 (95% intervals).
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per day and period, with the "level", the "ds" (last business day of the period),
+            the "base" forecast of the model of the level and its "reconciled" forecast.
+        """
+        _, reconciled, rows = self._reconcile(max(steps, self.horizon), alpha)
+        summing, base, offsets, levels, dates = rows
+        return pd.DataFrame({"level": levels, "ds": dates, "base": base,
+                             "reconciled": summing @ reconciled + offsets})
+
+    def forecast_distribution(self, steps: int, n_paths: int = None, quantiles: tuple = (0.05, 0.5, 0.95),
+                              alpha: float = 0.05, exog: np.ndarray = None, seed: int = None,
+                              return_paths: bool = False) -> pd.DataFrame:
+        """
+        Makes forecasts with prediction intervals and quantiles, as in `SARIMAXPredictor.forecast_distribution`.
+
+        The quantiles are the ones of a normal distribution around the reconciled forecasts, with
+        the spread of the intervals of the daily model.
+
+        Parameters
+        ----------
+        steps : int
+            Number of business days to forecast.
+        n_paths : int, optional
+            Unused, as the quantiles are computed in closed form.
+        quantiles : tuple, optional
+            Quantiles of the forecasts, by default (0.05, 0.5, 0.95).
+        alpha : float, optional
+            Significance level of the intervals, by default 0.05 (95% intervals).
+        exog : np.ndarray, optional
+            Future values of the exogenous variables, as in `forecast`.
+        seed : int, optional
+            Unused, as nothing is simulated.
+        return_paths : bool, optional
+            Must be False, as no path is simulated.
+
+        Returns
+        -------
+        pd.DataFrame
+            A DataFrame indexed by business day with the "mean", "lower" and "upper" columns, and
+            one column per quantile named after its percentage (e.g. "p5", "p50" and "p95").
+
+        Raises
+        ------
+        ValueError
+            If the paths are requested, as `supports_paths` is False.
+        """
+        from scipy.stats import norm
+
+        if return_paths:
+            raise ValueError("The temporal aggregation model does not simulate paths.")
+        forecast = self.forecast_interval(steps, alpha=alpha, exog=exog)
+        scale = (forecast["upper"] - forecast["lower"]) / (2 * norm.ppf(1 - alpha / 2))
+        for quantile in quantiles:
+            forecast[f"p{quantile * 100:g}"] = forecast["mean"] + norm.ppf(quantile) * scale
+        return forecast
+
+    def forecast_scenarios(self, scenarios: np.ndarray, alpha: float = 0.05) -> dict[str, np.ndarray]:
+        """
+        Not supported: the aggregated levels hold their exogenous variables constant.
+
+        Raises
+        ------
+        ValueError
+            Always, as `supports_scenarios` is False.
+        """
+        raise ValueError("The temporal aggregation model does not forecast exogenous scenarios.")
+
+    def _reconcile(self, steps: int, alpha: float, exog: np.ndarray = None) -> tuple:
+        """
+        Forecasts every level and reconciles the forecasts by weighted least squares.
+
+        Each forecast is a row of a linear system in the daily forecasts: the identity for the days,
+        and the mean over its days for a period, offset by the days of the period already observed.
+        Only the periods ending within the horizon are constrained.
+
+        Returns
+        -------
+        tuple
+            The daily forecast with intervals, the reconciled daily means, and the rows of the system:
+            the summing matrix, base forecasts, offsets, levels and period ends.
+        """
+        from scipy.stats import norm
+
+        from petroleumpriceprediction.data import period_ends
+
+        z = norm.ppf(1 - alpha / 2)
+        daily = self.predictors["daily"].forecast_interval(steps, alpha=alpha, exog=exog)
+        dates = pd.bdate_range(self.last_date + pd.offsets.BDay(1), periods=steps)
+        summing = [np.eye(steps)]
+        base = [daily["mean"].to_numpy(dtype=float)]
+        variances = [((daily["upper"] - daily["lower"]).to_numpy(dtype=float) / (2 * z)) ** 2]
+        offsets = [np.zeros(steps)]
+        levels = [np.full(steps, "daily", dtype=object)]
+        ends = [dates.to_numpy()]
+        for level in self.levels:
+            labels = period_ends(dates, level["period"])
+            periods, counts = np.unique(labels, return_counts=True)
+            complete = periods <= dates[-1].to_datetime64().astype("datetime64[D]")
+            if not complete.any():
+                continue
+            forecast = self.predictors[level["name"]].forecast_interval(int(complete.sum()), alpha=alpha)
+            days = counts[complete].astype(float)
+            totals = np.zeros(len(days))
+            partial = self.partial[level["name"]]
+            if partial is not None:
+                # The first period started with observed days
+                days[0] += partial[0]
+                totals[0] = partial[1]
+            rows = (labels[None, :] == periods[complete][:, None]) / days[:, None]
+            summing.append(rows)
+            base.append(forecast["mean"].to_numpy(dtype=float))
+            variances.append(((forecast["upper"] - forecast["lower"]).to_numpy(dtype=float) / (2 * z)) ** 2)
+            offsets.append(totals / days)
+            levels.append(np.full(len(days), level["name"], dtype=object))
+            ends.append(pd.DatetimeIndex(periods[complete]).to_numpy())
+
+        summing, base, offsets = np.vstack(summing), np.concatenate(base), np.concatenate(offsets)
+        weights = 1 / np.maximum(np.concatenate(variances), np.finfo(float).tiny)
+        weighted = summing.T * weights
+        reconciled = np.linalg.solve(weighted @ summing, weighted @ (base - offsets))
+        return daily, reconciled, (summing, base, offsets, np.concatenate(levels), np.concatenate(ends))
+
+    def save(self, file_path: str):
+        """
+        Saves the trained levels to a file.
+
+        The fitted models are pickled, so only load files you trust.
+
+        Parameters
+        ----------
+        file_path : str
+            Path where the model will be saved.
+        """
+        _save_pickle(self, file_path)
+        print(f"Model saved to {file_path}")
+
+    @staticmethod
+    def load(file_path: str) -> 'TemporalPredictor':
+        """
+        Loads trained levels from a file.
+
+        Parameters
+        ----------
+        file_path : str
+            Path to the saved model file.
+
+        Returns
+        -------
+        TemporalPredictor
+            An instance of the loaded TemporalPredictor class.
+
+        Raises
+        ------
+        ValueError
+            If the file does not hold a pickled TemporalPredictor.
+        """
+        return _load_pickle(file_path, TemporalPredictor)
+
+def fit_level(predictor: SARIMAXPredictor, data: pd.DataFrame) -> tuple[SARIMAXPredictor, float]:
+    """
+    Fits the model of a level of a `TemporalPredictor`, in a worker process.
+
+    Parameters
+    ----------
+    predictor : SARIMAXPredictor
+        The unfitted predictor of the level.
+    data : pd.DataFrame
+        The data of the level, with the "ds" and "y" columns and the exogenous columns.
+
+    Returns
+    -------
+    tuple[SARIMAXPredictor, float]
+        The fitted predictor and the seconds its fit took.
+    """
+    import contextlib
+    import io
+    import time
+
+    start = time.perf_counter()
+    # The fits print their progress, which would interleave across the workers
+    with contextlib.redirect_stdout(io.StringIO()):
+        predictor.fit(data)
+    return predictor, time.perf_counter() - start
+
+
+# Predictors by engine name, as set in `model.engine` of the configuration
+ENGINES = {"statsmodels": SARIMAXPredictor, "statsforecast": StatsForecastPredictor, "ensemble": EnsemblePredictor,
+           "temporal": TemporalPredictor}
+
+def build_predictor(model_config: dict, order: tuple = None, seasonal_order: tuple = None):
+    """
+    Builds the predictor of the engine set in the model configuration.
+
+    Parameters
+    ----------
+    model_config : dict
+        The "model" section of the configuration.
+    order : tuple, optional
+        ARIMA parameters (p, d, q), by default the configured ones.
+    seasonal_order : tuple, optional
+        Seasonal ARIMA parameters (P, D, Q, s), by default the configured ones.
+
+    Returns
+    -------
+    SARIMAXPredictor | StatsForecastPredictor | EnsemblePredictor | TemporalPredictor
+        The unfitted predictor.
+
+    Raises
+    ------
+    ValueError
+        If the engine is unknown.
+    """
+    engine = model_config.get("engine", "statsmodels")
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}': use one of {tuple(ENGINES)}.")
+    order = order or model_config["sarimax_order"]
+    seasonal_order = seasonal_order or model_config["seasonal_order"]
+    if engine == "statsforecast":
+        options = model_config["statsforecast"]
+        return StatsForecastPredictor(order=order, seasonal_order=seasonal_order,
+                                      model=options["model"],
+                                      exog=model_config.get("exog"),
+                                      freq=options["freq"],
+                                      n_jobs=options["n_jobs"])
+    if engine == "ensemble":
+        options = model_config["ensemble"]
+        return EnsemblePredictor(order=order, seasonal_order=seasonal_order,
+                                 members=options["members"],
+                                 exog=model_config.get("exog"),
+                                 holdout=options["holdout"],
+                                 timeout=options["timeout"],
+                                 max_workers=options["max_workers"],
+                                 freq=model_config["statsforecast"]["freq"])
+    if engine == "temporal":
+        options = model_config["temporal"]
+        return TemporalPredictor(order=order, seasonal_order=seasonal_order,
+                                 levels=options["levels"],
+                                 exog=model_config.get("exog"),
+                                 daily_window=options["daily_window"],
+                                 horizon=options["horizon"],
+                                 max_workers=options["max_workers"])
+    update_policy = model_config["update"]
+    return SARIMAXPredictor(order=order,
+                            seasonal_order=seasonal_order,
+                            exog=model_config.get("exog"),
+                            refit_after=update_policy["refit_after"],
+                            full_refit_after=update_policy["full_refit_after"],
+                            refit_maxiter=update_policy["refit_maxiter"])
+
+def load_predictor(file_path: str, allow_pickle: bool = False):
+    """
+    Loads a predictor of any engine, chosen by the extension of its file, or by the class recorded
+    in a pickled file, which is read before anything is unpickled.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the saved model file: a SARIMAX ".npz" file, or a pickled statsforecast model,
+        ensemble or temporal aggregation model.
+    allow_pickle : bool, optional
+        Whether to load pickled models, by default False. Unpickling runs arbitrary code, so only
+        allow it for files you trust.
+
+    Returns
+    -------
+    SARIMAXPredictor | StatsForecastPredictor | EnsemblePredictor | TemporalPredictor
+        The loaded predictor.
+
+    Raises
+    ------
+    ValueError
+        If the file is a pickled model and `allow_pickle` is False, or does not hold a predictor.
+    """
+    if file_path.endswith(".npz"):
+        return SARIMAXPredictor.load(file_path)
+    if not allow_pickle:
+        raise ValueError(f"{file_path} is a pickled model: only load it with allow_pickle=True "
+                         "if you trust the file.")
+    loaders = {f"{engine.__module__}.{engine.__qualname__}": engine.load
+               for engine in ENGINES.values() if engine is not SARIMAXPredictor}
+    recorded = _pickled_class(file_path)
+    if recorded not in loaders:
+        raise ValueError(f"{file_path} does not hold a pickled predictor, but {recorded}.")
+    return loaders[recorded](file_path)
@@ -1,103 +1,361 @@
-import pandas as pd
-import statsmodels.api as statsmodelapi
-import pickle
+import datetime
+import os
+from functools import partial
 
-class SARIMAXPredictor:
+from loguru import logger
+
+from petroleumpriceprediction import instrument, release
+from petroleumpriceprediction.config import load_config, model_path, update_config
+from petroleumpriceprediction.stages import Stage, run_stages
+
+CONFIG_FILEPATH = "config.yaml"
+
+# The stages import their heavy dependencies when they run, so skipped stages cost nothing
+
+def fetch(config: dict):
+    from scripts.raw_data import generate, update
+    from scripts.process_data import append_data
+
+    raw_dir = config["data"]["raw_dir"]
+    if config["data"]["create_rawdata"]:
+        size = config["data"]["size"]
+        logger.info("Getting raw data")
+        logger.info(f"Size: {size}")
+        generate(size, raw_dir,
+                 max_workers=config["data"]["max_workers"],
+                 base_url=config["data"]["api_url"])
+    else:
+        # Only the new raw data is fetched and processed
+        logger.info("Updating raw data...")
+        new_responses = update(raw_dir,
+                               max_workers=config["data"]["max_workers"],
+                               base_url=config["data"]["api_url"])
+        append_data(new_responses, config["data"]["dataset_filepath"], raw_dir)
+
+def organize(config: dict):
+    from scripts.process_data import organize_data
+
+    # Pre process raw data
+    logger.info("Preprocessing data...")
+    organize_data(config["data"]["raw_dir"], config["data"]["dataset_filepath"])
+    logger.success("Dataset for model created!")
+
+def organize_opec(config: dict):
+    from scripts.process_data import organize_opec as organize_basket
+
+    # Pre process the OPEC basket prices, used as exogenous variable
+    logger.info("Preprocessing OPEC data...")
+    organize_basket(config["data"]["opec_xml_filepath"], config["data"]["opec_filepath"])
+
+def train(config: dict, config_filepath: str = CONFIG_FILEPATH):
+    from petroleumpriceprediction import data
+    from petroleumpriceprediction.backtest import backtest
+    from petroleumpriceprediction.model import SARIMAXPredictor, build_predictor
+    from petroleumpriceprediction.registry import ModelRegistry
+    from petroleumpriceprediction.search import search
+    from scripts.process_data import BRENT_SERIES
+
+    # Prepare data for model
+    with instrument.stage("load") as record:
+        dataset = data.load(config["data"]["dataset_filepath"])
+        record["rows"] = len(dataset)
+    with instrument.stage("preprocess") as record:
+        dataset = data.preprocess(dataset)
+        exog = config["model"]["exog"]
+        if exog:
+            dataset = data.join_exog(dataset, data.load(config["data"]["opec_filepath"]), exog)
+        record["rows"] = len(dataset)
+    print(dataset.head())
+
+    # Searching the model order
+    order = config["model"]["sarimax_order"]
+    seasonal_order = config["model"]["seasonal_order"]
+    search_config = config["search"]
+    if search_config["enabled"]:
+        logger.info("Searching model order...")
+        leaderboard = search(dataset["y"],
+                             space=search_config,
+                             strategy=search_config["strategy"],
+                             criterion=search_config["criterion"],
+                             holdout=search_config["holdout"],
+                             timeout=search_config["timeout"],
+                             max_workers=search_config["max_workers"],
+                             initial=(order, seasonal_order),
+                             exog=dataset[exog] if exog else None)
+        leaderboard.to_csv(search_config["leaderboard_path"], index=False)
+        fitted = leaderboard[leaderboard["status"] == "ok"].reset_index(drop=True)
+        if fitted.empty:
+            logger.error(f"No candidate order could be fitted, keeping {order}{seasonal_order}")
+        else:
+            order = list(fitted.loc[0, "order"])
+            seasonal_order = list(fitted.loc[0, "seasonal_order"])
+            update_config(config_filepath, "model", {"sarimax_order": order,
+                                                     "seasonal_order": seasonal_order})
+            logger.success(f"Best order: {order}{seasonal_order}")
+
+    # Training model
+    engine = config["model"]["engine"]
+    model_filepath = model_path(config["model"])
+    update_policy = config["model"]["update"]
+    sarimax = None
+    # Only the statsmodels engine can be updated with new observations
+    if (update_policy["enabled"] and engine == "statsmodels" and not search_config["enabled"]
+            and os.path.exists(model_filepath)):
+        sarimax = SARIMAXPredictor.load(model_filepath)
+        same_order = (list(sarimax.order) == list(order)
+                      and list(sarimax.seasonal_order) == list(seasonal_order)
+                      and sarimax.exog == list(exog or []))
+        if not same_order or sarimax.last_date is None:
+            sarimax = None
+
+    if sarimax is None:
+        logger.info(f"Training model with the {engine} engine...")
+        sarimax = build_predictor(config["model"], order, seasonal_order)
+        with instrument.stage("fit", rows=len(dataset)) as record:
+            sarimax.fit(dataset)
+            record["iterations"] = sarimax.iterations
+        if engine == "ensemble":
+            print(sarimax.report.to_string())
+    else:
+        # Only the days after the last one seen by the model are added
+        sarimax.refit_after = update_policy["refit_after"]
+        sarimax.full_refit_after = update_policy["full_refit_after"]
+        sarimax.refit_maxiter = update_policy["refit_maxiter"]
+        new_observations = dataset[dataset["ds"] > sarimax.last_date]
+        with instrument.stage("update", rows=len(new_observations)) as record:
+            mode = sarimax.update(new_observations, data=dataset)
+            record["mode"] = mode
+            record["iterations"] = sarimax.iterations if mode != "filter" else None
+        logger.info(f"Model updated with {len(new_observations)} new observations ({mode})")
+
+    # Evaluating model
+    model_metrics = {}
+    if engine == "statsmodels" and sarimax.information_criteria:
+        # Taken at the last estimation over the whole series, not over the tail of a loaded model
+        model_metrics.update(sarimax.information_criteria)
+    backtest_config = config["backtest"]
+    if backtest_config["enabled"] and engine != "statsmodels":
+        logger.warning("Backtesting is only available for the statsmodels engine, skipping it")
+    elif backtest_config["enabled"]:
+        logger.info("Backtesting model...")
+        _, metrics = backtest(sarimax, dataset,
+                              horizon=backtest_config["horizon"],
+                              n_origins=backtest_config["n_origins"],
+                              step=backtest_config["step"],
+                              window=backtest_config["window"],
+                              min_train=backtest_config["min_train"],
+                              refit_every=backtest_config["refit_every"],
+                              max_workers=backtest_config["max_workers"])
+        metrics.to_csv(backtest_config["metrics_path"])
+        print(metrics)
+        model_metrics.update({f"backtest_{name}": float(value) for name, value in metrics.mean().items()})
+
+    # Testing forecast
+    with instrument.stage("forecast", rows=5):
+        forecast = sarimax.forecast(steps=5)
+    print(forecast)
+
+    # Saving model file
+    os.makedirs(os.path.dirname(model_filepath) or ".", exist_ok=True)
+    with instrument.stage("save"):
+        sarimax.save(model_filepath)
+
+    # Registering the new version
+    ModelRegistry(config["registry"]["dir"]).register(
+        model_filepath, BRENT_SERIES, engine, sarimax.order, sarimax.seasonal_order, exog=sarimax.exog,
+        train_start=dataset["ds"].min().strftime("%Y-%m-%d"),
+        train_end=dataset["ds"].max().strftime("%Y-%m-%d"),
+        rows=len(dataset), metrics=model_metrics, keep=config["registry"]["keep"])
+
+def train_batch(config: dict):
+    from petroleumpriceprediction import data
+    from petroleumpriceprediction.batch import fit_all, fit_together
+    from petroleumpriceprediction.model import build_predictor
+    from petroleumpriceprediction.registry import ModelRegistry
+    from scripts.process_data import organize_data
+
+    # Training one model per series
+    multiseries_filepath = config["data"]["multiseries_filepath"]
+    logger.info("Preprocessing every series...")
+    organize_data(config["data"]["raw_dir"], multiseries_filepath, series=None)
+    multiseries = data.preprocess(data.load(multiseries_filepath))
+
+    logger.info("Training one model per series...")
+    order = config["model"]["sarimax_order"]
+    seasonal_order = config["model"]["seasonal_order"]
+    registry = ModelRegistry(config["registry"]["dir"])
+    windows = multiseries.groupby("unique_id", observed=True)["ds"].agg(["min", "max"])
+    if config["model"]["engine"] == "statsforecast":
+        # Every series is fitted by a single statsforecast call, without exogenous variables
+        predictor = build_predictor(dict(config["model"], exog=[]))
+        reports = fit_together(multiseries, predictor, model_dir=config["model"]["batch_dir"])
+        # The series share a single artifact, registered once
+        registry.register(reports.loc[0, "path"], "all", "statsforecast", order, seasonal_order,
+                          train_start=windows["min"].min().strftime("%Y-%m-%d"),
+                          train_end=windows["max"].max().strftime("%Y-%m-%d"),
+                          rows=int(reports["rows"].sum()), keep=config["registry"]["keep"])
+        return
+    reports = fit_all(multiseries,
+                      order=order,
+                      seasonal_order=seasonal_order,
+                      model_dir=config["model"]["batch_dir"],
+                      max_workers=config["model"]["batch_workers"])
+    for report in reports[reports["status"] == "ok"].itertuples():
+        window = windows.loc[report.unique_id]
+        registry.register(report.path, report.unique_id, "statsmodels", order, seasonal_order,
+                          train_start=window["min"].strftime("%Y-%m-%d"),
+                          train_end=window["max"].strftime("%Y-%m-%d"),
+                          rows=report.rows, keep=config["registry"]["keep"])
+
+def sections(config_filepath: str, *names: str):
+    """Returns a function reading the given sections of the configuration file."""
+    def read() -> dict:
+        config = load_config(config_filepath)
+        return {name: config.get(name) for name in names}
+    return read
+
+def build_stages(config: dict, config_filepath: str = CONFIG_FILEPATH) -> list[Stage]:
+    """Declares the stages of the pipeline with their inputs, outputs, configuration and code."""
+    from scripts.raw_store import manifest_path
+
+    data_config = config["data"]
+    # The manifest of the raw data store changes whenever any of its partitions does
+    raw_manifest = manifest_path(data_config["raw_dir"])
+    dataset_filepath = data_config["dataset_filepath"]
+    model_modules = ["petroleumpriceprediction.data", "petroleumpriceprediction.model"]
+
+    stages = []
+    fetch_outputs = [raw_manifest]
+    if data_config["create_rawdata"] or data_config["update_rawdata"]:
+        if not data_config["create_rawdata"]:
+            # The incremental refresh appends the new days to the dataset itself
+            fetch_outputs.append(dataset_filepath)
+        # External data can change every day, so the raw data is fetched at most once a day. The key
+        # uses the data section in memory, as set by `petroleum fetch --create/--update` or the scheduler
+        stages.append(Stage("fetch", partial(fetch, config),
+                            outputs=fetch_outputs,
+                            config=partial(dict, data=data_config),
+                            code=["scripts.raw_data", "scripts.raw_store", "scripts.process_data"],
+                            volatile=datetime.date.today().isoformat()))
+    if dataset_filepath not in fetch_outputs:
+        stages.append(Stage("organize", partial(organize, config),
+                            inputs=[raw_manifest],
+                            outputs=[dataset_filepath],
+                            code=["scripts.raw_store", "scripts.process_data"]))
+
+    train_inputs = [dataset_filepath]
+    if config["model"]["exog"]:
+        train_inputs.append(data_config["opec_filepath"])
+        stages.append(Stage("organize_opec", partial(organize_opec, config),
+                            inputs=[data_config["opec_xml_filepath"]],
+                            outputs=[data_config["opec_filepath"]],
+                            code=["scripts.process_data"]))
+
+    train_outputs = [model_path(config["model"])]
+    if config["search"]["enabled"]:
+        train_outputs.append(config["search"]["leaderboard_path"])
+    if config["backtest"]["enabled"]:
+        train_outputs.append(config["backtest"]["metrics_path"])
+    stages.append(Stage("train", partial(train, config, config_filepath),
+                        inputs=train_inputs,
+                        outputs=train_outputs,
+                        config=sections(config_filepath, "model", "search", "backtest"),
+                        code=model_modules + ["petroleumpriceprediction.search",
+                                             "petroleumpriceprediction.backtest"]))
+
+    if config["model"]["batch"]:
+        stages.append(Stage("train_batch", partial(train_batch, config),
+                            inputs=[raw_manifest],
+                            outputs=[data_config["multiseries_filepath"],
+                                     os.path.join(config["model"]["batch_dir"], "report.csv")],
+                            config=sections(config_filepath, "model"),
+                            code=model_modules + ["petroleumpriceprediction.batch", "scripts.raw_store",
+                                                  "scripts.process_data"]))
+    return stages
+
+def published_files(config: dict) -> list[str]:
+    """Lists the datasets and models read by the dashboard and the forecast service."""
+    from petroleumpriceprediction.registry import REGISTRY_INDEX
+    from scripts.raw_store import manifest_path
+
+    stages = build_stages(config)
+    # The raw data store is only read by the pipeline itself
+    files = {output for stage in stages for output in stage.outputs} - {manifest_path(config["data"]["raw_dir"])}
+    batch_dir = config["model"]["batch_dir"]
+    if config["model"]["batch"] and os.path.isdir(batch_dir):
+        files.update(os.path.join(batch_dir, name) for name in os.listdir(batch_dir))
+    # The index of the registry and the versions it lists, so it stays valid inside the release
+    files.add(os.path.join(config["registry"]["dir"], REGISTRY_INDEX))
+    files.update(registry_versions(config))
+    return sorted(filepath for filepath in files if os.path.isfile(filepath))
+
+def registry_versions(config: dict) -> list[str]:
+    """Lists the model versions of the registry, which are never rewritten once registered."""
+    from petroleumpriceprediction.registry import ModelRegistry
+
+    registry = ModelRegistry(config["registry"]["dir"])
+    return [registry.path(entry) for entry in registry.entries()]
+
+def run(config: dict, config_filepath: str = CONFIG_FILEPATH, names: list[str] = None,
+        force: bool = None, publish: bool = False) -> dict[str, str]:
     """
-    A class to build, train, and use a SARIMAX model for time series forecasting.
+    Runs the stages of the pipeline, skipping the ones that are up to date.
+
+    Runs take the lock set in `pipeline.lock_path`, so two runs never write the same files at once.
+
+    Parameters
+    ----------
+    config : dict
+        The configuration, as loaded from `config_filepath`.
+    config_filepath : str, optional
+        Path to the configuration file, by default `CONFIG_FILEPATH`.
+    names : list[str], optional
+        Names of the stages to run, by default every stage. The files produced by the other stages
+        are used as they are.
+    force : bool, optional
+        Whether to run the stages even when they are up to date, by default `pipeline.force`.
+    publish : bool, optional
+        Whether to publish the datasets and models as a new release once the stages succeed, as
+        set in the `release` section, by default False.
+
+    Returns
+    -------
+    dict[str, str]
+        The status of each stage, as returned by `run_stages`.
+
+    Raises
+    ------
+    RuntimeError
+        If another run holds the lock.
     """
-    def __init__(self, order: tuple, seasonal_order: tuple, trend: str = None):
-        """
-        Initializes the SARIMAX model with specified parameters.
-        
-        Parameters
-        ----------
-        order : tuple
-            ARIMA parameters (p, d, q).
-        seasonal_order : tuple
-            Seasonal ARIMA parameters (P, D, Q, s).
-        trend : str, optional
-            Trend component ('n', 'c', 't', 'ct'), by default None.
-        """
-        self.order = order
-        self.seasonal_order = seasonal_order
-        self.trend = trend
-        self.model = None
-        self.results = None
-
-    def fit(self, data: pd.DataFrame):
-        """
-        Fits the SARIMAX model to the provided data.
-        
-        Parameters
-        ----------
-        data : pd.DataFrame
-            A DataFrame containing the time series to train the model on. 
-            It must include a column "y" with the target variable.
-        """
-        self.model = statsmodelapi.tsa.statespace.SARIMAX(
-            endog=data["y"],
-            order=self.order,
-            seasonal_order=self.seasonal_order, 
-            trend=self.trend,
-            enforce_stationarity=False,
-            enforce_invertibility=False
-        )
-        self.results = self.model.fit(disp=False)
-        print("Model was successfully fitted!")
-
-    def forecast(self, steps: int) -> pd.Series:
-        """
-        Makes forecasts for the specified number of steps ahead.
-        
-        Parameters
-        ----------
-        steps : int
-            Number of steps (e.g., days, periods) to forecast.
-        
-        Returns
-        -------
-        pd.Series
-            Forecasted values for the specified future periods.
-        
-        Raises
-        ------
-        ValueError
-            If the model has not been fitted yet.
-        """
-        if not self.results:
-            raise ValueError("You must fit the model before making forecasts.")
-        
-        forecast = self.results.get_forecast(steps=steps)
-        return forecast.predicted_mean
-
-    def save(self, file_path: str):
-        """
-        Saves the trained model to a file.
-        
-        Parameters
-        ----------
-        file_path : str
-            Path where the model should be saved.
-        """
-        with open(file_path, 'wb') as f:
-            pickle.dump(self, f)
-        print(f"Model saved to {file_path}")
-
-    @staticmethod
-    def load(file_path: str) -> 'SARIMAXPredictor':
-        """
-        Loads a trained SARIMAX model from a file.
-        
-        Parameters
-        ----------
-        file_path : str
-            Path to the saved model file.
-        
-        Returns
-        -------
-        SARIMAXPredictor
-            An instance of the loaded SARIMAXPredictor class.
-        """
-        with open(file_path, 'rb') as f:
-            return pickle.load(f)
\ No newline at end of file
+    from scripts import raw_store
+
+    pipeline_config = config["pipeline"]
+    data_config = config["data"]
+    with release.file_lock(pipeline_config["lock_path"]) as locked:
+        if not locked:
+            raise RuntimeError(f"Another run of the pipeline holds {pipeline_config['lock_path']}.")
+        # Raw data fetched by older versions is moved to the partitioned store once
+        if (os.path.exists(data_config["raw_filepath"])
+                and not os.path.exists(raw_store.manifest_path(data_config["raw_dir"]))):
+            raw_store.migrate(data_config["raw_filepath"], data_config["raw_dir"])
+        stages = build_stages(config, config_filepath)
+        if names is not None:
+            stages = [stage for stage in stages if stage.name in names]
+            if not stages:
+                logger.warning(f"None of the stages {names} is enabled in {config_filepath}")
+                return {}
+        instrument.configure(**config["instrumentation"])
+        try:
+            status = run_stages(stages,
+                                state_path=pipeline_config["state_path"],
+                                max_workers=pipeline_config["max_workers"],
+                                force=pipeline_config["force"] if force is None else force)
+        finally:
+            instrument.write_reports()
+        if publish:
+            release_config = config["release"]
+            release.publish(published_files(config), release_config["releases_dir"],
+                            keep=release_config["keep"], metadata={"stages": status},
+                            linked=registry_versions(config))
+        return status
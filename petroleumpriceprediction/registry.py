@@ -0,0 +1,325 @@
+import json
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import partial
+from loguru import logger
+
+from petroleumpriceprediction.files import write_atomic, write_text
+from petroleumpriceprediction.release import file_lock
+
+# Name of the index of a registry, inside its directory
+REGISTRY_INDEX = "registry.json"
+
+INDEX_VERSION = 1
+
+def slugify(name: str) -> str:
+    """Turns a name, such as a `series-description`, into a lowercase identifier usable in paths.
+
+    Parameters
+    ----------
+    name : str
+        The name.
+
+    Returns
+    -------
+    str
+        The name with every run of other characters than lowercase letters and digits replaced by "_".
+    """
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+
+def model_key(series: str, engine: str, order: tuple, seasonal_order: tuple, exog: list[str] = None) -> str:
+    """Builds the key shared by the versions of a model.
+
+    Parameters
+    ----------
+    series : str
+        Name of the series the model was trained on.
+    engine : str
+        Engine of the model, as in `model.engine`.
+    order : tuple
+        ARIMA parameters (p, d, q).
+    seasonal_order : tuple
+        Seasonal ARIMA parameters (P, D, Q, s).
+    exog : list[str], optional
+        Exogenous variables of the model, by default None.
+
+    Returns
+    -------
+    str
+        The key, as in "europe_brent_spot_price_fob_dollars_per_barrel/statsmodels/1-1-1_0-1-1-5+opec_price".
+    """
+    orders = f"{'-'.join(map(str, order))}_{'-'.join(map(str, seasonal_order))}"
+    return f"{slugify(series)}/{engine}/{orders}" + "".join(f"+{slugify(name)}" for name in exog or [])
+
+class ModelRegistry:
+    """
+    Versioned model artifacts, indexed by series, engine, order and exogenous variables in a JSON file.
+
+    Each registered artifact is copied to `<key>/v<version>` inside the registry directory, so the
+    versions never change once written. Only the index is read until a model is requested, so
+    opening a registry costs the same whatever the number of models.
+    """
+    def __init__(self, registry_dir: str):
+        """
+        Opens a registry, which may not exist yet.
+
+        Parameters
+        ----------
+        registry_dir : str
+            Directory of the registry.
+        """
+        self.registry_dir = registry_dir
+        self.index_path = os.path.join(registry_dir, REGISTRY_INDEX)
+        self._index = {"version": INDEX_VERSION, "models": {}}
+        self._stamp = None
+
+    def entries(self, series: str = None, engine: str = None, order: tuple = None,
+                seasonal_order: tuple = None) -> list[dict]:
+        """
+        Lists the registered models, optionally filtered.
+
+        Parameters
+        ----------
+        series : str, optional
+            Name of the series, by default every series.
+        engine : str, optional
+            Engine of the models, by default every engine.
+        order : tuple, optional
+            ARIMA parameters (p, d, q), by default every order.
+        seasonal_order : tuple, optional
+            Seasonal ARIMA parameters (P, D, Q, s), by default every seasonal order.
+
+        Returns
+        -------
+        list[dict]
+            The entries of the models, sorted by key and version. Each entry has its "id" ("<key>/v<version>"),
+            "key", "series", "engine", "order", "seasonal_order", "exog", "version", "path" (relative to the
+            registry), "size" in bytes, "created_at", training window ("train_start", "train_end"
+            and "rows") and "metrics".
+        """
+        selected = []
+        for entry in self._read()["models"].values():
+            if ((series is None or entry["series"] == series)
+                    and (engine is None or entry["engine"] == engine)
+                    and (order is None or entry["order"] == list(order))
+                    and (seasonal_order is None or entry["seasonal_order"] == list(seasonal_order))):
+                selected.append(entry)
+        return sorted(selected, key=lambda entry: (entry["key"], entry["version"]))
+
+    def resolve(self, model_id: str) -> dict:
+        """
+        Finds the entry of a model by its id, or the latest version of a key.
+
+        Parameters
+        ----------
+        model_id : str
+            Id ("<key>/v<version>") or key of the model.
+
+        Returns
+        -------
+        dict
+            The entry of the model.
+
+        Raises
+        ------
+        KeyError
+            If no model has this id or key.
+        """
+        models = self._read()["models"]
+        if model_id in models:
+            return models[model_id]
+        versions = [entry for entry in models.values() if entry["key"] == model_id]
+        if not versions:
+            raise KeyError(f"Unknown model '{model_id}'.")
+        return max(versions, key=lambda entry: entry["version"])
+
+    def path(self, entry: dict) -> str:
+        """Returns the path of the artifact of an entry."""
+        return os.path.join(self.registry_dir, entry["path"])
+
+    def register(self, filepath: str, series: str, engine: str, order: tuple, seasonal_order: tuple,
+                 exog: list[str] = None, train_start: str = None, train_end: str = None, rows: int = None,
+                 metrics: dict = None, keep: int = None) -> dict:
+        """
+        Registers a model artifact as the next version of its key.
+
+        Parameters
+        ----------
+        filepath : str
+            Path to the artifact, as written by the `save` method of the predictor. It is copied.
+        series : str
+            Name of the series the model was trained on.
+        engine : str
+            Engine of the model, as in `model.engine`.
+        order : tuple
+            ARIMA parameters (p, d, q).
+        seasonal_order : tuple
+            Seasonal ARIMA parameters (P, D, Q, s).
+        exog : list[str], optional
+            Exogenous variables of the model, by default None.
+        train_start : str, optional
+            First date of the training data (format: YYYY-MM-DD), by default None.
+        train_end : str, optional
+            Last date of the training data (format: YYYY-MM-DD), by default None.
+        rows : int, optional
+            Number of training observations, by default None.
+        metrics : dict, optional
+            Metrics of the model, such as its AIC or backtest errors, by default None.
+        keep : int, optional
+            Number of versions of the key kept, the older ones being removed, by default all.
+
+        Returns
+        -------
+        dict
+            The entry of the new version.
+        """
+        key = model_key(series, engine, order, seasonal_order, exog)
+        # Concurrent trainings register one after the other
+        with file_lock(os.path.join(self.registry_dir, ".lock"), blocking=True):
+            index = self._read()
+            versions = [entry["version"] for entry in index["models"].values() if entry["key"] == key]
+            version = max(versions, default=0) + 1
+            relative = os.path.join(key, f"v{version}{os.path.splitext(filepath)[1]}")
+            target = os.path.join(self.registry_dir, relative)
+            write_atomic(target, partial(shutil.copy2, filepath))
+            entry = {"id": f"{key}/v{version}", "key": key, "series": series, "engine": engine,
+                     "order": list(order), "seasonal_order": list(seasonal_order), "exog": list(exog or []),
+                     "version": version, "path": relative, "size": os.path.getsize(target),
+                     "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                     "train_start": train_start, "train_end": train_end, "rows": rows,
+                     "metrics": metrics or {}}
+            models = dict(index["models"], **{entry["id"]: entry})
+            if keep is not None:
+                for old in sorted(versions)[:max(len(versions) + 1 - keep, 0)]:
+                    removed = models.pop(f"{key}/v{old}")
+                    os.remove(os.path.join(self.registry_dir, removed["path"]))
+            self._write(dict(index, models=models))
+        logger.info(f"Registered model {entry['id']}")
+        return entry
+
+    def _read(self) -> dict:
+        """Reads the index, again only when its file changed."""
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return self._index
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp != self._stamp:
+            with open(self.index_path, "r") as file:
+                self._index = json.load(file)
+            self._stamp = stamp
+        return self._index
+
+    def _write(self, index: dict) -> None:
+        """Writes the index atomically."""
+        write_text(self.index_path, json.dumps(index, indent=1))
+
+class ModelCache:
+    """
+    Models loaded on first use and kept in memory, up to a total artifact size, least recently used
+    first out.
+
+    The size of a model is the one of its artifact file, which grows with the model as its memory
+    footprint does. A model whose file changed is loaded again on its next use. It is safe to share
+    between threads.
+    """
+    def __init__(self, max_bytes: int, max_entries: int = None, loader=None):
+        """
+        Creates an empty cache.
+
+        Parameters
+        ----------
+        max_bytes : int
+            Total size of the artifacts of the resident models. The most recent model is always
+            kept, even if larger.
+        max_entries : int, optional
+            Number of resident models, by default no limit.
+        loader : callable, optional
+            Function loading an artifact from its path, by default `load_predictor`.
+        """
+        if loader is None:
+            from petroleumpriceprediction.model import load_predictor as loader
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.loader = loader
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Loads are serialized, so concurrent requests of a new model load it once
+        self._load_lock = threading.Lock()
+
+    def get(self, filepath: str):
+        """
+        Returns the model of an artifact, loading it if it is not resident or its file changed.
+
+        Parameters
+        ----------
+        filepath : str
+            Path to the artifact.
+
+        Returns
+        -------
+        object
+            The model, as returned by the loader.
+        """
+        stat = os.stat(filepath)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        model = self._hit(filepath, stamp)
+        if model is not None:
+            return model
+        with self._load_lock:
+            # Another thread may have loaded it meanwhile
+            model = self._hit(filepath, stamp)
+            if model is not None:
+                return model
+            with self._lock:
+                self.misses += 1
+            model = self.loader(filepath)
+            with self._lock:
+                if filepath in self._entries:
+                    self._bytes -= self._entries.pop(filepath)[2]
+                self._entries[filepath] = (stamp, model, stat.st_size)
+                self._bytes += stat.st_size
+                while len(self._entries) > 1 and (self._bytes > self.max_bytes or (
+                        self.max_entries is not None and len(self._entries) > self.max_entries)):
+                    evicted, (_, _, size) = self._entries.popitem(last=False)
+                    self._bytes -= size
+                    self.evictions += 1
+                    logger.debug(f"Evicted model {evicted} from the cache")
+        return model
+
+    def peek(self, filepath: str):
+        """Returns the model of an artifact if it is resident, without loading it or counting a hit."""
+        with self._lock:
+            entry = self._entries.get(filepath)
+        return entry[1] if entry is not None else None
+
+    def stats(self) -> dict:
+        """
+        Returns the counters of the cache.
+
+        Returns
+        -------
+        dict
+            The "hits", "misses" and "evictions" so far, and the resident "entries" and their "bytes".
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "entries": len(self._entries), "bytes": self._bytes}
+
+    def _hit(self, filepath: str, stamp: tuple):
+        """Returns the resident model of an artifact if its file did not change, counting a hit."""
+        with self._lock:
+            entry = self._entries.get(filepath)
+            if entry is None or entry[0] != stamp:
+                return None
+            self._entries.move_to_end(filepath)
+            self.hits += 1
+            return entry[1]
@@ -0,0 +1,209 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import partial
+from loguru import logger
+
+from petroleumpriceprediction.files import write_atomic
+
+# Name of the link to the release readers use, inside the releases directory
+CURRENT = "current"
+
+# Name of the file describing a release, inside its directory
+RELEASE_MANIFEST = "release.json"
+
+@contextmanager
+def file_lock(filepath: str, blocking: bool = False):
+    """Takes an exclusive lock on a file, without waiting for it by default.
+
+    The lock is held by the open file, so it is released when the block ends or the process dies,
+    and never goes stale.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to the lock file, created if needed.
+    blocking : bool, optional
+        Whether to wait until the lock is released by another process, by default False.
+
+    Yields
+    ------
+    bool
+        Whether the lock was taken. When it is held by another process, the block should not run.
+    """
+    os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+    with open(filepath, "a") as file:
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+def publish(filepaths: list[str], releases_dir: str, keep: int = 5, metadata: dict = None,
+            linked: list[str] = None) -> str:
+    """Publishes files as a new release and points the current release to it.
+
+    The files are copied into a new versioned directory, keeping their paths relative to the
+    working directory, and the directory is renamed into place once complete. The `current` link is
+    then replaced atomically, so a reader resolving it always sees every file of a single release.
+
+    Files that are never rewritten, such as the versions of a model registry, can be hard-linked
+    instead, so publishing them costs nothing whatever their number. Their checksum is taken from
+    the current release when it links the same file.
+
+    Parameters
+    ----------
+    filepaths : list[str]
+        Paths to the files of the release, relative to the working directory.
+    releases_dir : str
+        Directory holding the releases.
+    keep : int, optional
+        Number of releases kept, the older ones being removed, by default 5.
+    metadata : dict, optional
+        Extra fields written to the manifest of the release, by default None.
+    linked : list[str], optional
+        Paths among `filepaths` that are never rewritten in place, hard-linked rather than copied
+        when the releases are on the same file system, by default None.
+
+    Returns
+    -------
+    str
+        The version of the release, which is the name of its directory.
+
+    Raises
+    ------
+    ValueError
+        If a file is outside of the working directory.
+    """
+    version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    staging = os.path.join(releases_dir, f".{version}.tmp")
+    linked = {os.path.relpath(filepath) for filepath in linked or []}
+    previous = current_release(releases_dir)
+    previous_files = read_manifest(previous)["files"] if previous is not None else {}
+    files = {}
+    for filepath in filepaths:
+        relative = os.path.relpath(filepath)
+        if relative.startswith(os.pardir):
+            raise ValueError(f"{filepath} is outside of the working directory and cannot be published.")
+        target = os.path.join(staging, relative)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if relative in linked and _link(filepath, target):
+            previous_path = os.path.join(previous, relative) if previous is not None else None
+            if (relative in previous_files and os.path.exists(previous_path)
+                    and os.path.samefile(previous_path, target)):
+                files[relative] = previous_files[relative]
+                continue
+        else:
+            # Copied rather than linked: some outputs are rewritten in place by the next run
+            shutil.copy2(filepath, target)
+        files[relative] = {"size": os.path.getsize(target), "sha256": _sha256(target)}
+    manifest = {"version": version, "created_at": datetime.now(timezone.utc).isoformat(),
+                "files": files, **(metadata or {})}
+    with open(os.path.join(staging, RELEASE_MANIFEST), "w") as file:
+        json.dump(manifest, file, indent=2)
+    os.rename(staging, os.path.join(releases_dir, version))
+
+    link = os.path.join(releases_dir, CURRENT)
+    write_atomic(link, partial(_symlink, version))
+    logger.success(f"Published release {version} with {len(files)} files")
+    prune(releases_dir, keep)
+    return version
+
+def prune(releases_dir: str, keep: int) -> list[str]:
+    """Removes the oldest releases, never the current one.
+
+    Parameters
+    ----------
+    releases_dir : str
+        Directory holding the releases.
+    keep : int
+        Number of releases kept.
+
+    Returns
+    -------
+    list[str]
+        The versions removed.
+    """
+    current = os.path.basename(current_release(releases_dir) or "")
+    versions = sorted(entry for entry in os.listdir(releases_dir)
+                      if not os.path.islink(os.path.join(releases_dir, entry))
+                      and os.path.isfile(os.path.join(releases_dir, entry, RELEASE_MANIFEST)))
+    removed = [version for version in versions[:max(len(versions) - keep, 0)] if version != current]
+    for version in removed:
+        shutil.rmtree(os.path.join(releases_dir, version))
+    return removed
+
+def current_release(releases_dir: str) -> str | None:
+    """Resolves the directory of the current release.
+
+    Readers should resolve it once and read every file from the returned directory, so a release
+    published meanwhile does not mix files of two releases.
+
+    Parameters
+    ----------
+    releases_dir : str
+        Directory holding the releases.
+
+    Returns
+    -------
+    str | None
+        The directory of the current release, or `None` if nothing was published yet.
+    """
+    link = os.path.join(releases_dir, CURRENT)
+    if not os.path.exists(link):
+        return None
+    return os.path.realpath(link)
+
+def published_path(filepath: str, release: str | None) -> str:
+    """Returns the path of a file in a release, or the file itself outside of releases.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to the file, relative to the working directory.
+    release : str | None
+        Directory of a release, as returned by `current_release`, or `None`.
+
+    Returns
+    -------
+    str
+        The path of the file in the release if it holds it, otherwise `filepath`.
+    """
+    if release is None:
+        return filepath
+    published = os.path.join(release, os.path.relpath(filepath))
+    return published if os.path.exists(published) else filepath
+
+def read_manifest(release: str) -> dict:
+    """Reads the manifest of a release, with the "size" and "sha256" of its "files" by relative path."""
+    with open(os.path.join(release, RELEASE_MANIFEST), "r") as file:
+        return json.load(file)
+
+def _link(filepath: str, target: str) -> bool:
+    """Hard-links a file, returning False if the file system cannot link it."""
+    try:
+        os.link(filepath, target)
+    except OSError:
+        return False
+    return True
+
+def _symlink(target: str, path: str) -> None:
+    """Replaces the file at `path` by a symbolic link to `target`."""
+    os.remove(path)
+    os.symlink(target, path)
+
+def _sha256(filepath: str) -> str:
+    """Computes the SHA-256 of a file."""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
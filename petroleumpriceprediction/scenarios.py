@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+
+def shifted_paths(last_value: float, shifts: list[float], steps: int, ramp: bool = False) -> np.ndarray:
+    """
+    Builds paths of an exogenous variable moved by relative shifts from its last value.
+
+    Parameters
+    ----------
+    last_value : float
+        Last observed value of the variable.
+    shifts : list[float]
+        Relative moves of each path, e.g. [0.1, -0.2] for +10% and -20%.
+    steps : int
+        Number of future steps.
+    ramp : bool, optional
+        Whether each path moves linearly up to its shift over the steps, instead of jumping to it on
+        the first step, by default False.
+
+    Returns
+    -------
+    np.ndarray
+        The paths, with one row per shift and one column per step.
+    """
+    shifts = np.asarray(shifts, dtype=float)[:, None]
+    progress = np.arange(1, steps + 1) / steps if ramp else np.ones(steps)
+    return last_value * (1 + shifts * progress[None, :])
+
+def historical_paths(history: np.ndarray, steps: int, n_scenarios: int = None) -> np.ndarray:
+    """
+    Builds paths of an exogenous variable that repeat its past moves from its last value.
+
+    Every window of `steps` consecutive moves of the history gives a path: the relative changes
+    of the window are applied to the last value, so the paths keep the volatility, trends and
+    shocks actually observed.
+
+    Parameters
+    ----------
+    history : np.ndarray
+        Observed values of the variable, from the oldest to the newest.
+    steps : int
+        Number of future steps.
+    n_scenarios : int, optional
+        Number of paths, taken from the most recent windows, by default every window.
+
+    Returns
+    -------
+    np.ndarray
+        The paths, with one row per window, from the most recent, and one column per step.
+
+    Raises
+    ------
+    ValueError
+        If the history is not longer than the number of steps.
+    """
+    history = np.asarray(history, dtype=float)
+    if len(history) <= steps:
+        raise ValueError(f"The history has {len(history)} values: more than {steps} are needed.")
+    windows = np.lib.stride_tricks.sliding_window_view(history, steps + 1)[::-1]
+    if n_scenarios is not None:
+        windows = windows[:n_scenarios]
+    return history[-1] * windows[:, 1:] / windows[:, :1]
+
+def bootstrap_paths(history: np.ndarray, steps: int, n_scenarios: int, block: int = 5,
+                    seed: int = None) -> np.ndarray:
+    """
+    Builds paths of an exogenous variable from blocks of its past log returns drawn at random.
+
+    Blocks of consecutive returns are drawn with replacement and chained, so the paths keep the
+    short-term dependence of the returns while being as many as needed.
+
+    Parameters
+    ----------
+    history : np.ndarray
+        Observed values of the variable, from the oldest to the newest.
+    steps : int
+        Number of future steps.
+    n_scenarios : int
+        Number of paths.
+    block : int, optional
+        Number of consecutive returns of each block, by default 5 (one business week).
+    seed : int, optional
+        Seed of the random generator, by default None.
+
+    Returns
+    -------
+    np.ndarray
+        The paths, with one row per scenario and one column per step.
+
+    Raises
+    ------
+    ValueError
+        If the history is shorter than a block.
+    """
+    history = np.asarray(history, dtype=float)
+    returns = np.diff(np.log(history))
+    if len(returns) < block:
+        raise ValueError(f"The history has {len(returns)} returns: at least {block} are needed.")
+    rng = np.random.default_rng(seed)
+    n_blocks = -(-steps // block)
+    starts = rng.integers(0, len(returns) - block + 1, size=(n_scenarios, n_blocks))
+    drawn = returns[starts[..., None] + np.arange(block)].reshape(n_scenarios, -1)[:, :steps]
+    return history[-1] * np.exp(np.cumsum(drawn, axis=1))
+
+def scenario_frame(forecasts: dict[str, np.ndarray], names: list[str], start: pd.Timestamp) -> pd.DataFrame:
+    """
+    Formats the conditional forecasts of named scenarios in long format.
+
+    Parameters
+    ----------
+    forecasts : dict[str, np.ndarray]
+        The "mean", "lower" and "upper" forecasts of each scenario, as returned by
+        `SARIMAXPredictor.forecast_scenarios`.
+    names : list[str]
+        Name of each scenario.
+    start : pd.Timestamp
+        Last observed date: the forecasts are dated with the following business days.
+
+    Returns
+    -------
+    pd.DataFrame
+        A DataFrame with the "scenario", "date", "mean", "lower" and "upper" columns.
+    """
+    n_scenarios, steps = forecasts["mean"].shape
+    dates = pd.bdate_range(start + pd.offsets.BDay(1), periods=steps)
+    return pd.DataFrame({"scenario": np.repeat(names, steps),
+                         "date": np.tile(dates, n_scenarios),
+                         **{column: forecasts[column].ravel() for column in ("mean", "lower", "upper")}})
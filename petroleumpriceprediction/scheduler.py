@@ -0,0 +1,236 @@
+import multiprocessing
+import os
+import signal
+import threading
+from datetime import datetime, timedelta
+from loguru import logger
+
+# Ranges of the fields of a cron expression: minute, hour, day of month, month and day of week
+CRON_FIELDS = (("minute", 0, 59), ("hour", 0, 23), ("day", 1, 31), ("month", 1, 12), ("weekday", 0, 6))
+
+# Seconds a stopped refresh is given to exit before it is killed
+REFRESH_GRACE = 10
+
+class CronSchedule:
+    """
+    A schedule given by a five-field cron expression, such as "30 6 * * 1-5".
+
+    Each field accepts "*", single values, ranges ("1-5"), lists ("1,15") and steps ("*/15",
+    "0-30/10"). Days of the week go from 0 (Sunday) to 6, and 7 is also Sunday. As in cron, when
+    both the day of the month and the day of the week are restricted, a day matching either runs.
+    """
+    def __init__(self, expression: str):
+        """
+        Parses a cron expression.
+
+        Parameters
+        ----------
+        expression : str
+            The five fields, separated by spaces.
+
+        Raises
+        ------
+        ValueError
+            If the expression does not have five valid fields.
+        """
+        fields = expression.split()
+        if len(fields) != len(CRON_FIELDS):
+            raise ValueError(f"Cron expression '{expression}' must have {len(CRON_FIELDS)} fields.")
+        self.expression = expression
+        self.values = {}
+        for field, (name, low, high) in zip(fields, CRON_FIELDS):
+            self.values[name] = _parse_field(field, low, 7 if name == "weekday" else high)
+        if 7 in self.values["weekday"]:
+            self.values["weekday"] = (self.values["weekday"] - {7}) | {0}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def matches(self, moment: datetime) -> bool:
+        """
+        Checks whether a minute is part of the schedule.
+
+        Parameters
+        ----------
+        moment : datetime
+            The minute.
+
+        Returns
+        -------
+        bool
+            Whether the schedule runs on it.
+        """
+        return (moment.minute in self.values["minute"]
+                and moment.hour in self.values["hour"]
+                and moment.month in self.values["month"]
+                and self._day_matches(moment))
+
+    def next_after(self, moment: datetime) -> datetime:
+        """
+        Finds the first minute of the schedule strictly after a moment.
+
+        Days and hours that cannot match are skipped whole, so the search takes at most a few
+        thousand steps, even for yearly schedules.
+
+        Parameters
+        ----------
+        moment : datetime
+            The moment.
+
+        Returns
+        -------
+        datetime
+            The next run.
+
+        Raises
+        ------
+        ValueError
+            If the schedule never runs, e.g. on February 30th.
+        """
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.values["month"] or not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.values["hour"]:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.values["minute"]:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression '{self.expression}' never runs.")
+
+    def _day_matches(self, moment: datetime) -> bool:
+        """Checks the day of the month and the day of the week, with the cron rules."""
+        day = moment.day in self.values["day"]
+        # Python counts the days of the week from Monday, cron from Sunday
+        weekday = (moment.weekday() + 1) % 7 in self.values["weekday"]
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+def _parse_field(field: str, low: int, high: int) -> set[int]:
+    """Lists the values of a field of a cron expression."""
+    values = set()
+    for part in field.split(","):
+        span, _, step = part.partition("/")
+        if span == "*":
+            start, end = low, high
+        elif "-" in span:
+            start, end = (int(value) for value in span.split("-", 1))
+        else:
+            start = end = int(span)
+            if step:
+                end = high
+        step = int(step) if step else 1
+        if not low <= start <= end <= high or step < 1:
+            raise ValueError(f"Invalid cron field '{field}': values must be within {low}-{high}.")
+        values.update(range(start, end + 1, step))
+    return values
+
+def refresh(config_filepath: str) -> None:
+    """
+    Runs every stage of the pipeline and publishes its outputs as a new release.
+
+    The new raw data is fetched first when `scheduler.update_rawdata` is set, whatever
+    `data.update_rawdata`. It runs in the background process started by `run_refresh`.
+
+    Parameters
+    ----------
+    config_filepath : str
+        Path to the configuration file.
+    """
+    from petroleumpriceprediction.config import load_config
+    from petroleumpriceprediction.pipeline import run
+
+    config = load_config(config_filepath)
+    if config["scheduler"]["update_rawdata"]:
+        config["data"]["update_rawdata"] = True
+    run(config, config_filepath, publish=True)
+
+def refresh_in_group(config_filepath: str) -> None:
+    """Runs `refresh` in a new process group, so the processes it starts can be stopped with it."""
+    os.setpgrp()
+    refresh(config_filepath)
+
+def run_refresh(config_filepath: str, timeout: float = None) -> bool:
+    """
+    Runs `refresh` in a background process, stopping it if it takes too long.
+
+    A crash or a leak of the run never reaches the scheduler, and the memory of the models it
+    trains is given back once it ends. The run has its own process group, so the workers it
+    starts, such as the ones fitting the models, are stopped with it and never outlive it.
+
+    Parameters
+    ----------
+    config_filepath : str
+        Path to the configuration file.
+    timeout : float, optional
+        Time limit of the run, in seconds, by default no limit.
+
+    Returns
+    -------
+    bool
+        Whether the run succeeded.
+    """
+    process = multiprocessing.get_context("spawn").Process(target=refresh_in_group, args=(config_filepath,),
+                                                           name="refresh")
+    process.start()
+    process.join(timeout)
+    timed_out = process.is_alive()
+    if timed_out:
+        logger.error(f"Refresh timed out after {timeout}s, stopping it")
+        _signal_group(process, signal.SIGTERM)
+        process.join(REFRESH_GRACE)
+    # Workers left behind by a stopped or crashed run are killed too
+    _signal_group(process, signal.SIGKILL)
+    process.join()
+    if timed_out:
+        return False
+    if process.exitcode != 0:
+        logger.error(f"Refresh failed with exit code {process.exitcode}")
+        return False
+    return True
+
+def _signal_group(process: multiprocessing.Process, signum: int) -> None:
+    """Sends a signal to the process group of a refresh, or to the process if it has none yet."""
+    try:
+        if os.getpgid(process.pid) == process.pid:
+            os.killpg(process.pid, signum)
+            return
+    except ProcessLookupError:
+        # The process already exited: its group may still hold workers
+        try:
+            os.killpg(process.pid, signum)
+        except ProcessLookupError:
+            pass
+        return
+    # The run did not create its group yet, so it has not started any worker either
+    if process.is_alive():
+        os.kill(process.pid, signum)
+
+def run_forever(schedule: CronSchedule, config_filepath: str, timeout: float = None,
+                stop: threading.Event = None) -> None:
+    """
+    Runs a refresh at every time of a schedule, until stopped.
+
+    Runs are sequential: a run that ends after the next time of the schedule skips it.
+
+    Parameters
+    ----------
+    schedule : CronSchedule
+        The schedule, in local time.
+    config_filepath : str
+        Path to the configuration file.
+    timeout : float, optional
+        Time limit of each run, in seconds, by default no limit.
+    stop : threading.Event, optional
+        Event ending the loop when set, by default the loop runs until interrupted.
+    """
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        next_run = schedule.next_after(datetime.now())
+        logger.info(f"Next refresh at {next_run:%Y-%m-%d %H:%M}")
+        if stop.wait((next_run - datetime.now()).total_seconds()):
+            break
+        logger.info("Starting scheduled refresh...")
+        run_refresh(config_filepath, timeout)
@@ -0,0 +1,236 @@
+import itertools
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from petroleumpriceprediction.batch import available_workers
+from petroleumpriceprediction.model import SARIMAXPredictor
+
+CRITERIA = ("aic", "bic", "holdout")
+
+@contextmanager
+def time_limit(seconds: float):
+    """Raises `TimeoutError` inside the block once the given number of seconds has elapsed.
+
+    It relies on `SIGALRM`, so it only works in the main thread of a process (such as the workers of a
+    process pool) and is a no-op on platforms without it or when `seconds` is `None`.
+
+    Parameters
+    ----------
+    seconds : float
+        Time limit of the block, in seconds.
+    """
+    if not seconds or not hasattr(signal, "SIGALRM"):
+        yield
+        return
+
+    def handler(signum, frame):
+        raise TimeoutError(f"Timed out after {seconds}s")
+
+    previous = signal.signal(signal.SIGALRM, handler)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+def candidate_grid(space: dict) -> list[tuple[tuple, tuple]]:
+    """Lists every (order, seasonal_order) of a search space.
+
+    Parameters
+    ----------
+    space : dict
+        Dictionary with the lists of values of "p", "d", "q", "P", "D", "Q" and "s".
+
+    Returns
+    -------
+    list[tuple[tuple, tuple]]
+        Every combination of (p, d, q) and (P, D, Q, s).
+    """
+    return [((p, d, q), (P, D, Q, s))
+            for p, d, q, P, D, Q, s in itertools.product(space["p"], space["d"], space["q"],
+                                                         space["P"], space["D"], space["Q"], space["s"])]
+
+def neighbors(order: tuple, seasonal_order: tuple, space: dict) -> list[tuple[tuple, tuple]]:
+    """Lists the candidates that differ from the given one by one step in a single parameter.
+
+    Parameters
+    ----------
+    order : tuple
+        ARIMA parameters (p, d, q).
+    seasonal_order : tuple
+        Seasonal ARIMA parameters (P, D, Q, s).
+    space : dict
+        Search space, as in `candidate_grid`. Only values it holds are proposed.
+
+    Returns
+    -------
+    list[tuple[tuple, tuple]]
+        The neighboring candidates.
+    """
+    current = dict(zip("pdqPDQs", (*order, *seasonal_order)))
+    candidates = []
+    for name in "pdqPDQs":
+        values = sorted(space[name])
+        position = values.index(current[name]) if current[name] in values else None
+        if position is None:
+            continue
+        for step in (-1, 1):
+            if 0 <= position + step < len(values):
+                changed = dict(current, **{name: values[position + step]})
+                candidates.append(((changed["p"], changed["d"], changed["q"]),
+                                   (changed["P"], changed["D"], changed["Q"], changed["s"])))
+    return candidates
+
+def fit_candidate(y: pd.Series, order: tuple, seasonal_order: tuple, criterion: str = "aic",
+                  holdout: int = 20, timeout: float = None, warm_params: dict = None,
+                  exog: pd.DataFrame = None) -> dict:
+    """Fits a candidate order and scores it.
+
+    Parameters
+    ----------
+    y : pd.Series
+        The target series.
+    order : tuple
+        ARIMA parameters (p, d, q).
+    seasonal_order : tuple
+        Seasonal ARIMA parameters (P, D, Q, s).
+    criterion : str, optional
+        Score used to rank candidates: "aic", "bic" or "holdout" (MAE of the last `holdout` points
+        forecast by a fit on the previous ones), by default "aic".
+    holdout : int, optional
+        Number of points held out when `criterion` is "holdout", by default 20.
+    timeout : float, optional
+        Time limit of the fit, in seconds, by default no limit.
+    warm_params : dict, optional
+        Fitted parameters of a neighboring candidate, by name. The parameters both candidates share
+        are used as starting values, which usually saves most of the optimizer iterations.
+    exog : pd.DataFrame, optional
+        The exogenous variables, aligned with `y`. As in production, their last values before the
+        holdout are held constant over it.
+
+    Returns
+    -------
+    dict
+        Result with the "order", "seasonal_order", "status", "score", "aic", "bic", "iterations",
+        "fit_seconds", "error" and fitted "params" of the candidate.
+    """
+    result = {"order": tuple(order), "seasonal_order": tuple(seasonal_order), "status": "failed",
+              "score": np.inf, "aic": np.nan, "bic": np.nan, "iterations": None,
+              "fit_seconds": None, "error": None, "params": None}
+    endog = y.iloc[:-holdout] if criterion == "holdout" else y
+    train_exog = exog.iloc[:len(endog)].to_numpy(dtype=float) if exog is not None else None
+    start = time.perf_counter()
+    try:
+        with time_limit(timeout):
+            model = SARIMAXPredictor(order, seasonal_order).build_model(endog.reset_index(drop=True), train_exog)
+            start_params = None
+            if warm_params:
+                start_params = model.start_params.copy()
+                for index, name in enumerate(model.param_names):
+                    if name in warm_params:
+                        start_params[index] = warm_params[name]
+            results = model.fit(start_params=start_params, disp=False)
+    except Exception as error:
+        result["error"] = f"{type(error).__name__}: {error}"
+        result["fit_seconds"] = time.perf_counter() - start
+        return result
+
+    result["fit_seconds"] = time.perf_counter() - start
+    result["aic"] = results.aic
+    result["bic"] = results.bic
+    result["iterations"] = results.mle_retvals.get("iterations") if results.mle_retvals else None
+    result["params"] = dict(zip(model.param_names, np.asarray(results.params).tolist()))
+    if criterion == "holdout":
+        future_exog = np.repeat(train_exog[-1:], holdout, axis=0) if exog is not None else None
+        forecast = np.asarray(results.forecast(steps=holdout, exog=future_exog))
+        result["score"] = float(np.mean(np.abs(forecast - y.iloc[-holdout:].to_numpy())))
+    else:
+        result["score"] = result[criterion]
+    if np.isfinite(result["score"]):
+        result["status"] = "ok"
+    return result
+
+def search(y: pd.Series, space: dict, strategy: str = "stepwise", criterion: str = "aic",
+           holdout: int = 20, timeout: float = None, max_workers: int = None,
+           initial: tuple[tuple, tuple] = None, exog: pd.DataFrame = None) -> pd.DataFrame:
+    """Searches the best SARIMAX order, fitting candidates in a process pool.
+
+    The "grid" strategy fits every candidate of the space. The "stepwise" strategy starts at `initial`
+    and fits its neighbors, warm-started from its parameters, moving to the best neighbor while the
+    score improves. Regions of the space far from an improving path are never fitted.
+
+    Parameters
+    ----------
+    y : pd.Series
+        The target series.
+    space : dict
+        Search space, as in `candidate_grid`.
+    strategy : str, optional
+        "grid" or "stepwise", by default "stepwise".
+    criterion : str, optional
+        Score used to rank candidates, as in `fit_candidate`, by default "aic".
+    holdout : int, optional
+        Number of points held out when `criterion` is "holdout", by default 20.
+    timeout : float, optional
+        Time limit of each candidate, in seconds, by default no limit.
+    max_workers : int, optional
+        Number of worker processes, by default the number of available cores.
+    initial : tuple[tuple, tuple], optional
+        Starting (order, seasonal_order) of the stepwise strategy, by default the smallest values
+        of the space.
+    exog : pd.DataFrame, optional
+        The exogenous variables, aligned with `y`, by default None.
+
+    Returns
+    -------
+    pd.DataFrame
+        Leaderboard of the fitted candidates, from the best to the worst score.
+
+    Raises
+    ------
+    ValueError
+        If the strategy or criterion is unknown.
+    """
+    if criterion not in CRITERIA:
+        raise ValueError(f"Unknown criterion '{criterion}': use one of {CRITERIA}.")
+    if strategy not in ("grid", "stepwise"):
+        raise ValueError(f"Unknown strategy '{strategy}': use 'grid' or 'stepwise'.")
+
+    max_workers = max_workers or available_workers()
+    results = {}
+
+    def evaluate(executor, candidates, warm_params=None):
+        futures = {candidate: executor.submit(fit_candidate, y, *candidate, criterion, holdout,
+                                              timeout, warm_params, exog)
+                   for candidate in candidates if candidate not in results}
+        for candidate, future in futures.items():
+            results[candidate] = future.result()
+            result = results[candidate]
+            logger.info(f"{result['order']}{result['seasonal_order']}: {result['status']} "
+                        f"{criterion}={result['score']:.4f} in {result['fit_seconds']:.2f}s")
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        if strategy == "grid":
+            evaluate(executor, candidate_grid(space))
+        else:
+            if initial is None:
+                initial = ((min(space["p"]), min(space["d"]), min(space["q"])),
+                           (min(space["P"]), min(space["D"]), min(space["Q"]), min(space["s"])))
+            best = (tuple(initial[0]), tuple(initial[1]))
+            evaluate(executor, [best])
+            while True:
+                evaluate(executor, neighbors(*best, space), results[best]["params"])
+                challenger = min(results, key=lambda candidate: results[candidate]["score"])
+                if results[challenger]["score"] >= results[best]["score"]:
+                    break
+                best = challenger
+
+    leaderboard = pd.DataFrame(list(results.values())).drop(columns=["params"])
+    leaderboard = leaderboard.sort_values("score", kind="stable").reset_index(drop=True)
+    return leaderboard
@@ -0,0 +1,510 @@
+import fnmatch
+import glob
+import json
+import os
+import threading
+from concurrent.futures import Future, TimeoutError as FuturesTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pandas as pd
+from loguru import logger
+
+from petroleumpriceprediction.config import load_config
+from petroleumpriceprediction.release import current_release, published_path
+from petroleumpriceprediction.model import SARIMAXPredictor
+from petroleumpriceprediction.registry import ModelCache, ModelRegistry
+
+CONFIG_FILEPATH = "config.yaml"
+
+# Only the array artifacts are served, as loading them does not unpickle anything
+ARTIFACT_PATTERN = "*.npz"
+
+# Total artifact size of the models kept in memory when no cache is given
+DEFAULT_CACHE_BYTES = 256 * 2 ** 20
+
+class ResidentModel:
+    """
+    A model artifact, loaded on first use, whose forecasts are batched and cached.
+    """
+    def __init__(self, model_id: str, path: str, cache: ModelCache, batch_window: float = 0.005,
+                 entry: dict = None, timeout: float = None):
+        """
+        Registers the model artifact, without loading it.
+
+        Parameters
+        ----------
+        model_id : str
+            Identifier of the model, used in the requests.
+        path : str
+            Path to the model artifact, as written by `SARIMAXPredictor.save`.
+        cache : ModelCache
+            Cache loading the artifact when it is first forecast, shared by every model.
+        batch_window : float, optional
+            Seconds a request waits for concurrent requests to be forecast with it, by default 0.005.
+        entry : dict, optional
+            Entry of the model in the registry, if it comes from one, by default None.
+        timeout : float, optional
+            Seconds a request waits for the forecast of its batch, by default no limit.
+        """
+        self.model_id = model_id
+        self.path = path
+        self.cache = cache
+        self.batch_window = batch_window
+        self.entry = entry
+        self.timeout = timeout
+        self.stamp = None
+        self.last_date = None
+        self._cache = {}
+        self._pending = []
+        self._lock = threading.Lock()
+        self._compute_lock = threading.Lock()
+        self.reload()
+
+    @property
+    def predictor(self) -> SARIMAXPredictor:
+        """The model, loaded through the cache."""
+        try:
+            return self.cache.get(self.path)
+        except (OSError, ValueError, KeyError) as error:
+            # A broken new artifact does not replace the previous version of the model
+            previous = self.cache.peek(self.path)
+            if previous is not None:
+                logger.error(f"Could not load model '{self.model_id}' from {self.path}, keeping the previous "
+                             f"version: {error}")
+                return previous
+            raise RuntimeError(f"Could not load model '{self.model_id}' from {self.path}: {error}") from error
+
+    def reload(self) -> bool:
+        """
+        Forgets the cached forecasts if the artifact changed.
+
+        The new model is only loaded by the next forecast, and the cache loads it once fully read.
+
+        Returns
+        -------
+        bool
+            True if the artifact changed.
+        """
+        stat = os.stat(self.path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self.stamp:
+            return False
+        with self._lock:
+            self.stamp = stamp
+            self._cache = {}
+        return True
+
+    def forecast(self, steps: int, alpha: float = 0.05) -> pd.DataFrame:
+        """
+        Forecasts the model, batching concurrent requests into a single forecast.
+
+        The forecast of the longest horizon requested so far is cached for each `alpha` until the
+        artifact changes, and shorter horizons are answered with its first rows. Otherwise, the
+        first request starts a worker thread that waits `batch_window` seconds, then forecasts the
+        longest horizon of every request that arrived meanwhile.
+
+        Parameters
+        ----------
+        steps : int
+            Number of business days to forecast.
+        alpha : float, optional
+            Significance level of the intervals, by default 0.05 (95% intervals).
+
+        Returns
+        -------
+        pd.DataFrame
+            The forecast, with the "date", "mean", "lower" and "upper" columns.
+
+        Raises
+        ------
+        RuntimeError
+            If the model cannot be loaded, or the forecast of the batch takes longer than `timeout`.
+        """
+        future = Future()
+        with self._lock:
+            cached = self._cache.get(alpha)
+            if cached is not None and len(cached) >= steps:
+                return cached.iloc[:steps]
+            self._pending.append((steps, alpha, future))
+            leader = len(self._pending) == 1
+        if leader:
+            # Forecast by a worker thread, so the timeout also bounds the wait of the first request
+            flush = threading.Timer(self.batch_window, self._flush)
+            flush.daemon = True
+            flush.start()
+        try:
+            return future.result(timeout=self.timeout)
+        except FuturesTimeoutError:
+            raise RuntimeError(f"Forecast of model '{self.model_id}' timed out after {self.timeout}s.") from None
+
+    def _flush(self) -> None:
+        """Forecasts the pending requests, once per significance level."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            stamp = self.stamp
+        try:
+            predictor = self.predictor
+        except RuntimeError as error:
+            for _, _, future in pending:
+                future.set_exception(error)
+            return
+        self.last_date = predictor.last_date
+        for alpha in {alpha for _, alpha, _ in pending}:
+            group = [(steps, future) for steps, level, future in pending if level == alpha]
+            try:
+                with self._compute_lock:
+                    frame = forecast_frame(predictor, max(steps for steps, _ in group), alpha)
+            except Exception as error:
+                for _, future in group:
+                    future.set_exception(error)
+                continue
+            with self._lock:
+                cached = self._cache.get(alpha)
+                if self.stamp == stamp and (cached is None or len(cached) < len(frame)):
+                    self._cache[alpha] = frame
+            for steps, future in group:
+                future.set_result(frame.iloc[:steps])
+
+    def describe(self) -> dict:
+        """Returns the identifier, path and state of the model, without loading it."""
+        predictor = self.cache.peek(self.path)
+        description = {"model": self.model_id,
+                       "path": self.path,
+                       "resident": predictor is not None}
+        if self.entry is not None:
+            description.update({key: self.entry[key] for key in ("series", "engine", "order", "seasonal_order",
+                                                                 "version", "train_start", "train_end",
+                                                                 "metrics")})
+        if predictor is not None:
+            description.update({"order": list(predictor.order),
+                                "seasonal_order": list(predictor.seasonal_order),
+                                "exog": predictor.exog,
+                                "last_date": str(predictor.last_date.date()) if predictor.last_date is not None else None})
+        return description
+
+def forecast_frame(predictor: SARIMAXPredictor, steps: int, alpha: float) -> pd.DataFrame:
+    """
+    Forecasts a predictor, dating the forecasts with the business days after its last date.
+
+    Parameters
+    ----------
+    predictor : SARIMAXPredictor
+        The fitted predictor.
+    steps : int
+        Number of business days to forecast.
+    alpha : float
+        Significance level of the intervals.
+
+    Returns
+    -------
+    pd.DataFrame
+        The forecast, with the "date", "mean", "lower" and "upper" columns.
+    """
+    forecast = predictor.forecast_interval(steps=steps, alpha=alpha)
+    dates = None
+    if predictor.last_date is not None:
+        dates = pd.bdate_range(predictor.last_date + pd.offsets.BDay(1), periods=steps).strftime("%Y-%m-%d")
+    return pd.DataFrame({"date": dates,
+                         "mean": forecast["mean"].to_numpy(),
+                         "lower": forecast["lower"].to_numpy(),
+                         "upper": forecast["upper"].to_numpy()})
+
+class ForecastService:
+    """
+    Serves the model artifacts of some directories and of a registry, loading them on first use.
+    """
+    def __init__(self, model_dirs: list[str], default_model: str = None, batch_window: float = 0.005,
+                 max_steps: int = 365, registry: ModelRegistry = None, cache: ModelCache = None,
+                 timeout: float = None, max_batch: int = 100, releases_dir: str = None):
+        """
+        Lists the model artifacts of the directories and of the registry, without loading them.
+
+        Parameters
+        ----------
+        model_dirs : list[str]
+            Directories holding the model artifacts. Each model is identified by the name of its
+            file, without the extension.
+        default_model : str, optional
+            Identifier of the model forecast when a request does not name one, by default None.
+        batch_window : float, optional
+            Seconds a request waits for concurrent requests, by default 0.005.
+        max_steps : int, optional
+            Longest horizon that can be requested, by default 365.
+        registry : ModelRegistry, optional
+            Registry whose array artifacts are also served, by default None. Each model is
+            identified by its registry id ("<key>/v<version>"), and its key alone names its latest
+            version.
+        cache : ModelCache, optional
+            Cache of the loaded models, by default one bounded to `DEFAULT_CACHE_BYTES`.
+        timeout : float, optional
+            Seconds a request waits for its forecast, by default no limit.
+        max_batch : int, optional
+            Largest number of forecasts of a `POST /forecast` body, by default 100.
+        releases_dir : str, optional
+            Directory of the releases, by default None. The directories and the registry are then
+            read from the current release, resolved again by every scan, so a new release is
+            served as a whole once published.
+        """
+        self.model_dirs = model_dirs
+        self.default_model = default_model
+        self.batch_window = batch_window
+        self.max_steps = max_steps
+        self.registry = registry
+        self.cache = cache or ModelCache(DEFAULT_CACHE_BYTES, loader=SARIMAXPredictor.load)
+        self.timeout = timeout
+        self.max_batch = max_batch
+        self.releases_dir = releases_dir
+        self._registry_dir = registry.registry_dir if registry is not None else None
+        self.models = {}
+        self.scan()
+
+    def scan(self) -> None:
+        """
+        Lists the new and changed artifacts of the directories and the registry, and forgets the
+        removed ones. Only the files are checked: the models are loaded by their next forecast.
+        """
+        paths = {}
+        entries = {}
+        release = current_release(self.releases_dir) if self.releases_dir is not None else None
+        if self.registry is not None:
+            registry_dir = published_path(self._registry_dir, release)
+            if registry_dir != self.registry.registry_dir:
+                logger.info(f"Serving the registry of {registry_dir}")
+                self.registry = ModelRegistry(registry_dir)
+        for model_dir in self.model_dirs:
+            model_dir = published_path(model_dir, release)
+            for path in sorted(glob.glob(os.path.join(model_dir, ARTIFACT_PATTERN))):
+                model_id = os.path.splitext(os.path.basename(path))[0]
+                if model_id in paths:
+                    logger.warning(f"Model '{model_id}' of {path} is already served from {paths[model_id]}")
+                    continue
+                paths[model_id] = path
+        if self.registry is not None:
+            for entry in self.registry.entries():
+                if fnmatch.fnmatch(entry["path"], ARTIFACT_PATTERN):
+                    # Versions are sorted, so the key ends up naming the latest one
+                    for model_id in (entry["id"], entry["key"]):
+                        paths[model_id] = self.registry.path(entry)
+                        entries[model_id] = entry
+
+        models = dict(self.models)
+        for model_id in set(models) - set(paths):
+            logger.info(f"Model '{model_id}' was removed")
+            del models[model_id]
+        for model_id, path in paths.items():
+            try:
+                if model_id in models and models[model_id].path == path:
+                    if models[model_id].reload():
+                        logger.info(f"Model '{model_id}' changed in {path}")
+                else:
+                    models[model_id] = ResidentModel(model_id, path, self.cache, self.batch_window,
+                                                     entry=entries.get(model_id), timeout=self.timeout)
+                    logger.debug(f"Model '{model_id}' found in {path}")
+            except OSError as error:
+                logger.error(f"Could not read model '{model_id}' from {path}: {error}")
+        self.models = models
+
+    def watch(self, interval: float, stop: threading.Event) -> None:
+        """
+        Scans the directories every `interval` seconds until `stop` is set.
+
+        Parameters
+        ----------
+        interval : float
+            Seconds between two scans.
+        stop : threading.Event
+            Event stopping the watch.
+        """
+        while not stop.wait(interval):
+            self.scan()
+
+    def forecast(self, model_id: str = None, steps: int = 1, alpha: float = 0.05) -> dict:
+        """
+        Answers a forecast request.
+
+        Parameters
+        ----------
+        model_id : str, optional
+            Identifier of the model, by default the default model.
+        steps : int, optional
+            Number of business days to forecast, by default 1.
+        alpha : float, optional
+            Significance level of the intervals, by default 0.05.
+
+        Returns
+        -------
+        dict
+            The "model", its "last_date", and the "forecast" records with the "date", "mean",
+            "lower" and "upper" of each step.
+
+        Raises
+        ------
+        KeyError
+            If the model is unknown.
+        ValueError
+            If the horizon or the significance level is out of range.
+        """
+        model_id = model_id or self.default_model
+        if model_id not in self.models:
+            raise KeyError(f"Unknown model '{model_id}'.")
+        if not 1 <= steps <= self.max_steps:
+            raise ValueError(f"steps must be between 1 and {self.max_steps}.")
+        if not 0 < alpha < 1:
+            raise ValueError("alpha must be between 0 and 1.")
+        model = self.models[model_id]
+        frame = model.forecast(steps, alpha)
+        last_date = model.last_date
+        return {"model": model_id,
+                "last_date": str(last_date.date()) if last_date is not None else None,
+                "alpha": alpha,
+                "forecast": frame.to_dict(orient="records")}
+
+def make_handler(service: ForecastService) -> type:
+    """
+    Builds the request handler of a forecast service.
+
+    The handler answers:
+
+    - ``GET /health``: the status and the identifiers of the models.
+    - ``GET /models``: the description of every model.
+    - ``GET /forecast?model=<id>&steps=<n>&alpha=<a>``: a single forecast.
+    - ``POST /forecast``: many forecasts, from a JSON body with a "requests" list of at most
+      `service.max_batch` objects with the "model", "steps" and "alpha" of each one. Each result
+      is the answer of its request, or its "error".
+
+    Parameters
+    ----------
+    service : ForecastService
+        The service answering the requests.
+
+    Returns
+    -------
+    type
+        The `BaseHTTPRequestHandler` subclass.
+    """
+    class ForecastHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            if url.path == "/health":
+                self.respond(200, {"status": "ok", "models": sorted(service.models), "cache": service.cache.stats()})
+            elif url.path == "/models":
+                self.respond(200, [model.describe() for model in service.models.values()])
+            elif url.path == "/forecast":
+                self.respond(*self.answer(query))
+            else:
+                self.respond(404, {"error": f"Unknown path {url.path}"})
+
+        def do_POST(self):
+            if urlparse(self.path).path != "/forecast":
+                self.respond(404, {"error": f"Unknown path {self.path}"})
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                requests = body["requests"]
+            except (ValueError, KeyError, TypeError):
+                requests = None
+            if not isinstance(requests, list):
+                self.respond(400, {"error": "The body must be a JSON object with a 'requests' list."})
+                return
+            if len(requests) > service.max_batch:
+                self.respond(413, {"error": f"At most {service.max_batch} requests can be sent at once."})
+                return
+            # Every forecast of the body is requested at once, so they are batched together
+            answers = [None] * len(requests)
+            threads = [threading.Thread(target=lambda index=index, request=request:
+                                        answers.__setitem__(index, self.answer(request)))
+                       for index, request in enumerate(requests)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.respond(200, {"results": [body for _, body in answers]})
+
+        def answer(self, request: dict) -> tuple[int, dict]:
+            if not isinstance(request, dict):
+                return 400, {"error": "Each request must be a JSON object."}
+            try:
+                return 200, service.forecast(request.get("model"),
+                                             steps=int(request.get("steps", 1)),
+                                             alpha=float(request.get("alpha", 0.05)))
+            except KeyError as error:
+                return 404, {"error": error.args[0]}
+            except RuntimeError as error:
+                return 503, {"error": str(error)}
+            except (ValueError, TypeError) as error:
+                return 400, {"error": str(error)}
+            except Exception as error:
+                # An unexpected failure only fails its own request
+                logger.exception(f"Could not answer {request}")
+                return 500, {"error": str(error)}
+
+        def respond(self, status: int, body) -> None:
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            logger.debug(f"{self.address_string()} {format % args}")
+
+    return ForecastHandler
+
+def create_server(service: ForecastService, host: str = "127.0.0.1", port: int = 8000) -> ThreadingHTTPServer:
+    """
+    Creates the HTTP server of a forecast service, answering each connection in its own thread.
+
+    Parameters
+    ----------
+    service : ForecastService
+        The service answering the requests.
+    host : str, optional
+        Address the server listens on, by default "127.0.0.1".
+    port : int, optional
+        Port the server listens on, by default 8000. Use 0 to pick a free port.
+
+    Returns
+    -------
+    ThreadingHTTPServer
+        The server, not started yet.
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    return server
+
+def main(config: dict = None) -> None:
+    config = config or load_config(CONFIG_FILEPATH)
+    serve_config = config["serve"]
+    default_model = os.path.splitext(os.path.basename(config["model"]["path"]))[0]
+    registry_config = config["registry"]
+    # Models are read from the current release, resolved again by the watcher, so new releases
+    # are picked up
+    service = ForecastService(serve_config["model_dirs"],
+                              default_model=default_model,
+                              batch_window=serve_config["batch_window_ms"] / 1000,
+                              max_steps=serve_config["max_steps"],
+                              timeout=serve_config["timeout"],
+                              max_batch=serve_config["max_batch"],
+                              releases_dir=config["release"]["releases_dir"],
+                              registry=ModelRegistry(registry_config["dir"]),
+                              cache=ModelCache(registry_config["cache_mb"] * 2 ** 20,
+                                               registry_config["cache_entries"], loader=SARIMAXPredictor.load))
+    stop = threading.Event()
+    watcher = threading.Thread(target=service.watch, args=(serve_config["reload_interval"], stop), daemon=True)
+    watcher.start()
+    server = create_server(service, serve_config["host"], serve_config["port"])
+    logger.info(f"Serving {len(service.models)} models, loaded on first use, on http://{serve_config['host']}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+import hashlib
+import importlib.util
+import inspect
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable
+from loguru import logger
+
+from petroleumpriceprediction import instrument
+from petroleumpriceprediction.files import write_text
+
+class Stage:
+    """
+    A step of the pipeline with declared inputs, outputs, configuration and code.
+    """
+    def __init__(self, name: str, func: Callable[[], None], inputs: list[str] = None, outputs: list[str] = None,
+                 config: Callable[[], dict] = None, code: list[str] = None, volatile: str = None):
+        """
+        Initializes the stage.
+
+        Parameters
+        ----------
+        name : str
+            Unique name of the stage.
+        func : Callable[[], None]
+            Function that runs the stage, reading its inputs and writing its outputs.
+        inputs : list[str], optional
+            Files read by the stage. A stage producing one of them runs before this one.
+        outputs : list[str], optional
+            Files written by the stage.
+        config : Callable[[], dict], optional
+            Returns the configuration the stage depends on. It is called whenever the key of the stage
+            is computed, so changes written to the configuration by a stage are taken into account.
+        code : list[str], optional
+            Names of the modules the stage runs, whose source code is part of its key along with the
+            source of `func`. They are located without being imported.
+        volatile : str, optional
+            Extra value added to the key, e.g. the current date for stages fetching external data.
+        """
+        self.name = name
+        self.func = func
+        self.inputs = inputs or []
+        self.outputs = outputs or []
+        self.config = config or dict
+        self.code = code or []
+        self.volatile = volatile
+
+class StageCache:
+    """
+    Stores the key of the last successful run of each stage, and the hashes of the files seen.
+    """
+    def __init__(self, state_path: str):
+        """
+        Loads the stored state, if any.
+
+        Parameters
+        ----------
+        state_path : str
+            Path to the JSON file holding the state.
+        """
+        self.state_path = state_path
+        self.state = {"stages": {}, "files": {}}
+        if os.path.exists(state_path):
+            with open(state_path, "r") as file:
+                self.state = json.load(file)
+
+    def file_hash(self, filepath: str) -> str:
+        """
+        Returns the SHA-256 of a file, only reading it when its modification time or size changed.
+
+        Parameters
+        ----------
+        filepath : str
+            Path to the file.
+
+        Returns
+        -------
+        str
+            The hash of the file, or "missing" if it does not exist.
+        """
+        if not os.path.exists(filepath):
+            return "missing"
+        stat = os.stat(filepath)
+        known = self.state["files"].get(filepath)
+        if known and known["mtime_ns"] == stat.st_mtime_ns and known["size"] == stat.st_size:
+            return known["sha256"]
+        digest = hashlib.sha256()
+        with open(filepath, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                digest.update(chunk)
+        self.state["files"][filepath] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size,
+                                         "sha256": digest.hexdigest()}
+        return digest.hexdigest()
+
+    def key(self, stage: Stage) -> str:
+        """
+        Computes the content-addressed key of a stage.
+
+        Parameters
+        ----------
+        stage : Stage
+            The stage.
+
+        Returns
+        -------
+        str
+            SHA-256 of the hashes of its inputs, its configuration and its code.
+        """
+        digest = hashlib.sha256()
+        digest.update(stage.name.encode())
+        for filepath in sorted(stage.inputs):
+            digest.update(f"{filepath}={self.file_hash(filepath)}".encode())
+        digest.update(json.dumps(stage.config(), sort_keys=True, default=str).encode())
+        # Stages built with functools.partial are keyed by the source of the wrapped function
+        digest.update(inspect.getsource(getattr(stage.func, "func", stage.func)).encode())
+        for module in stage.code:
+            digest.update(f"{module}={self.file_hash(importlib.util.find_spec(module).origin)}".encode())
+        if stage.volatile is not None:
+            digest.update(stage.volatile.encode())
+        return digest.hexdigest()
+
+    def is_fresh(self, stage: Stage) -> bool:
+        """
+        Checks whether a stage can be skipped: its key did not change and its outputs exist.
+
+        Parameters
+        ----------
+        stage : Stage
+            The stage.
+
+        Returns
+        -------
+        bool
+            True if the stage can be skipped.
+        """
+        return (self.state["stages"].get(stage.name) == self.key(stage)
+                and all(os.path.exists(output) for output in stage.outputs))
+
+    def record(self, stage: Stage) -> None:
+        """
+        Records a successful run of a stage and saves the state.
+
+        Parameters
+        ----------
+        stage : Stage
+            The stage.
+        """
+        self.state["stages"][stage.name] = self.key(stage)
+        for output in stage.outputs:
+            self.file_hash(output)
+        self.save()
+
+    def save(self) -> None:
+        """
+        Saves the state atomically.
+        """
+        write_text(self.state_path, json.dumps(self.state, indent=2))
+
+def dependencies(stages: list[Stage]) -> dict[str, set[str]]:
+    """
+    Derives the dependencies of each stage from the files they read and write.
+
+    Parameters
+    ----------
+    stages : list[Stage]
+        The stages of the pipeline.
+
+    Returns
+    -------
+    dict[str, set[str]]
+        The names of the stages each stage depends on.
+
+    Raises
+    ------
+    ValueError
+        If two stages write the same file.
+    """
+    producers = {}
+    for stage in stages:
+        for output in stage.outputs:
+            if output in producers:
+                raise ValueError(f"{output} is written by both '{producers[output]}' and '{stage.name}'.")
+            producers[output] = stage.name
+    return {stage.name: {producers[filepath] for filepath in stage.inputs if filepath in producers}
+            for stage in stages}
+
+def _run_measured(stage: Stage) -> None:
+    """Runs a stage, measured by the instrumentation."""
+    with instrument.stage(stage.name):
+        stage.func()
+
+def run_stages(stages: list[Stage], state_path: str, max_workers: int = 4, force: bool = False) -> dict[str, str]:
+    """
+    Runs the stages of a pipeline, skipping the ones whose key did not change.
+
+    A stage starts as soon as the stages producing its inputs are finished, so independent stages
+    run concurrently in a thread pool.
+
+    Parameters
+    ----------
+    stages : list[Stage]
+        The stages of the pipeline.
+    state_path : str
+        Path to the JSON file holding the keys of the previous runs.
+    max_workers : int, optional
+        Maximum number of stages running at the same time, by default 4.
+    force : bool, optional
+        Whether to run every stage, even the fresh ones, by default False.
+
+    Returns
+    -------
+    dict[str, str]
+        The status of each stage: "skipped" or "ran".
+
+    Raises
+    ------
+    ValueError
+        If the dependencies of the stages have a cycle.
+    """
+    cache = StageCache(state_path)
+    by_name = {stage.name: stage for stage in stages}
+    pending = dependencies(stages)
+    status = {}
+    running = {}
+
+    def submit_ready(executor):
+        for name, deps in list(pending.items()):
+            if deps <= status.keys():
+                del pending[name]
+                stage = by_name[name]
+                # Keys are computed once the stages it depends on are finished
+                if not force and cache.is_fresh(stage):
+                    logger.info(f"Stage '{name}' is up to date, skipping it")
+                    status[name] = "skipped"
+                    return True
+                logger.info(f"Running stage '{name}'...")
+                running[executor.submit(_run_measured, stage)] = name
+        return False
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            # Skipped stages may unblock others right away
+            while submit_ready(executor):
+                pass
+            if not running:
+                if pending:
+                    raise ValueError(f"Stages {list(pending)} have cyclic dependencies.")
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                future.result()
+                cache.record(by_name[name])
+                status[name] = "ran"
+                logger.success(f"Stage '{name}' finished")
+    return status
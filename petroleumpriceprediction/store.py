@@ -0,0 +1,305 @@
+import numpy as np
+import pandas as pd
+
+# Windows of the rolling means computed when a store is built, in business days
+ROLLING_WINDOWS = (5, 21, 63, 252)
+
+class PriceStore:
+    """
+    Daily prices of one or many benchmarks on a shared business-day index.
+
+    Every business day between the first and the last price has a fixed position, computed from
+    its date with calendar arithmetic, so looking a date up never searches the data. Days without
+    a price (holidays, missing quotes) fall back to the nearest previous price.
+    """
+    def __init__(self, prices: dict[str, pd.Series], windows: tuple = ROLLING_WINDOWS):
+        """
+        Builds the store and precomputes its rolling and yearly aggregates.
+
+        Parameters
+        ----------
+        prices : dict[str, pd.Series]
+            Prices of each benchmark, by name, indexed by date.
+        windows : tuple, optional
+            Windows of the precomputed rolling means, in business days, by default `ROLLING_WINDOWS`.
+        """
+        self.names = list(prices)
+        first = min(series.index.min() for series in prices.values())
+        last = max(series.index.max() for series in prices.values())
+        self._start = np.busday_offset(np.datetime64(pd.Timestamp(first).date(), "D"), 0, roll="forward")
+        self.dates = pd.bdate_range(pd.Timestamp(self._start), last)
+
+        self.values = np.full((len(self.dates), len(self.names)), np.nan)
+        self.observed = np.zeros(self.values.shape, dtype=bool)
+        for column, series in enumerate(prices.values()):
+            series = series.dropna()
+            positions = self.positions(series.index)
+            self.values[positions, column] = series.to_numpy(dtype=float)
+            self.observed[positions, column] = True
+
+        # Position of the last observed price on or before each day, -1 before the first one
+        steps = np.arange(len(self.dates))[:, None]
+        self.last_observed = np.maximum.accumulate(np.where(self.observed, steps, -1), axis=0)
+        columns = np.arange(len(self.names))[None, :]
+        self.filled = np.where(self.last_observed >= 0, self.values[self.last_observed.clip(0), columns], np.nan)
+        # Positions of the observed prices of each benchmark, and count of them on or before each day
+        self.observed_positions = [np.flatnonzero(self.observed[:, column]) for column in range(len(self.names))]
+        self.observed_count = np.cumsum(self.observed, axis=0)
+
+        filled = pd.DataFrame(self.filled, index=self.dates, columns=self.names)
+        self.rolling = {window: filled.rolling(window, min_periods=1).mean() for window in windows}
+        self.yearly = self._yearly()
+
+    @classmethod
+    def from_frames(cls, frames: dict[str, pd.DataFrame], value_columns: dict[str, str] = None,
+                    windows: tuple = ROLLING_WINDOWS) -> 'PriceStore':
+        """
+        Builds a store from DataFrames with a "date" column, as returned by `data.load`.
+
+        Parameters
+        ----------
+        frames : dict[str, pd.DataFrame]
+            DataFrame of each benchmark, by name.
+        value_columns : dict[str, str], optional
+            Price column of each benchmark, by default "price".
+        windows : tuple, optional
+            Windows of the precomputed rolling means, by default `ROLLING_WINDOWS`.
+
+        Returns
+        -------
+        PriceStore
+            The store.
+        """
+        value_columns = value_columns or {}
+        prices = {name: frame.set_index("date")[value_columns.get(name, "price")] for name, frame in frames.items()}
+        return cls(prices, windows)
+
+    def positions(self, dates) -> np.ndarray:
+        """
+        Computes the positions of dates on the business-day index, in constant time per date.
+
+        Dates falling on a weekend take the position of the previous business day.
+
+        Parameters
+        ----------
+        dates : array-like
+            The dates.
+
+        Returns
+        -------
+        np.ndarray
+            The positions, negative for dates before the first day of the store.
+        """
+        days = np.asarray(pd.DatetimeIndex(dates).values.astype("datetime64[D]"))
+        return np.busday_count(self._start, np.busday_offset(days, 0, roll="backward"))
+
+    def position(self, date) -> int:
+        """
+        Computes the position of a date on the business-day index, as in `positions`.
+
+        Parameters
+        ----------
+        date : datetime-like
+            The date.
+
+        Returns
+        -------
+        int
+            The position, clipped to the last day of the store.
+
+        Raises
+        ------
+        KeyError
+            If the date is before the first day of the store.
+        """
+        day = np.datetime64(pd.Timestamp(date).date(), "D")
+        position = int(np.busday_count(self._start, np.busday_offset(day, 0, roll="backward")))
+        if position < 0:
+            raise KeyError(f"{date} is before the first day of the store ({self.dates[0].date()}).")
+        return min(position, len(self.dates) - 1)
+
+    def lookup(self, name: str, date) -> tuple[pd.Timestamp, float]:
+        """
+        Returns the price of a benchmark on a date, or the nearest previous one.
+
+        Parameters
+        ----------
+        name : str
+            Name of the benchmark.
+        date : datetime-like
+            The date.
+
+        Returns
+        -------
+        tuple[pd.Timestamp, float]
+            The date and the value of the price, or `None` if there is no price on or before the date.
+        """
+        column = self.names.index(name)
+        try:
+            observed = self.last_observed[self.position(date), column]
+        except KeyError:
+            return None
+        if observed < 0:
+            return None
+        return self.dates[observed], float(self.values[observed, column])
+
+    def last(self, name: str) -> tuple[pd.Timestamp, float]:
+        """
+        Returns the last price of a benchmark.
+
+        Parameters
+        ----------
+        name : str
+            Name of the benchmark.
+
+        Returns
+        -------
+        tuple[pd.Timestamp, float]
+            The date and the value of the last price.
+        """
+        return self.lookup(name, self.dates[-1])
+
+    def ago(self, name: str, days: int = 0, years: int = 0, business_days: int = 0,
+            date=None) -> tuple[pd.Timestamp, float]:
+        """
+        Returns the price of a benchmark some time before a date, or the nearest previous one.
+
+        Parameters
+        ----------
+        name : str
+            Name of the benchmark.
+        days : int, optional
+            Calendar days before the date, by default 0.
+        years : int, optional
+            Years before the date, by default 0.
+        business_days : int, optional
+            Observed prices before the date, e.g. 1 for the previous price, by default 0.
+        date : datetime-like, optional
+            Reference date, by default the date of the last price of the benchmark.
+
+        Returns
+        -------
+        tuple[pd.Timestamp, float]
+            The date and the value of the price, or `None` if there is no price on or before it.
+        """
+        reference = self.lookup(name, date if date is not None else self.dates[-1])
+        if reference is None:
+            return None
+        target = reference[0] - pd.DateOffset(years=years) - pd.Timedelta(days=days)
+        if business_days:
+            column = self.names.index(name)
+            rank = self.observed_count[self.position(reference[0]), column] - 1 - business_days
+            if rank < 0:
+                return None
+            target = self.dates[self.observed_positions[column][rank]]
+        return self.lookup(name, target)
+
+    def series(self, name: str, start=None, end=None) -> pd.DataFrame:
+        """
+        Returns the observed prices of a benchmark between two dates.
+
+        Parameters
+        ----------
+        name : str
+            Name of the benchmark.
+        start : datetime-like, optional
+            First date, by default the first day of the store.
+        end : datetime-like, optional
+            Last date, by default the last day of the store.
+
+        Returns
+        -------
+        pd.DataFrame
+            A DataFrame with the "date" and "price" columns.
+        """
+        column = self.names.index(name)
+        window = self._window(start, end)
+        mask = self.observed[window, column]
+        return pd.DataFrame({"date": self.dates[window][mask], "price": self.values[window, column][mask]})
+
+    def downsample(self, name: str, n_points: int, start=None, end=None) -> pd.DataFrame:
+        """
+        Returns at most `n_points` observed prices of a benchmark that keep the shape of its chart.
+
+        Parameters
+        ----------
+        name : str
+            Name of the benchmark.
+        n_points : int
+            Maximum number of prices.
+        start : datetime-like, optional
+            First date, by default the first day of the store.
+        end : datetime-like, optional
+            Last date, by default the last day of the store.
+
+        Returns
+        -------
+        pd.DataFrame
+            A DataFrame with the "date" and "price" columns, selected with `lttb`.
+        """
+        prices = self.series(name, start, end)
+        selected = lttb(prices["date"].to_numpy().astype("datetime64[D]").astype(float),
+                        prices["price"].to_numpy(), n_points)
+        return prices.iloc[selected].reset_index(drop=True)
+
+    def _window(self, start=None, end=None) -> slice:
+        """Returns the slice of positions between two dates."""
+        first = 0 if start is None else max(int(self.positions([start])[0]), 0)
+        if start is not None and self.dates[min(first, len(self.dates) - 1)] < pd.Timestamp(start):
+            first += 1
+        last = len(self.dates) if end is None else int(self.positions([end])[0]) + 1
+        return slice(first, max(last, first))
+
+    def _yearly(self) -> pd.DataFrame:
+        """Computes the first, last, mean, minimum and maximum price of each benchmark and year."""
+        rows, columns = np.nonzero(self.observed)
+        prices = pd.DataFrame({"name": np.asarray(self.names)[columns],
+                               "year": self.dates.year[rows],
+                               "price": self.values[rows, columns]})
+        yearly = prices.groupby(["name", "year"])["price"].agg(["first", "last", "mean", "min", "max"])
+        yearly["change_pct"] = (yearly["last"] / yearly["first"] - 1) * 100
+        return yearly
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Selects the points of a line chart with the Largest-Triangle-Three-Buckets algorithm.
+
+    The first and the last points are kept, and the other points are split into `n_out - 2`
+    buckets. From each bucket, the point forming the largest triangle with the point selected in
+    the previous bucket and the average of the next bucket is kept, which preserves the peaks and
+    troughs of the line. Fewer than 3 points have no bucket: the first and the last points are
+    kept, or the first one alone.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        The sorted abscissas of the points.
+    y : np.ndarray
+        The ordinates of the points.
+    n_out : int
+        Number of points to keep.
+
+    Returns
+    -------
+    np.ndarray
+        The sorted positions of the selected points.
+    """
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1][:max(n_out, 0)], dtype=int)
+    edges = (np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype(int) + 1
+    edges[-1] = n - 1
+    selected = np.empty(n_out, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        following = slice(end, edges[bucket + 2]) if bucket + 2 < len(edges) else slice(n - 1, n)
+        average_x, average_y = x[following].mean(), y[following].mean()
+        area = np.abs((x[previous] - average_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (average_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected
@@ -1,46 +1,153 @@
-import json
+import os
+import xml.etree.ElementTree as ET
+from itertools import chain
 import polars as pl
-import pandas as pd
-import pendulum
 from loguru import logger
 
-def organize_data(raw_filepath: str, save_filepath: str) -> None:
+from scripts import raw_store
+
+BRENT_SERIES = "Europe Brent Spot Price FOB (Dollars per Barrel)"
+
+OPEC_SERIES = "OPEC Basket Price"
+
+# Tag of the daily registers of the OPEC basket XML file
+OPEC_TAG = "{http://tempuri.org/basketDayArchives.xsd}BasketList"
+
+# Only the fields of each EIA register that are needed to build the dataset
+RAW_SCHEMA = {"series-description": pl.String, "period": pl.String, "value": pl.String}
+
+
+def extract_series(responses: list[dict], series: str | None = BRENT_SERIES) -> pl.DataFrame:
+    """
+    Extracts a series from a list of EIA API responses into a DataFrame.
+
+    Every register of every response is read in one pass into a columnar frame, so the
+    filtering and the parsing of `period` and `value` are done in bulk by polars.
+
+    Parameters
+    ----------
+    responses : list[dict]
+        EIA API responses, as stored in the raw data JSON file.
+    series : str | None, optional
+        The `series-description` to keep, by default the Europe Brent spot price. If `None`, every
+        series is kept in long format, keyed by the "id" column.
+
+    Returns
+    -------
+    pl.DataFrame
+        A DataFrame with the columns "id", "date" and "price", in the order of the registers.
+    """
+    registers = chain.from_iterable(response["response"]["data"] for response in responses)
+    raw = pl.DataFrame(registers, schema=RAW_SCHEMA).lazy()
+    if series is not None:
+        raw = raw.filter(pl.col("series-description") == series)
+    return (
+        raw
+        .select(
+            pl.col("series-description").alias("id"),
+            pl.col("period").str.to_date("%Y-%m-%d").alias("date"),
+            pl.col("value").cast(pl.Float64).alias("price"),
+        )
+        .collect()
+    )
+
+
+def organize_data(raw_dir: str, save_filepath: str, series: str | None = BRENT_SERIES) -> None:
     """
     Processes raw data and saves it as a CSV file.
 
-    This function loads a JSON file containing raw petroleum price data, filters for the specific petroleum
-    type "Europe Brent Spot Price FOB (Dollars per Barrel)", and organizes it into a DataFrame. The processed 
-    data is then saved to a CSV file.
+    This function lazily scans the raw data store for the specific petroleum type (by default "Europe
+    Brent Spot Price FOB (Dollars per Barrel)"): only the partitions of that series, and only the columns
+    of the dataset, are read. The rows are streamed to the CSV file sorted by series and, like the
+    registers returned by the EIA API, newest date first, so memory use does not grow with the size of
+    the store.
 
     Parameters
     ----------
-    raw_filepath : str
-        The file path to the raw data JSON file.
+    raw_dir : str
+        The directory of the raw data store, as written by `scripts.raw_data.generate`.
     save_filepath : str
         The file path where the organized data will be saved as a CSV.
+    series : str | None, optional
+        The `series-description` to keep, by default the Europe Brent spot price. If `None`, every
+        series is saved in long format.
 
     Returns
     -------
     None
     """
-    dataframe = pl.DataFrame(schema={"id": pl.String, "date": pl.Date, "price": pl.Float64})
-
-    # Open and read the JSON file
-    with open(raw_filepath, 'r') as file:
-        data = json.load(file)
-    
-    # Process each year at a time
-    for response in data:
-        daily_registers = response["response"]["data"]
-        for register in daily_registers:
-            # Gets the specific kind of petroleum we want to study
-            if register["series-description"] == "Europe Brent Spot Price FOB (Dollars per Barrel)":
-                new_row = pl.DataFrame({
-                    "id": [register["series-description"]],
-                    "date": [pendulum.parse(register["period"]).date()],
-                    "price": [float(register["value"])]
-                })
-                dataframe = pl.concat([dataframe, new_row], how="vertical")
-    
-    dataframe.write_csv(save_filepath)
+    raw = raw_store.scan(raw_dir, series=series, columns=["series-description", "period", "value"])
+    raw.select(
+        pl.col("series-description").alias("id"),
+        pl.col("period").alias("date"),
+        pl.col("value").alias("price"),
+    ).sort(["id", "date"], descending=[False, True]).sink_csv(save_filepath)
     logger.success("Successfully organized data and saved it!")
+
+
+def append_data(responses: list[dict], save_filepath: str, raw_dir: str) -> None:
+    """
+    Processes new raw data and appends it to an existing CSV file.
+
+    Only the registers of the given responses are processed, so an incremental refresh of the raw data
+    does not require the whole raw data file to be organized again. If the CSV file does not exist yet,
+    it is organized from the whole raw data store instead, which already holds the new registers.
+
+    Parameters
+    ----------
+    responses : list[dict]
+        The new EIA API responses, as returned by `scripts.raw_data.update`.
+    save_filepath : str
+        The file path of the organized data CSV.
+    raw_dir : str
+        The directory of the raw data store the responses were stored in.
+
+    Returns
+    -------
+    None
+    """
+    if not os.path.exists(save_filepath):
+        organize_data(raw_dir, save_filepath)
+        return
+    dataframe = extract_series(responses)
+    with open(save_filepath, 'a') as file:
+        dataframe.write_csv(file, include_header=False)
+    logger.success(f"Successfully appended {dataframe.height} rows to the organized data!")
+
+
+def organize_opec(xml_filepath: str, save_filepath: str) -> None:
+    """
+    Processes the OPEC basket price XML file and saves it as a CSV file.
+
+    The XML file is streamed with `iterparse`, clearing each register once it is read, so memory use
+    does not grow with the size of the file. Dates and prices are parsed in bulk by polars.
+
+    Parameters
+    ----------
+    xml_filepath : str
+        The file path to the OPEC basket daily archives XML file.
+    save_filepath : str
+        The file path where the organized data will be saved as a CSV.
+
+    Returns
+    -------
+    None
+    """
+    dates = []
+    values = []
+    context = ET.iterparse(xml_filepath, events=("start", "end"))
+    _, root = next(context)
+    for event, element in context:
+        if event == "end" and element.tag == OPEC_TAG:
+            dates.append(element.get("data"))
+            values.append(element.get("val"))
+            # Registers already read are dropped from the tree
+            root.clear()
+
+    dataframe = pl.DataFrame({"date": dates, "opec_price": values}).select(
+        pl.lit(OPEC_SERIES).alias("id"),
+        pl.col("date").str.to_date("%Y-%m-%d"),
+        pl.col("opec_price").cast(pl.Float64),
+    )
+    dataframe.write_csv(save_filepath)
+    logger.success("Successfully organized OPEC data and saved it!")
@@ -1,41 +1,219 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from loguru import logger
 from dotenv import load_dotenv
 import os
 import pendulum
-import json
 
-# API key is accessed using environment variables
-load_dotenv()
+from scripts import raw_store
 
-def generate(number_years: int, file_path: str) -> None:
+EIA_URL = "https://api.eia.gov/v2/petroleum/pri/spt/data/"
+
+# Maximum number of rows the EIA API returns in a single page
+PAGE_LENGTH = 5000
+
+def generate(number_years: int, store_dir: str, max_workers: int = 8, base_url: str = EIA_URL) -> None:
     """
-    Generates a raw data JSON file by fetching data from the U.S. Energy Information Administration (EIA) API.
+    Generates the raw data store by fetching data from the U.S. Energy Information Administration (EIA) API.
 
-    This function fetches petroleum data for a specified number of years and saves it as a JSON file.
+    This function fetches petroleum data for a specified number of years and stores it in one Parquet
+    partition per series and year. The years are fetched concurrently by `fetch`.
 
     Parameters
     ----------
     number_years : int
         The number of years of data to fetch.
-    file_path : str
-        The file path where the raw data will be saved.
+    store_dir : str
+        The directory of the raw data store, see `scripts.raw_store`.
+    max_workers : int, optional
+        Maximum number of concurrent requests, by default 8.
+    base_url : str, optional
+        The URL of the EIA spot prices endpoint, by default the public API.
 
     Returns
     -------
     None
+
+    Raises
+    ------
+    RuntimeError
+        If any of the years could not be completely fetched. The other years are stored.
     """
-    data = []
     years = gap_years(number_years)
-    for year in years:
-        json_data = ipeadata(date_start=f"{year}-01-01",
-                             date_end=f"{year}-12-31")
-        data.append(json_data)
-    with open(file_path, "w") as file:
-        json.dump(data, file)
-        logger.success("Successfully created raw data file!")
+    responses = fetch([(f"{year}-01-01", f"{year}-12-31") for year in years], max_workers, base_url)
+
+    missing = []
+    for year, json_data in zip(years, responses):
+        if json_data is None:
+            logger.error(f"Skipping year {year}: not all of its pages could be fetched.")
+            missing.append(year)
+            continue
+        raw_store.write_responses([json_data], store_dir)
+    if missing:
+        raise RuntimeError(f"Could not fetch the raw data of the years {missing}.")
+    logger.success("Successfully created raw data store!")
+
+def update(store_dir: str, max_workers: int = 8, base_url: str = EIA_URL) -> list[dict]:
+    """
+    Incrementally refreshes the raw data store with the days after the newest period of each series.
+
+    The manifest of the store keeps the newest `period` of each series, and the oldest of them is used
+    as high-water mark, so a series that lags behind the others is caught up too: only the range from
+    it to today is fetched, registers whose (series, period) are already stored are dropped, and the
+    remaining ones are merged into the partitions of their series and year.
+
+    Parameters
+    ----------
+    store_dir : str
+        The directory of the raw data store created by `generate`.
+    max_workers : int, optional
+        Maximum number of concurrent requests, by default 8.
+    base_url : str, optional
+        The URL of the EIA spot prices endpoint, by default the public API.
+
+    Returns
+    -------
+    list[dict]
+        The API responses stored, holding only the new registers.
+
+    Raises
+    ------
+    RuntimeError
+        If the raw data store is empty or the new raw data could not be fetched.
+    """
+    high_water_mark = raw_store.high_water_mark(store_dir)
+    if high_water_mark is None:
+        raise RuntimeError(f"Raw data store {store_dir} is empty: create it before updating it.")
+    # Only the partitions holding the high-water mark are read
+    stored = raw_store.scan(store_dir, since=high_water_mark, columns=["series", "period"]).collect()
+    stored_keys = set(zip(stored["series"], stored["period"].dt.to_string("%Y-%m-%d")))
+    del stored
+
+    date_end = pendulum.today().format("YYYY-MM-DD")
+    logger.info(f"Fetching raw data from {high_water_mark} to {date_end}")
+    json_data = fetch([(high_water_mark, date_end)], max_workers, base_url)[0]
+    if json_data is None:
+        raise RuntimeError(f"Could not fetch the raw data from {high_water_mark} to {date_end}.")
+
+    new_registers = []
+    for register in json_data["response"]["data"]:
+        key = (register["series"], register["period"])
+        if register["period"] >= high_water_mark and key not in stored_keys:
+            stored_keys.add(key)
+            new_registers.append(register)
+    if not new_registers:
+        logger.info("Raw data is already up to date.")
+        return []
+
+    json_data["response"]["data"] = new_registers
+    json_data["response"]["total"] = str(len(new_registers))
+    raw_store.write_responses([json_data], store_dir)
+    logger.success(f"Stored {len(new_registers)} new registers in the raw data store!")
+    return [json_data]
+
+def fetch(ranges: list[tuple[str, str]], max_workers: int = 8, base_url: str = EIA_URL) -> list[dict]:
+    """
+    Fetches every page of several date ranges concurrently.
+
+    The first page of every range is requested concurrently over a pooled session, and the remaining
+    pages of a range are requested as soon as its first page reports the total number of rows.
+
+    Parameters
+    ----------
+    ranges : list[tuple[str, str]]
+        The (start, end) dates of each range (format: YYYY-MM-DD).
+    max_workers : int, optional
+        Maximum number of concurrent requests, by default 8.
+    base_url : str, optional
+        The URL of the EIA spot prices endpoint, by default the public API.
+
+    Returns
+    -------
+    list[dict]
+        One response per range, in the order of `ranges`, holding the registers of all of its pages,
+        or `None` for the ranges that could not be completely fetched.
+    """
+    pages = [{} for _ in ranges]
+    with create_session(max_workers) as session, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(ipeadata, date_start, date_end, 0, PAGE_LENGTH, session, base_url): (index, 0)
+            for index, (date_start, date_end) in enumerate(ranges)
+        }
+        while futures:
+            future = next(as_completed(futures))
+            index, offset = futures.pop(future)
+            json_data = future.result()
+            pages[index][offset] = json_data
+            if offset == 0 and json_data is not None:
+                date_start, date_end = ranges[index]
+                total = int(json_data["response"]["total"])
+                for next_offset in range(PAGE_LENGTH, total, PAGE_LENGTH):
+                    future = executor.submit(ipeadata, date_start, date_end,
+                                             next_offset, PAGE_LENGTH, session, base_url)
+                    futures[future] = (index, next_offset)
+    return [merge_pages(range_pages) for range_pages in pages]
 
-def ipeadata(date_start: str, date_end: str) -> dict:
+def create_session(max_workers: int, retries: int = 5, backoff_factor: float = 0.5) -> requests.Session:
+    """
+    Creates a session with a connection pool and retries for the EIA API.
+
+    Failed connections and the status codes 429 and 5xx are retried with exponential backoff,
+    honouring the `Retry-After` header sent when the API rate limits the calls.
+
+    Parameters
+    ----------
+    max_workers : int
+        Number of connections kept in the pool, which should match the number of concurrent requests.
+    retries : int, optional
+        Maximum number of retries per request, by default 5.
+    backoff_factor : float, optional
+        Backoff factor between retries, in seconds, by default 0.5.
+
+    Returns
+    -------
+    requests.Session
+        The configured session.
+    """
+    retry = Retry(total=retries,
+                  backoff_factor=backoff_factor,
+                  status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=("GET",),
+                  respect_retry_after_header=True,
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def merge_pages(pages: dict[int, dict]) -> dict:
+    """
+    Merges the pages fetched for a year into a single API response.
+
+    Parameters
+    ----------
+    pages : dict[int, dict]
+        The responses of a year, indexed by their offset.
+
+    Returns
+    -------
+    dict
+        The first page with the registers of every page appended in offset order, or `None` if any
+        of the pages is missing.
+    """
+    if any(page is None for page in pages.values()):
+        return None
+    offsets = sorted(pages)
+    json_data = pages[offsets[0]]
+    for offset in offsets[1:]:
+        json_data["response"]["data"].extend(pages[offset]["response"]["data"])
+    return json_data
+
+def ipeadata(date_start: str, date_end: str, offset: int = 0, length: int = PAGE_LENGTH,
+             session: requests.Session = None, base_url: str = EIA_URL) -> dict:
     """
     Makes an API call to the U.S. Energy Information Administration (EIA) to fetch petroleum data.
 
@@ -47,35 +225,75 @@ def ipeadata(date_start: str, date_end: str) -> dict:
         The start date for fetching data (format: YYYY-MM-DD).
     date_end : str
         The end date for fetching data (format: YYYY-MM-DD).
+    offset : int, optional
+        Index of the first row of the page, by default 0.
+    length : int, optional
+        Number of rows of the page, by default `PAGE_LENGTH`.
+    session : requests.Session, optional
+        Session used to make the call, by default a new session is created.
+    base_url : str, optional
+        The URL of the EIA spot prices endpoint, by default the public API.
 
     Returns
     -------
     dict
-        The response JSON from the API call if successful, otherwise `None`.
-    """
-    api_key = os.getenv('API_KEY')
-    url = (
-        f"https://api.eia.gov/v2/petroleum/pri/spt/data/"
-        f"?api_key={api_key}&frequency=daily&data[0]=value&start={date_start}"
-        f"&end={date_end}&sort[0][column]=period&sort[0][direction]=desc&offset=0&length=5000"
-    )
-    response = requests.get(url)
-    if response.status_code == 200:
-        return response.json()
-    
-    logger.error("API's response was not ok: please check the parameters passed.")
-    return None
+        The response JSON from the API call if successful and holding the "total" and "data" of
+        its "response", otherwise `None`.
+    """
+    api_key = get_api_key()
+    params = {
+        "api_key": api_key,
+        "frequency": "daily",
+        "data[0]": "value",
+        "start": date_start,
+        "end": date_end,
+        "sort[0][column]": "period",
+        "sort[0][direction]": "desc",
+        "offset": offset,
+        "length": length,
+    }
+    session = session or create_session(max_workers=1)
+    try:
+        response = session.get(base_url, params=params, timeout=60)
+    except requests.RequestException as error:
+        logger.error(f"API call failed for {date_start} to {date_end} (offset {offset}): {error}")
+        return None
+    if response.status_code != 200:
+        logger.error("API's response was not ok: please check the parameters passed.")
+        return None
+    try:
+        json_data = response.json()
+        # `fetch` reads the number of pages from the total, and `merge_pages` extends the registers
+        int(json_data["response"]["total"])
+        if not isinstance(json_data["response"]["data"], list):
+            raise TypeError("'data' is not a list of registers")
+    except (ValueError, KeyError, TypeError) as error:
+        logger.error(f"API's response for {date_start} to {date_end} (offset {offset}) is malformed: {error!r}")
+        return None
+    return json_data
 
+@lru_cache(maxsize=1)
+def get_api_key() -> str:
+    """
+    Reads the EIA API key from the environment, loading the `.env` file on the first call.
+
+    Returns
+    -------
+    str
+        The API key, or `None` if it is not set.
+    """
+    load_dotenv()
+    return os.getenv('API_KEY')
 
 def gap_years(x: int) -> list[str]:
     """
     Generates a list of the last x years as strings.
-    
+
     Parameters
     ----------
     x : int
         Number of years to include in the list, counting backwards from the current year.
-    
+
     Returns
     -------
     list[str]
@@ -86,4 +304,4 @@ def gap_years(x: int) -> list[str]:
     for i in range(1, x + 1):
         sub_year = date_now.subtract(years=i)
         dates.append(sub_year.format("YYYY"))
-    return dates
\ No newline at end of file
+    return dates
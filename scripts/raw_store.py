@@ -0,0 +1,314 @@
+import json
+import os
+import re
+from itertools import chain
+import polars as pl
+from loguru import logger
+
+from petroleumpriceprediction.files import write_atomic
+
+# Name of the file listing the partitions of a store
+MANIFEST = "manifest.json"
+
+STORE_VERSION = 1
+
+# Fields of each EIA register, as returned by the API
+REGISTER_SCHEMA = {
+    "period": pl.String,
+    "duoarea": pl.String,
+    "area-name": pl.String,
+    "product": pl.String,
+    "product-name": pl.String,
+    "process": pl.String,
+    "process-name": pl.String,
+    "series": pl.String,
+    "series-description": pl.String,
+    "value": pl.String,
+    "units": pl.String,
+}
+
+# Types of the columns of the partitions: dates and prices are parsed once, when they are stored
+PARTITION_SCHEMA = dict(REGISTER_SCHEMA, period=pl.Date, value=pl.Float64)
+
+
+def manifest_path(store_dir: str) -> str:
+    """
+    Returns the path of the manifest of a raw data store.
+
+    Parameters
+    ----------
+    store_dir : str
+        Directory of the store.
+
+    Returns
+    -------
+    str
+        Path to the manifest, which changes whenever a partition of the store does.
+    """
+    return os.path.join(store_dir, MANIFEST)
+
+
+def read_manifest(store_dir: str) -> dict:
+    """
+    Reads the manifest of a raw data store.
+
+    Parameters
+    ----------
+    store_dir : str
+        Directory of the store.
+
+    Returns
+    -------
+    dict
+        The manifest, with the "partitions" of the store by relative path. Each partition has its
+        "series", "description", "year", number of "rows" and "first_period" and "last_period".
+        The newest period of each series is listed in "high_water_marks", by series.
+        An empty manifest is returned if the store does not exist.
+    """
+    filepath = manifest_path(store_dir)
+    if not os.path.exists(filepath):
+        return {"version": STORE_VERSION, "partitions": {}, "high_water_marks": {}}
+    with open(filepath, "r") as file:
+        manifest = json.load(file)
+    # Manifests written by older versions only list the partitions
+    if "high_water_marks" not in manifest:
+        manifest["high_water_marks"] = _series_marks(manifest["partitions"])
+    return manifest
+
+
+def write_responses(responses: list[dict], store_dir: str) -> int:
+    """
+    Stores the registers of EIA API responses in the partitions of a raw data store.
+
+    Registers are split into one Parquet file per series and year. Partitions that already exist are
+    merged with the new registers, keeping the newest value of each period, and every file is
+    replaced atomically, manifest last, so readers never see a partial write.
+
+    Parameters
+    ----------
+    responses : list[dict]
+        EIA API responses, as returned by `scripts.raw_data.fetch`.
+    store_dir : str
+        Directory of the store, created if needed.
+
+    Returns
+    -------
+    int
+        Number of registers stored.
+    """
+    registers = chain.from_iterable(response["response"]["data"] for response in responses)
+    frame = pl.DataFrame(registers, schema=REGISTER_SCHEMA).with_columns(
+        pl.col("period").str.to_date("%Y-%m-%d"),
+        pl.col("value").cast(pl.Float64, strict=False),
+    )
+    if frame.is_empty():
+        return 0
+
+    manifest = read_manifest(store_dir)
+    frame = frame.with_columns(pl.col("period").dt.year().alias("year"))
+    for (series, year), partition in frame.partition_by(["series", "year"], as_dict=True).items():
+        relative = partition_path(series, year)
+        filepath = os.path.join(store_dir, relative)
+        partition = partition.drop("year")
+        if relative in manifest["partitions"]:
+            partition = pl.concat([pl.read_parquet(filepath), partition])
+        partition = partition.unique(subset="period", keep="last").sort("period")
+        write_atomic(filepath, lambda path: partition.write_parquet(path, statistics=True))
+        manifest["partitions"][relative] = {
+            "series": series,
+            "description": partition["series-description"][-1],
+            "year": year,
+            "rows": partition.height,
+            "first_period": partition["period"].min().isoformat(),
+            "last_period": partition["period"].max().isoformat(),
+        }
+    manifest["high_water_marks"] = _series_marks(manifest["partitions"])
+    write_manifest(store_dir, manifest)
+    return frame.height
+
+
+def write_manifest(store_dir: str, manifest: dict) -> None:
+    """
+    Writes the manifest of a raw data store atomically.
+
+    Parameters
+    ----------
+    store_dir : str
+        Directory of the store.
+    manifest : dict
+        The manifest, as returned by `read_manifest`.
+    """
+    manifest = dict(manifest, partitions=dict(sorted(manifest["partitions"].items())),
+                    high_water_marks=dict(sorted(manifest.get("high_water_marks", {}).items())))
+
+    def dump(path):
+        with open(path, "w") as file:
+            json.dump(manifest, file, indent=1)
+
+    write_atomic(manifest_path(store_dir), dump)
+
+
+def partitions(store_dir: str, series: str | list[str] | None = None, years: list[int] | None = None,
+               since: str | None = None) -> list[str]:
+    """
+    Lists the partitions of a raw data store holding the requested registers, from the manifest alone.
+
+    Parameters
+    ----------
+    store_dir : str
+        Directory of the store.
+    series : str | list[str] | None, optional
+        The `series-description` of the series to keep, by default every series.
+    years : list[int] | None, optional
+        The years to keep, by default every year.
+    since : str | None, optional
+        Only the partitions with periods on or after this date (format: YYYY-MM-DD) are kept, by
+        default every partition.
+
+    Returns
+    -------
+    list[str]
+        Paths to the partitions, sorted by series and year.
+    """
+    descriptions = {series} if isinstance(series, str) else set(series or [])
+    selected = []
+    for relative, partition in read_manifest(store_dir)["partitions"].items():
+        if descriptions and partition["description"] not in descriptions:
+            continue
+        if years is not None and partition["year"] not in years:
+            continue
+        if since is not None and partition["last_period"] < since:
+            continue
+        selected.append(os.path.join(store_dir, relative))
+    return selected
+
+
+def scan(store_dir: str, series: str | list[str] | None = None, years: list[int] | None = None,
+         since: str | None = None, columns: list[str] | None = None) -> pl.LazyFrame:
+    """
+    Lazily scans the registers of a raw data store.
+
+    Only the partitions selected by `partitions` are opened, and only the requested columns of
+    them are read. The filters on the series and the periods are also pushed down to the Parquet
+    row groups, so the memory used does not grow with the number of years or series stored.
+
+    Parameters
+    ----------
+    store_dir : str
+        Directory of the store.
+    series : str | list[str] | None, optional
+        The `series-description` of the series to keep, by default every series.
+    years : list[int] | None, optional
+        The years to keep, by default every year.
+    since : str | None, optional
+        Only the registers on or after this date (format: YYYY-MM-DD) are kept, by default all of them.
+    columns : list[str] | None, optional
+        The columns to read, by default every column of `PARTITION_SCHEMA`.
+
+    Returns
+    -------
+    pl.LazyFrame
+        The registers, sorted by series and period.
+    """
+    columns = columns or list(PARTITION_SCHEMA)
+    filepaths = partitions(store_dir, series, years, since)
+    if not filepaths:
+        return pl.LazyFrame(schema={column: PARTITION_SCHEMA[column] for column in columns})
+    raw = pl.scan_parquet(filepaths)
+    if isinstance(series, str):
+        raw = raw.filter(pl.col("series-description") == series)
+    elif series:
+        raw = raw.filter(pl.col("series-description").is_in(list(series)))
+    if since is not None:
+        raw = raw.filter(pl.col("period") >= pl.lit(since).str.to_date("%Y-%m-%d"))
+    return raw.select(columns)
+
+
+def high_water_marks(store_dir: str) -> dict[str, str]:
+    """
+    Returns the newest period stored of each series of a raw data store, from the manifest alone.
+
+    Parameters
+    ----------
+    store_dir : str
+        Directory of the store.
+
+    Returns
+    -------
+    dict[str, str]
+        The newest period (format: YYYY-MM-DD), by `series` code. Empty if the store is empty.
+    """
+    return read_manifest(store_dir)["high_water_marks"]
+
+
+def high_water_mark(store_dir: str) -> str | None:
+    """
+    Returns the period from which every series of a raw data store needs new registers.
+
+    It is the oldest of the newest periods of the series, as given by `high_water_marks`, so a
+    series that lags behind the others is caught up too.
+
+    Parameters
+    ----------
+    store_dir : str
+        Directory of the store.
+
+    Returns
+    -------
+    str | None
+        The oldest high-water mark of the series (format: YYYY-MM-DD), or `None` if the store is empty.
+    """
+    return min(high_water_marks(store_dir).values(), default=None)
+
+
+def migrate(json_filepath: str, store_dir: str) -> int:
+    """
+    Moves the registers of a raw data JSON file, as written by older versions, into a raw data store.
+
+    The JSON file is left untouched, and can be deleted once the store is checked.
+
+    Parameters
+    ----------
+    json_filepath : str
+        Path to the raw data JSON file.
+    store_dir : str
+        Directory of the store.
+
+    Returns
+    -------
+    int
+        Number of registers stored.
+    """
+    with open(json_filepath, "r") as file:
+        responses = json.load(file)
+    count = write_responses(responses, store_dir)
+    logger.success(f"Migrated {count} registers from {json_filepath} to {store_dir}")
+    return count
+
+
+def partition_path(series: str, year: int) -> str:
+    """
+    Returns the path of the partition of a series and year, relative to the store.
+
+    Parameters
+    ----------
+    series : str
+        The `series` code of the registers, e.g. "RBRTE".
+    year : int
+        The year of the registers.
+
+    Returns
+    -------
+    str
+        The relative path, as in "series=RBRTE/year=2024.parquet".
+    """
+    return f"series={re.sub(r'[^A-Za-z0-9_.-]', '_', series)}/year={year}.parquet"
+
+
+def _series_marks(partitions: dict) -> dict[str, str]:
+    """Returns the newest period of each series, from the partitions of a manifest."""
+    marks = {}
+    for partition in partitions.values():
+        series = partition["series"]
+        marks[series] = max(marks.get(series, partition["last_period"]), partition["last_period"])
+    return marks
@@ -1,4 +1,6 @@
-from setuptools import setup, find_packages
-
-setup(name="petroleumpriceprediction",
-    version="0.1")
\ No newline at end of file
+from setuptools import setup, find_packages
+
+setup(name="petroleumpriceprediction",
+    version="0.1",
+    packages=find_packages(include=["petroleumpriceprediction", "scripts", "benchmarks"]),
+    entry_points={"console_scripts": ["petroleum=petroleumpriceprediction.cli:main"]})
@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def prices() -> pd.DataFrame:
+    """Preprocessed business-day Brent prices driven by an OPEC basket random walk."""
+    rng = np.random.default_rng(0)
+    n_days = 400
+    opec = 70 + np.cumsum(rng.normal(0, 0.8, n_days))
+    noise = np.cumsum(rng.normal(0, 0.5, n_days))
+    return pd.DataFrame({"ds": pd.bdate_range("2022-01-03", periods=n_days),
+                         "y": 5 + 0.9 * opec + noise,
+                         "opec_price": opec})
+
+
+@pytest.fixture
+def eia_register():
+    """Builds registers as returned by the EIA spot prices endpoint."""
+    return make_register
+
+
+def make_register(series: str, period: str, value: float = 80.0) -> dict:
+    """Builds a register of a series, described as "<series> price"."""
+    return {"period": period, "duoarea": "", "area-name": "", "product": "", "product-name": "",
+            "process": "", "process-name": "", "series": series, "series-description": f"{series} price",
+            "value": str(value), "units": "$/BBL"}
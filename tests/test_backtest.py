@@ -0,0 +1,19 @@
+import warnings
+
+import numpy as np
+
+from petroleumpriceprediction.backtest import run_folds
+from petroleumpriceprediction.model import SARIMAXPredictor
+
+
+def test_folds_forecast_as_the_served_model(prices):
+    origin = 300
+    specification = SARIMAXPredictor((1, 1, 1), (0, 0, 0, 0), exog=["opec_price"])
+    predictor = SARIMAXPredictor((1, 1, 1), (0, 0, 0, 0), exog=["opec_price"])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        folds = run_folds(specification, prices["y"].to_numpy(), np.array([origin]), horizon=5,
+                          exog=prices[["opec_price"]].to_numpy())
+        predictor.fit(prices.iloc[:origin])
+    # The future OPEC prices are unknown in production, where the last one is held
+    np.testing.assert_allclose(folds[0], predictor.forecast(5).to_numpy(), rtol=1e-8)
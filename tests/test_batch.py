@@ -0,0 +1,29 @@
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from petroleumpriceprediction.batch import artifact_path, fit_all
+from petroleumpriceprediction.model import SARIMAXPredictor
+
+
+def test_fit_all_fits_each_series_alone(prices, tmp_path):
+    dataset = pd.concat([prices.assign(unique_id=unique_id, y=prices["y"] - shift)[["unique_id", "ds", "y"]]
+                         for shift, unique_id in enumerate(["Brent", "WTI", "Broken"])], ignore_index=True)
+    model_dir = str(tmp_path / "series")
+    # The model of the last series cannot be written
+    os.makedirs(artifact_path(model_dir, "Broken"))
+
+    reports = fit_all(dataset, (1, 1, 1), (0, 0, 0, 0), model_dir, max_workers=2)
+    assert reports["unique_id"].tolist() == ["Brent", "Broken", "WTI"]
+    assert reports["status"].tolist() == ["ok", "failed", "ok"]
+    assert "IsADirectoryError" in reports.loc[1, "error"]
+    assert pd.read_csv(os.path.join(model_dir, "report.csv"))["status"].tolist() == ["ok", "failed", "ok"]
+
+    alone = SARIMAXPredictor((1, 1, 1), (0, 0, 0, 0))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        alone.fit(prices.assign(y=prices["y"] - 1))
+    loaded = SARIMAXPredictor.load(reports.loc[2, "path"])
+    np.testing.assert_allclose(loaded.forecast(5).to_numpy(), alone.forecast(5).to_numpy(), rtol=1e-8)
@@ -0,0 +1,11 @@
+import os
+
+from petroleumpriceprediction.cli import main
+
+CONFIG_FILEPATH = os.path.join(os.path.dirname(__file__), os.pardir, "config.yaml")
+
+
+def test_forecast_of_a_missing_model_fails(tmp_path, capsys):
+    missing = str(tmp_path / "missing.npz")
+    assert main(["--config", CONFIG_FILEPATH, "forecast", "--model", missing]) == 1
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,53 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from petroleumpriceprediction import data
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "data")
+
+
+@pytest.mark.parametrize("filepath", [os.path.join("processed", "petroleum_prices.csv"),
+                                      os.path.join("external", "opec_price.csv")])
+def test_cached_load_matches_csv_parsing(tmp_path, filepath):
+    csv_filepath = tmp_path / os.path.basename(filepath)
+    shutil.copy(os.path.join(DATA_DIR, filepath), csv_filepath)
+    parsed = data.load(str(csv_filepath), cache=False)
+
+    written = data.load(str(csv_filepath))
+    assert os.path.exists(data.cache_path(str(csv_filepath)))
+    mapped = data.load(str(csv_filepath))
+
+    pd.testing.assert_frame_equal(written, parsed)
+    pd.testing.assert_frame_equal(mapped, parsed)
+
+
+def test_stale_sidecar_is_rebuilt(tmp_path):
+    csv_filepath = tmp_path / "prices.csv"
+    csv_filepath.write_text("id,date,price\nBrent,2024-01-02,75.0\n")
+    data.load(str(csv_filepath))
+    csv_filepath.write_text("id,date,price\nBrent,2024-01-02,75.0\nBrent,2024-01-03,76.5\n")
+
+    loaded = data.load(str(csv_filepath))
+    assert loaded["price"].tolist() == [75.0, 76.5]
+
+
+
+def test_join_exog_takes_the_last_known_value(prices):
+    frame = prices[["ds", "y"]].iloc[:6]
+    # No OPEC price on the 3rd, 5th and 7th of January, and one on Saturday the 8th
+    exog = pd.DataFrame({"date": pd.to_datetime(["2021-12-31", "2022-01-04", "2022-01-06", "2022-01-08"]),
+                         "opec_price": [70.0, 71.0, 72.0, 73.0]})
+    joined = data.join_exog(frame, exog.iloc[::-1], ["opec_price"])
+    assert joined["ds"].tolist() == frame["ds"].tolist()
+    assert joined["opec_price"].tolist() == [70.0, 71.0, 71.0, 72.0, 72.0, 73.0]
+    pd.testing.assert_series_equal(joined["y"], frame["y"].reset_index(drop=True))
+
+
+def test_join_exog_drops_the_days_before_the_first_value(prices):
+    frame = prices[["ds", "y"]].iloc[:6]
+    exog = pd.DataFrame({"date": pd.to_datetime(["2022-01-05"]), "opec_price": [70.0]})
+    joined = data.join_exog(frame, exog, ["opec_price"])
+    assert joined["ds"].tolist() == frame["ds"].iloc[2:].tolist()
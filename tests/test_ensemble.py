@@ -0,0 +1,69 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from petroleumpriceprediction.model import EnsemblePredictor, SARIMAXPredictor, load_predictor
+
+MEMBERS = [{"name": "sarimax", "model": "sarimax"},
+           {"name": "naive", "model": "naive"},
+           {"name": "drift", "model": "drift"},
+           {"name": "broken", "model": "sarimax", "order": [-1, 0, 0]}]
+
+
+@pytest.fixture(scope="module")
+def history() -> pd.DataFrame:
+    rng = np.random.default_rng(2)
+    opec = 70 + np.cumsum(rng.normal(0, 0.8, 300))
+    return pd.DataFrame({"ds": pd.bdate_range("2023-01-02", periods=300),
+                         "y": 5 + 0.9 * opec + np.cumsum(rng.normal(0, 0.5, 300)),
+                         "opec_price": opec})
+
+
+@pytest.fixture(scope="module")
+def fitted(history) -> EnsemblePredictor:
+    predictor = EnsemblePredictor((1, 1, 1), (0, 0, 0, 0), MEMBERS, exog=["opec_price"], max_workers=2)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        predictor.fit(history)
+    return predictor
+
+
+def test_failed_members_are_dropped(fitted):
+    report = fitted.report.set_index("name")
+    assert report["status"].to_dict() == {"sarimax": "ok", "naive": "ok", "drift": "ok", "broken": "failed"}
+    assert set(fitted.weights) == {"sarimax", "naive", "drift"}
+    assert report.loc["broken", "weight"] == 0
+
+
+def test_members_are_weighted_by_their_inverse_holdout_error(fitted):
+    report = fitted.report.set_index("name").loc[list(fitted.weights)]
+    inverse = 1 / report["holdout_mae"]
+    np.testing.assert_allclose(report["weight"], inverse / inverse.sum())
+    assert sum(fitted.weights.values()) == pytest.approx(1)
+
+
+def test_forecast_is_the_weighted_mean_of_the_members(fitted, history):
+    expected = sum(weight * np.asarray(fitted.predictors[name].forecast(10), dtype=float)
+                   for name, weight in fitted.weights.items())
+    forecast = fitted.forecast(10)
+    np.testing.assert_allclose(forecast.to_numpy(), expected, rtol=1e-10)
+    assert forecast.index[0] == pd.bdate_range(history["ds"].iloc[-1], periods=2)[1]
+
+
+def test_scenarios_move_the_sarimax_members_only(fitted):
+    assert fitted.supports_scenarios and not fitted.supports_paths
+    scenarios = np.array([np.full(5, 60.0), np.full(5, 80.0)])
+    forecasts = fitted.forecast_scenarios(scenarios)
+    sarimax = fitted.predictors["sarimax"]
+    assert isinstance(sarimax, SARIMAXPredictor)
+    moved = fitted.weights["sarimax"] * sarimax.exog_coefficients()[0] * 20
+    np.testing.assert_allclose(forecasts["mean"][1] - forecasts["mean"][0], moved, rtol=1e-8)
+
+
+def test_saved_ensemble_loads_with_an_opt_in(fitted, tmp_path):
+    path = str(tmp_path / "ensemble.pkl")
+    fitted.save(path)
+    loaded = load_predictor(path, allow_pickle=True)
+    np.testing.assert_allclose(loaded.forecast(5).to_numpy(), fitted.forecast(5).to_numpy())
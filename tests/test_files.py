@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+from petroleumpriceprediction.files import write_atomic, write_text
+
+
+def test_write_keeps_the_permissions_of_the_replaced_file(tmp_path):
+    filepath = tmp_path / "config.yaml"
+    write_text(str(filepath), "a: 1\n")
+    os.chmod(filepath, 0o640)
+
+    write_text(str(filepath), "a: 2\n")
+    assert filepath.read_text() == "a: 2\n"
+    assert os.stat(filepath).st_mode & 0o777 == 0o640
+
+
+def test_failed_write_leaves_the_file_untouched(tmp_path):
+    filepath = tmp_path / "index.json"
+    write_text(str(filepath), "{}")
+
+    def fail(path):
+        with open(path, "w") as file:
+            file.write("{")
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        write_atomic(str(filepath), fail)
+    assert filepath.read_text() == "{}"
+    assert os.listdir(tmp_path) == ["index.json"]
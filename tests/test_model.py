@@ -0,0 +1,128 @@
+import pickle
+import warnings
+
+import numpy as np
+import pytest
+from scipy.stats import norm
+
+from petroleumpriceprediction.model import SARIMAXPredictor, StatsForecastPredictor, TemporalPredictor, load_predictor
+
+
+@pytest.fixture
+def fitted(prices) -> SARIMAXPredictor:
+    predictor = SARIMAXPredictor((1, 1, 1), (0, 0, 0, 0), exog=["opec_price"])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        predictor.fit(prices.iloc[:-20])
+    return predictor
+
+
+def test_load_forecasts_as_the_saved_model(fitted, tmp_path):
+    path = str(tmp_path / "model.npz")
+    fitted.save(path)
+    loaded = SARIMAXPredictor.load(path)
+    exog = np.linspace(70, 75, 10)[:, None]
+    expected = fitted.forecast_interval(10, alpha=0.1, exog=exog)
+    np.testing.assert_allclose(loaded.forecast_interval(10, alpha=0.1, exog=exog).to_numpy(),
+                               expected.to_numpy(), rtol=1e-8)
+    assert loaded.last_date == fitted.last_date
+    assert loaded.information_criteria == fitted.information_criteria
+
+
+def test_loaded_model_updates_as_the_saved_model(fitted, prices, tmp_path):
+    path = str(tmp_path / "model.npz")
+    fitted.save(path)
+    loaded = SARIMAXPredictor.load(path)
+    new_observations = prices.iloc[-20:]
+    fitted.update(new_observations, mode="filter")
+    loaded.update(new_observations, mode="filter")
+    np.testing.assert_allclose(loaded.forecast(5).to_numpy(), fitted.forecast(5).to_numpy(), rtol=1e-8)
+
+
+def test_load_rejects_tampered_artifacts(fitted, tmp_path):
+    path = str(tmp_path / "model.npz")
+    fitted.save(path)
+    with np.load(path) as archive:
+        arrays = dict(archive)
+    arrays["params"] = arrays["params"] + 1
+    np.savez(path, **arrays)
+    with pytest.raises(ValueError, match="Checksum"):
+        SARIMAXPredictor.load(path)
+
+
+@pytest.mark.parametrize("mode", ["filter", "warm"])
+def test_updates_stay_close_to_a_full_refit(fitted, prices, mode):
+    full = SARIMAXPredictor((1, 1, 1), (0, 0, 0, 0), exog=["opec_price"])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        full.fit(prices)
+        assert fitted.update(prices.iloc[-20:], data=prices, mode=mode) == mode
+    assert fitted.nobs == full.nobs and fitted.last_date == full.last_date
+    np.testing.assert_allclose(fitted.forecast(10).to_numpy(), full.forecast(10).to_numpy(), atol=0.05)
+
+
+def test_update_policy_counts_the_new_observations(prices):
+    predictor = SARIMAXPredictor((1, 1, 0), (0, 0, 0, 0), refit_after=10, full_refit_after=25)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        predictor.fit(prices.iloc[:-30])
+        modes = [predictor.update(prices.iloc[start:start + 5], data=prices.iloc[:start + 5])
+                 for start in range(370, 400, 5)]
+    assert modes == ["filter", "warm", "filter", "warm", "full", "filter"]
+
+
+def test_simulated_paths_match_the_analytic_distribution(fitted):
+    distribution, paths = fitted.forecast_distribution(15, n_paths=20000, seed=0, return_paths=True)
+    assert paths.shape == (20000, 15)
+    scale = (distribution["upper"] - distribution["lower"]).to_numpy() / (2 * norm.ppf(0.975))
+    np.testing.assert_allclose(paths.std(axis=0), scale, rtol=0.03)
+    np.testing.assert_allclose(paths.mean(axis=0), distribution["mean"].to_numpy(), atol=0.03 * scale.max())
+    for quantile in (0.05, 0.5, 0.95):
+        analytic = distribution["mean"] + norm.ppf(quantile) * scale
+        np.testing.assert_allclose(distribution[f"p{quantile * 100:g}"], analytic, atol=0.06 * scale.max())
+
+
+def test_scenarios_need_exogenous_variables(fitted, prices):
+    assert fitted.supports_paths and fitted.supports_scenarios
+    univariate = SARIMAXPredictor((1, 1, 0), (0, 0, 0, 0))
+    univariate.fit(prices)
+    assert not univariate.supports_scenarios
+    with pytest.raises(ValueError, match="exogenous"):
+        univariate.forecast_scenarios(np.full((2, 5), 70.0))
+
+
+def test_load_predictor_needs_an_opt_in_to_unpickle(tmp_path):
+    path = tmp_path / "model.pkl"
+    path.write_bytes(b"not loaded")
+    with pytest.raises(ValueError, match="allow_pickle"):
+        load_predictor(str(path))
+
+
+class Payload:
+    """Creates a file when unpickled."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __reduce__(self):
+        return open, (self.path, "w")
+
+
+def test_load_predictor_checks_the_pickled_class_first(tmp_path):
+    path = tmp_path / "model.pkl"
+    created = tmp_path / "created"
+    path.write_bytes(pickle.dumps(Payload(str(created))))
+    with pytest.raises(ValueError, match="io.open"):
+        load_predictor(str(path), allow_pickle=True)
+    assert not created.exists()
+    path.write_bytes(b"not a pickle")
+    with pytest.raises(ValueError, match="does not hold a pickled predictor"):
+        load_predictor(str(path), allow_pickle=True)
+
+
+def test_load_rejects_the_pickle_of_another_engine(tmp_path):
+    path = str(tmp_path / "model.pkl")
+    TemporalPredictor((1, 1, 1), (0, 0, 0, 0), []).save(path)
+    assert isinstance(load_predictor(path, allow_pickle=True), TemporalPredictor)
+    with pytest.raises(ValueError, match="StatsForecastPredictor"):
+        StatsForecastPredictor.load(path)
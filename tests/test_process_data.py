@@ -0,0 +1,46 @@
+import filecmp
+import os
+from datetime import date
+
+from scripts.process_data import BRENT_SERIES, append_data, extract_series, organize_data, organize_opec
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "data")
+
+RAW_DIR = os.path.join(DATA_DIR, "raw", "eia")
+
+PROCESSED_FILEPATH = os.path.join(DATA_DIR, "processed", "petroleum_prices.csv")
+
+OPEC_XML_FILEPATH = os.path.join(DATA_DIR, "external", "basketDayArchives.xml")
+
+OPEC_FILEPATH = os.path.join(DATA_DIR, "external", "opec_price.csv")
+
+
+def test_organize_data_reproduces_the_processed_csv(tmp_path):
+    save_filepath = tmp_path / "petroleum_prices.csv"
+    organize_data(RAW_DIR, str(save_filepath))
+    assert filecmp.cmp(save_filepath, PROCESSED_FILEPATH, shallow=False)
+
+
+
+def test_organize_opec_reproduces_the_external_csv(tmp_path):
+    save_filepath = tmp_path / "opec_price.csv"
+    organize_opec(OPEC_XML_FILEPATH, str(save_filepath))
+    assert filecmp.cmp(save_filepath, OPEC_FILEPATH, shallow=False)
+
+def test_append_data_adds_only_the_new_rows(tmp_path, eia_register):
+    save_filepath = tmp_path / "petroleum_prices.csv"
+    save_filepath.write_text(f"id,date,price\n{BRENT_SERIES},2024-01-08,80.0\n")
+    brent = dict(eia_register("RBRTE", "2024-01-09", 81.5), **{"series-description": BRENT_SERIES})
+    responses = [{"response": {"total": "2", "data": [brent, eia_register("RWTC", "2024-01-09", 75.0)]}}]
+    append_data(responses, str(save_filepath), str(tmp_path / "eia"))
+    assert save_filepath.read_text() == (f"id,date,price\n{BRENT_SERIES},2024-01-08,80.0\n"
+                                         f"{BRENT_SERIES},2024-01-09,81.5\n")
+
+
+def test_extract_every_series_in_long_format(eia_register):
+    responses = [{"response": {"total": "3", "data": [eia_register("RBRTE", "2024-01-09", 81.5),
+                                                      eia_register("RWTC", "2024-01-09", 75.0),
+                                                      eia_register("RBRTE", "2024-01-08", 80.0)]}}]
+    frame = extract_series(responses, series=None)
+    assert frame.rows() == [("RBRTE price", date(2024, 1, 9), 81.5), ("RWTC price", date(2024, 1, 9), 75.0),
+                            ("RBRTE price", date(2024, 1, 8), 80.0)]
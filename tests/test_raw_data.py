@@ -0,0 +1,107 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from scripts import raw_data, raw_store
+
+
+def response(registers: list[dict]) -> dict:
+    return {"response": {"total": str(len(registers)), "data": registers}}
+
+
+class StubEIA:
+    """An EIA endpoint serving the pages of a list of registers, failing the first calls of some offsets."""
+
+    def __init__(self, registers: list[dict], failures: dict = None, body: bytes = None):
+        self.registers = registers
+        self.failures = dict(failures or {})
+        self.body = body
+        self.calls = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = {key: values[-1] for key, values in parse_qs(urlparse(self.path).query).items()}
+                offset, length = int(query["offset"]), int(query["length"])
+                stub.calls.append(offset)
+                if stub.failures.get(offset, 0) > 0:
+                    stub.failures[offset] -= 1
+                    self.reply(503, b"{}")
+                    return
+                page = stub.registers[offset:offset + length]
+                self.reply(200, stub.body or json.dumps(
+                    {"response": {"total": str(len(stub.registers)), "data": page}}).encode())
+
+            def reply(self, status, payload):
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def small_pages(monkeypatch):
+    monkeypatch.setattr(raw_data, "PAGE_LENGTH", 3)
+    monkeypatch.setattr(raw_data, "get_api_key", lambda: "test")
+
+
+def test_fetch_merges_every_page_in_order(eia_register):
+    registers = [eia_register("RBRTE", f"2024-01-{day:02d}", day) for day in range(1, 11)]
+    with StubEIA(registers) as stub:
+        [response] = raw_data.fetch([("2024-01-01", "2024-01-31")], max_workers=2, base_url=stub.url)
+    assert response["response"]["data"] == registers
+    assert sorted(stub.calls) == [0, 3, 6, 9]
+
+
+def test_fetch_retries_throttled_pages(eia_register):
+    registers = [eia_register("RBRTE", f"2024-01-{day:02d}") for day in range(1, 8)]
+    with StubEIA(registers, failures={3: 2}) as stub:
+        [response] = raw_data.fetch([("2024-01-01", "2024-01-31")], max_workers=2, base_url=stub.url)
+    assert response["response"]["data"] == registers
+    assert stub.calls.count(3) == 3
+
+
+def test_fetch_skips_malformed_ranges():
+    with StubEIA([], body=b"not json") as stub:
+        assert raw_data.fetch([("2024-01-01", "2024-01-31")], max_workers=1, base_url=stub.url) == [None]
+
+
+def test_update_stores_only_the_new_registers(tmp_path, eia_register):
+    store_dir = str(tmp_path / "eia")
+    raw_store.write_responses([response([eia_register("RBRTE", f"2024-01-{day:02d}") for day in (8, 9, 10)]
+                                        + [eia_register("RWTC", "2024-01-08")])], store_dir)
+    registers = [eia_register(series, f"2024-01-{day:02d}", day)
+                 for series in ("RBRTE", "RWTC") for day in range(8, 13)]
+    with StubEIA(registers) as stub:
+        [stored] = raw_data.update(store_dir, max_workers=1, base_url=stub.url)
+
+    new = {(register["series"], register["period"]) for register in stored["response"]["data"]}
+    assert new == {("RBRTE", "2024-01-11"), ("RBRTE", "2024-01-12"),
+                   *(("RWTC", f"2024-01-{day:02d}") for day in range(9, 13))}
+    assert raw_store.high_water_marks(store_dir) == {"RBRTE": "2024-01-12", "RWTC": "2024-01-12"}
+    assert raw_store.scan(store_dir).collect().height == 10
+
+    with StubEIA(registers) as stub:
+        assert raw_data.update(store_dir, max_workers=1, base_url=stub.url) == []
+
+
+def test_update_needs_a_store(tmp_path):
+    with pytest.raises(RuntimeError, match="empty"):
+        raw_data.update(str(tmp_path / "eia"))
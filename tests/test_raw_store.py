@@ -0,0 +1,59 @@
+import json
+import os
+
+from scripts import raw_store
+
+
+def response(registers: list[dict]) -> dict:
+    return {"response": {"total": str(len(registers)), "data": registers}}
+
+
+def test_write_partitions_by_series_and_year(tmp_path, eia_register):
+    count = raw_store.write_responses([response([eia_register("RBRTE", "2023-12-29", 77.0),
+                                                 eia_register("RBRTE", "2024-01-02", 76.0),
+                                                 eia_register("RWTC", "2024-01-02", 70.0)])], tmp_path)
+    assert count == 3
+    manifest = raw_store.read_manifest(tmp_path)
+    assert sorted(manifest["partitions"]) == ["series=RBRTE/year=2023.parquet", "series=RBRTE/year=2024.parquet",
+                                              "series=RWTC/year=2024.parquet"]
+    assert all(os.path.exists(os.path.join(tmp_path, relative)) for relative in manifest["partitions"])
+
+
+def test_write_merges_keeping_the_newest_value(tmp_path, eia_register):
+    raw_store.write_responses([response([eia_register("RBRTE", "2024-01-02", 76.0)])], tmp_path)
+    raw_store.write_responses([response([eia_register("RBRTE", "2024-01-02", 78.0),
+                                         eia_register("RBRTE", "2024-01-03", 79.0)])], tmp_path)
+    frame = raw_store.scan(tmp_path, columns=["period", "value"]).collect()
+    assert frame["value"].to_list() == [78.0, 79.0]
+
+
+def test_scan_filters_series_and_periods(tmp_path, eia_register):
+    raw_store.write_responses([response([eia_register("RBRTE", "2023-06-01"),
+                                         eia_register("RBRTE", "2024-01-02"),
+                                         eia_register("RWTC", "2024-01-02")])], tmp_path)
+    assert raw_store.partitions(tmp_path, series="RBRTE price", since="2024-01-01") == [
+        os.path.join(tmp_path, "series=RBRTE/year=2024.parquet")]
+    frame = raw_store.scan(tmp_path, series="RBRTE price", since="2024-01-01", columns=["series", "period"]).collect()
+    assert frame["series"].to_list() == ["RBRTE"]
+    assert raw_store.scan(tmp_path / "empty", columns=["period"]).collect().is_empty()
+
+
+def test_high_water_mark_is_the_oldest_series_mark(tmp_path, eia_register):
+    assert raw_store.high_water_mark(tmp_path) is None
+    raw_store.write_responses([response([eia_register("RBRTE", "2024-03-01"),
+                                         eia_register("RBRTE", "2023-12-01"),
+                                         eia_register("RWTC", "2024-01-10")])], tmp_path)
+    assert raw_store.high_water_marks(tmp_path) == {"RBRTE": "2024-03-01", "RWTC": "2024-01-10"}
+    assert raw_store.high_water_mark(tmp_path) == "2024-01-10"
+
+
+def test_high_water_marks_of_older_manifests(tmp_path, eia_register):
+    raw_store.write_responses([response([eia_register("RBRTE", "2024-03-01"),
+                                         eia_register("RWTC", "2024-01-10")])], tmp_path)
+    manifest_path = raw_store.manifest_path(tmp_path)
+    with open(manifest_path) as file:
+        manifest = json.load(file)
+    del manifest["high_water_marks"]
+    with open(manifest_path, "w") as file:
+        json.dump(manifest, file)
+    assert raw_store.high_water_mark(tmp_path) == "2024-01-10"
@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+from petroleumpriceprediction.registry import ModelCache, ModelRegistry, model_key
+
+
+def artifact(path, size: int = 10) -> str:
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+def test_register_versions_per_key(tmp_path):
+    registry = ModelRegistry(str(tmp_path / "registry"))
+    source = artifact(tmp_path / "model.npz")
+    first = registry.register(source, "Brent price", "statsmodels", (1, 1, 1), (0, 1, 1, 5), exog=["opec_price"])
+    second = registry.register(source, "Brent price", "statsmodels", (1, 1, 1), (0, 1, 1, 5), exog=["opec_price"])
+    other = registry.register(source, "Brent price", "statsmodels", (1, 1, 1), (0, 1, 1, 5))
+    assert first["key"] == model_key("Brent price", "statsmodels", (1, 1, 1), (0, 1, 1, 5), ["opec_price"])
+    assert [first["version"], second["version"], other["version"]] == [1, 2, 1]
+    assert registry.resolve(first["key"]) == second
+    assert registry.resolve(first["id"]) == first
+    assert ModelRegistry(registry.registry_dir).entries(series="Brent price") == sorted(
+        [first, second, other], key=lambda entry: (entry["key"], entry["version"]))
+    with pytest.raises(KeyError):
+        registry.resolve("unknown")
+
+
+def test_register_keeps_the_latest_versions(tmp_path):
+    registry = ModelRegistry(str(tmp_path / "registry"))
+    source = artifact(tmp_path / "model.npz")
+    entries = [registry.register(source, "Brent", "statsmodels", (1, 1, 1), (0, 0, 0, 0), keep=2) for _ in range(3)]
+    assert [entry["version"] for entry in registry.entries()] == [2, 3]
+    assert not os.path.exists(registry.path(entries[0]))
+
+
+def test_cache_evicts_the_least_recently_used(tmp_path):
+    paths = [artifact(tmp_path / f"model{index}.npz", size=40) for index in range(3)]
+    loads = []
+    cache = ModelCache(max_bytes=100, loader=lambda path: loads.append(path) or path)
+    cache.get(paths[0])
+    cache.get(paths[1])
+    cache.get(paths[0])
+    cache.get(paths[2])
+    assert cache.peek(paths[1]) is None
+    assert cache.peek(paths[0]) == paths[0]
+    assert cache.stats() == {"hits": 1, "misses": 3, "evictions": 1, "entries": 2, "bytes": 80}
+
+
+def test_cache_bounds_the_entries_and_reloads_changed_files(tmp_path):
+    paths = [artifact(tmp_path / f"model{index}.npz") for index in range(2)]
+    cache = ModelCache(max_bytes=10 ** 6, max_entries=1, loader=lambda path: open(path, "rb").read())
+    cache.get(paths[0])
+    cache.get(paths[1])
+    assert cache.stats()["entries"] == 1
+    artifact(tmp_path / "model1.npz", size=20)
+    assert len(cache.get(paths[1])) == 20
+    assert cache.stats()["misses"] == 3
+
+
+def test_cache_keeps_a_model_larger_than_its_budget(tmp_path):
+    path = artifact(tmp_path / "large.npz", size=500)
+    cache = ModelCache(max_bytes=100, loader=lambda path: path)
+    cache.get(path)
+    assert cache.get(path) == path
+    assert cache.stats()["hits"] == 1
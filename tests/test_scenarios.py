@@ -0,0 +1,38 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from petroleumpriceprediction.model import SARIMAXPredictor
+from petroleumpriceprediction.scenarios import historical_paths, shifted_paths
+
+
+@pytest.fixture
+def fitted(prices) -> SARIMAXPredictor:
+    predictor = SARIMAXPredictor((1, 1, 1), (0, 1, 1, 5), exog=["opec_price"])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        predictor.fit(prices)
+    return predictor
+
+
+def test_scenarios_match_one_forecast_per_path(fitted, prices):
+    last = prices["opec_price"].iloc[-1]
+    paths = np.vstack([shifted_paths(last, [-0.2, 0.1], 15, ramp=True),
+                       historical_paths(prices["opec_price"].to_numpy(), 15, n_scenarios=3)])
+    scenarios = fitted.forecast_scenarios(paths, alpha=0.1)
+    for index, path in enumerate(paths):
+        expected = fitted.forecast_interval(15, alpha=0.1, exog=path[:, None])
+        for column in ("mean", "lower", "upper"):
+            np.testing.assert_allclose(scenarios[column][index], expected[column].to_numpy(), rtol=1e-8)
+
+
+def test_scenarios_check_their_shape(fitted):
+    with pytest.raises(ValueError, match="shape"):
+        fitted.forecast_scenarios(np.ones((2, 5, 3)))
+
+
+def test_shifted_paths_reach_their_shift():
+    paths = shifted_paths(100.0, [0.1, -0.5], 4, ramp=True)
+    np.testing.assert_allclose(paths[:, -1], [110.0, 50.0])
+    np.testing.assert_allclose(shifted_paths(100.0, [0.1], 3)[0], [110.0] * 3)
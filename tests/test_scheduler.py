@@ -0,0 +1,43 @@
+from datetime import datetime
+
+import pytest
+
+from petroleumpriceprediction.scheduler import CronSchedule
+
+
+def test_fields_accept_ranges_lists_and_steps():
+    schedule = CronSchedule("*/15 6-8 1,15 * 1-5")
+    assert schedule.values["minute"] == {0, 15, 30, 45}
+    assert schedule.values["hour"] == {6, 7, 8}
+    assert schedule.values["day"] == {1, 15}
+    assert schedule.values["weekday"] == {1, 2, 3, 4, 5}
+    assert CronSchedule("0 0 * * 7").values["weekday"] == {0}
+    assert CronSchedule("5/20 * * * *").values["minute"] == {5, 25, 45}
+
+
+@pytest.mark.parametrize("expression", ["* * * *", "60 * * * *", "* 24 * * *", "*/0 * * * *", "5-1 * * * *",
+                                        "a * * * *"])
+def test_invalid_expressions_are_rejected(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+
+def test_next_run_on_weekdays():
+    schedule = CronSchedule("30 6 * * 1-5")
+    # Friday 2024-03-08 after the run, then the weekend is skipped
+    assert schedule.next_after(datetime(2024, 3, 8, 6, 30)) == datetime(2024, 3, 11, 6, 30)
+    assert schedule.next_after(datetime(2024, 3, 11, 6, 29, 59)) == datetime(2024, 3, 11, 6, 30)
+
+
+def test_day_of_month_or_day_of_week():
+    # As in cron, restricting both runs on either
+    schedule = CronSchedule("0 0 13 * 5")
+    assert schedule.matches(datetime(2024, 3, 13))  # a Wednesday, the 13th
+    assert schedule.matches(datetime(2024, 3, 15))  # a Friday
+    assert not schedule.matches(datetime(2024, 3, 14))
+
+
+def test_next_run_of_rare_and_impossible_schedules():
+    assert CronSchedule("0 0 29 2 *").next_after(datetime(2024, 3, 1)) == datetime(2028, 2, 29)
+    with pytest.raises(ValueError, match="never runs"):
+        CronSchedule("0 0 30 2 *").next_after(datetime(2024, 1, 1))
@@ -0,0 +1,93 @@
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+import warnings
+
+import pytest
+
+from petroleumpriceprediction.model import SARIMAXPredictor
+from petroleumpriceprediction import serve
+from petroleumpriceprediction.registry import ModelCache
+from petroleumpriceprediction.serve import ForecastService, ResidentModel, create_server
+
+
+@pytest.fixture
+def model_dir(prices, tmp_path) -> str:
+    predictor = SARIMAXPredictor((1, 1, 1), (0, 0, 0, 0))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        predictor.fit(prices)
+    directory = tmp_path / "models"
+    directory.mkdir()
+    predictor.save(str(directory / "brent.npz"))
+    return str(directory)
+
+
+@pytest.fixture
+def url(model_dir):
+    service = ForecastService([model_dir], default_model="brent", max_steps=30, timeout=10, max_batch=3)
+    server = create_server(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def post(url: str, body) -> tuple[int, dict]:
+    request = urllib.request.Request(f"{url}/forecast", data=json.dumps(body).encode(), method="POST")
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        return error.code, json.loads(error.read())
+
+
+def test_batch_answers_every_request(url):
+    status, body = post(url, {"requests": [{"steps": 3}, {"model": "brent", "steps": 5, "alpha": 0.1}]})
+    assert status == 200
+    assert [len(result["forecast"]) for result in body["results"]] == [3, 5]
+    single = json.loads(urllib.request.urlopen(f"{url}/forecast?steps=5&alpha=0.1").read())
+    assert single["forecast"] == body["results"][1]["forecast"]
+
+
+def test_batch_fails_each_invalid_request_alone(url):
+    status, body = post(url, {"requests": [1, {"model": "unknown"}, {"steps": 99}, {"steps": [1]}]})
+    assert status == 413
+    status, body = post(url, {"requests": [1, {"model": "unknown"}, {"steps": [1]}]})
+    assert status == 200
+    assert all("error" in result for result in body["results"])
+
+
+@pytest.mark.parametrize("body", [{"requests": "brent"}, {"requests": {"steps": 1}}, [1], {}])
+def test_batch_needs_a_list_of_requests(url, body):
+    assert post(url, body)[0] == 400
+
+
+def test_scan_follows_the_current_release(model_dir, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    service = ForecastService(["models"], releases_dir="releases")
+    assert service.models["brent"].path == os.path.join("models", "brent.npz")
+    release = tmp_path / "releases" / "v1" / "models"
+    release.mkdir(parents=True)
+    os.link(os.path.join(model_dir, "brent.npz"), release / "brent.npz")
+    os.symlink("v1", tmp_path / "releases" / "current")
+    service.scan()
+    assert service.models["brent"].path == str(release / "brent.npz")
+
+
+def test_timeout_bounds_every_request_of_a_slow_batch(model_dir, monkeypatch):
+    forecast_frame = serve.forecast_frame
+
+    def slow_forecast_frame(*args):
+        time.sleep(1)
+        return forecast_frame(*args)
+
+    monkeypatch.setattr(serve, "forecast_frame", slow_forecast_frame)
+    model = ResidentModel("brent", os.path.join(model_dir, "brent.npz"), ModelCache(2 ** 20), timeout=0.2)
+    started = time.monotonic()
+    with pytest.raises(RuntimeError, match="timed out"):
+        model.forecast(5)
+    assert time.monotonic() - started < 0.8
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+from petroleumpriceprediction.stages import Stage, run_stages
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    """Two stages counting the lines of a file, then writing a report of the count."""
+    raw, count, report = (str(tmp_path / name) for name in ("raw.txt", "count.txt", "report.txt"))
+    with open(raw, "w") as file:
+        file.write("a\nb\n")
+    settings = {"title": "lines"}
+    runs = []
+
+    def count_lines():
+        runs.append("count")
+        with open(raw) as source, open(count, "w") as target:
+            target.write(str(len(source.readlines())))
+
+    def write_report():
+        runs.append("report")
+        with open(count) as source, open(report, "w") as target:
+            target.write(f"{settings['title']}: {source.read()}")
+
+    stages = [Stage("report", write_report, inputs=[count], outputs=[report], config=lambda: dict(settings)),
+              Stage("count", count_lines, inputs=[raw], outputs=[count])]
+    state_path = str(tmp_path / ".pipeline" / "state.json")
+    return lambda: run_stages(stages, state_path, max_workers=2), runs, settings, raw, report
+
+
+def test_unchanged_stages_are_skipped(pipeline):
+    run, runs, _, raw, _ = pipeline
+    assert run() == {"count": "ran", "report": "ran"}
+    assert run() == {"count": "skipped", "report": "skipped"}
+    # A touched but unchanged input is not a change
+    os.utime(raw, ns=(0, 0))
+    assert run() == {"count": "skipped", "report": "skipped"}
+    assert runs == ["count", "report"]
+
+
+def test_only_the_stages_whose_key_changed_run(pipeline):
+    run, runs, settings, raw, report = pipeline
+    run()
+    # The count does not change, so the report is still fresh
+    with open(raw, "w") as file:
+        file.write("c\nd\n")
+    assert run() == {"count": "ran", "report": "skipped"}
+    settings["title"] = "rows"
+    assert run() == {"count": "skipped", "report": "ran"}
+    os.remove(report)
+    assert run() == {"count": "skipped", "report": "ran"}
+    with open(report) as file:
+        assert file.read() == "rows: 2"
+
+
+def test_failed_stages_run_again(tmp_path):
+    output = str(tmp_path / "output.txt")
+    attempts = []
+
+    def flaky():
+        attempts.append(len(attempts))
+        if len(attempts) == 1:
+            raise RuntimeError("source unavailable")
+        with open(output, "w") as file:
+            file.write("done")
+
+    stages = [Stage("flaky", flaky, outputs=[output])]
+    state_path = str(tmp_path / "state.json")
+    with pytest.raises(RuntimeError):
+        run_stages(stages, state_path)
+    assert run_stages(stages, state_path) == {"flaky": "ran"}
+    assert run_stages(stages, state_path) == {"flaky": "skipped"}
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from petroleumpriceprediction.store import PriceStore, lttb
+
+
+@pytest.fixture
+def store() -> PriceStore:
+    # Business days of 2023 and 2024 but Christmas 2023 and 15 March 2024
+    dates = pd.bdate_range("2023-01-02", "2024-06-28").drop(pd.to_datetime(["2023-12-25", "2024-03-15"]))
+    brent = pd.Series(np.arange(len(dates), dtype=float), index=dates)
+    return PriceStore({"brent": brent, "opec": brent.iloc[::5] + 0.5})
+
+
+def test_lookup_falls_back_to_the_previous_price(store):
+    assert store.lookup("brent", "2024-03-15") == store.lookup("brent", "2024-03-14")
+    assert store.lookup("brent", "2024-03-16")[0] == pd.Timestamp("2024-03-14")
+    assert store.lookup("brent", "2023-12-25")[0] == pd.Timestamp("2023-12-22")
+    assert store.lookup("brent", "2030-01-01")[0] == pd.Timestamp("2024-06-28")
+    assert store.lookup("brent", "2022-12-30") is None
+
+
+def test_lookup_matches_a_scan_of_the_prices(store):
+    prices = store.series("opec")
+    for date in pd.date_range("2023-01-02", "2024-06-30", freq="D"):
+        before = prices[prices["date"] <= date]
+        expected = (before["date"].iloc[-1], before["price"].iloc[-1]) if len(before) else None
+        assert store.lookup("opec", date) == expected
+
+
+def test_ago_counts_calendar_and_business_days(store):
+    assert store.ago("brent", years=1)[0] == pd.Timestamp("2023-06-28")
+    assert store.ago("brent", days=7, date="2024-03-22")[0] == pd.Timestamp("2024-03-14")
+    assert store.ago("brent", business_days=1, date="2024-03-18")[0] == pd.Timestamp("2024-03-14")
+    assert store.ago("brent", business_days=1, date="2023-01-02") is None
+    assert store.ago("brent", years=5) is None
+
+
+@pytest.mark.parametrize("n_out", [0, 1, 2, 3, 10, 99, 100, 150])
+def test_lttb_keeps_at_most_n_out_sorted_points(n_out):
+    x = np.arange(100, dtype=float)
+    y = np.sin(x / 5)
+    selected = lttb(x, y, n_out)
+    assert len(selected) == min(n_out, 100)
+    assert np.all(np.diff(selected) > 0)
+    assert set(selected[:1]) <= {0} and (n_out < 2 or selected[-1] == 99)
+
+
+def test_lttb_keeps_the_peaks():
+    y = np.zeros(1000)
+    y[[250, 700]] = [10, -10]
+    selected = lttb(np.arange(1000, dtype=float), y, 20)
+    assert {250, 700} <= set(selected)
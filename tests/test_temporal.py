@@ -0,0 +1,74 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from petroleumpriceprediction.data import aggregate, period_ends
+from petroleumpriceprediction.model import TemporalPredictor
+
+LEVELS = [{"name": "weekly", "period": "W-FRI", "order": [1, 1, 0], "seasonal_order": [0, 0, 0, 0]},
+          {"name": "monthly", "period": "M", "order": [1, 1, 0], "seasonal_order": [0, 0, 0, 0]}]
+
+
+@pytest.fixture(scope="module")
+def history() -> pd.DataFrame:
+    rng = np.random.default_rng(1)
+    # Ends on a Wednesday, mid-week and mid-month, so the first periods of the forecast are partial
+    dates = pd.bdate_range(end="2024-05-15", periods=300)
+    return pd.DataFrame({"ds": dates, "y": 80 + np.cumsum(rng.normal(0, 0.7, len(dates)))})
+
+
+@pytest.fixture(scope="module")
+def fitted(history) -> TemporalPredictor:
+    predictor = TemporalPredictor((1, 1, 1), (0, 0, 0, 0), LEVELS, daily_window=200, horizon=45, max_workers=1)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        predictor.fit(history)
+    return predictor
+
+
+def test_aggregate_averages_business_days_per_period():
+    data = pd.DataFrame({"ds": pd.bdate_range("2024-01-01", "2024-01-12"), "y": np.arange(10.0)})
+    weekly = aggregate(data, "W-FRI", ["y"])
+    assert weekly["ds"].dt.strftime("%Y-%m-%d").tolist() == ["2024-01-05", "2024-01-12"]
+    assert weekly["y"].tolist() == [2.0, 7.0]
+    assert weekly["days"].tolist() == [5, 5]
+    # March 2024 ends on a Sunday: its last business day is Friday the 29th
+    assert str(period_ends(["2024-03-10"], "M")[0]) == "2024-03-29"
+
+
+def test_levels_are_coherent_with_the_daily_forecasts(fitted, history):
+    levels = fitted.forecast_levels(45)
+    daily = levels[levels["level"] == "daily"].set_index("ds")["reconciled"]
+    for level in LEVELS:
+        rows = levels[levels["level"] == level["name"]]
+        assert len(rows) > 0
+        ends = period_ends(daily.index, level["period"])
+        observed = history[period_ends(history["ds"], level["period"]) == ends[0]]["y"]
+        for end, reconciled in zip(rows["ds"], rows["reconciled"]):
+            days = daily[ends == np.datetime64(pd.Timestamp(end), "D")]
+            if end == rows["ds"].iloc[0]:
+                # The observed days of the current period are part of its average
+                expected = (days.sum() + observed.sum()) / (len(days) + len(observed))
+            else:
+                expected = days.mean()
+            assert reconciled == pytest.approx(expected, rel=1e-9)
+
+
+def test_forecasts_do_not_depend_on_the_horizon(fitted):
+    # Both are the first days of the reconciled horizon
+    short = fitted.forecast_interval(5)
+    long = fitted.forecast_interval(30)
+    np.testing.assert_allclose(short.to_numpy(), long.iloc[:5].to_numpy(), rtol=1e-9)
+    np.testing.assert_allclose(fitted.forecast_interval(45)["mean"].to_numpy(),
+                               fitted.forecast_levels(45).query("level == 'daily'")["reconciled"].to_numpy(),
+                               rtol=1e-9)
+
+
+def test_unsupported_forecasts_raise_value_errors(fitted):
+    assert not fitted.supports_paths and not fitted.supports_scenarios
+    with pytest.raises(ValueError, match="paths"):
+        fitted.forecast_distribution(5, return_paths=True)
+    with pytest.raises(ValueError, match="scenarios"):
+        fitted.forecast_scenarios(np.full((2, 5), 70.0))